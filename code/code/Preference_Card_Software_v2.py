@@ -2,45 +2,100 @@
 # Designed for LA County Hospital Surgical Unit
 # Authored By Alex West
 
-import glob
+import json
 import os
 import os.path
 import sys
+import threading
+import time
 import tkinter as tk
-from datetime import datetime
-from tkinter import filedialog, messagebox, simpledialog
-
-import openpyxl
-import pandas as pd
+from tkinter import filedialog, messagebox, simpledialog, ttk
+
+# pandas and openpyxl are imported where they're first needed, in this file and in the modules it imports
+# (card_store, catalog_cache, xlsx_reader and the rest), and warmed up in the background during start-up, so
+# the first window doesn't wait the best part of a second for them to load
+
+import xlsx_reader
+from card_columns import (CATALOG_CACHE_DIRECTORY_NAME, INSTRUMENT_COLUMNS, INSTRUMENT_KEY_COLUMNS, SHEET_COLUMNS,
+                          SOFT_GOODS_KEY_COLUMNS, SOFT_GOODS_SHEET_COLUMNS, STARTUP_BENCHMARK_VARIABLE)
+from card_history import describe_difference
+from card_manifest import CardManifest
+from card_store import CardStore, doctor_for_workbook, text_value, write_workbook
+from catalog_cache import CatalogCache
+from export_queue import ExportQueue
+from file_discovery import CONTAINER_COLUMNS, SOFT_GOODS_COLUMNS, discover_input_files, has_columns
+from instrumentation import instrumentation, instrumented, is_requested, note
+from memory_report import memory_report
+from part_index import PartCursor, PartIndex
+from search_index import SearchIndex
+from selection import SelectionStore
+from service_client import SERVICE_VARIABLE, ServiceClient, service_reader
+from virtual_list import RowModel, RowSet, VirtualList
 
 
 class Context:
 
     soft_goods_key = "soft goods"
     instruments_key = "instruments"
-    sheet_columns = ['Quantity', 'Service', 'Container Name', 'Item Description', 'Vendor Part #', 'Hold']
-    instrument_columns = ['Quantity', 'Service', 'Container Name', 'Hold']
-    soft_goods_columns = ['Quantity', 'Item Description', 'Vendor Part #', 'Hold']
+    sheet_columns = SHEET_COLUMNS
+    instrument_columns = INSTRUMENT_COLUMNS
+    soft_goods_columns = SOFT_GOODS_SHEET_COLUMNS
+    instrument_key_columns = INSTRUMENT_KEY_COLUMNS
+    soft_goods_key_columns = SOFT_GOODS_KEY_COLUMNS
+    catalog_cache_directory_name = CATALOG_CACHE_DIRECTORY_NAME
+    search_delay = 150  # milliseconds to wait after the last keystroke before searching
+    quick_entry_history = 10  # number of recent scans listed in the quick entry window
+    card_search_limit = 500  # most cards listed at once in the find card window
+    start_up_poll_interval = 50  # milliseconds between checks on the background start-up work
+    export_poll_interval = 250  # milliseconds between updates of the save progress shown in the main window
 
     root = None
     data_in_directory = "."
     data_out_directory = "."
     data = {}
     windows = {}
+    retained_windows = {}
+    models = {}
+    row_lists = {}
+    catalog_indexes = {}
     validation = None
     container_file = None
     soft_goods_file = None
-
-    def __init__(self, window, in_directory, out_directory):
+    catalog_cache = None
+    card_store = None
+    card_manifest = None
+    export_queue = None
+    export_status = None
+    start_up_times = {}
+
+    def __init__(self, window, in_directory, out_directory, service_url=None):
         self.root = window
         self.validation = window.register(only_digits)
         window.withdraw()
         self.data_in_directory = in_directory
         self.data_out_directory = out_directory
+        reader = None
+        if service_url:
+            # a card service (card_service.py) already has the catalogs parsed, so a catalog that isn't in the
+            # local cache is fetched from it rather than parsed here
+            reader = service_reader(ServiceClient(service_url))
+        # parsed input workbooks live here for the session and on disk between sessions
+        self.catalog_cache = CatalogCache(os.path.join(in_directory, self.catalog_cache_directory_name), reader)
+        # saved cards live in the store, <doctor>.xlsx files are generated from it
+        self.card_store = CardStore(out_directory, self.sheet_columns)
+        # filled in the first time a card is looked up, then only new cards are read
+        self.card_manifest = CardManifest(self.card_store)
+        # workbooks are written in the background, one at a time
+        self.export_queue = ExportQueue()
 
     def initialize(self):
         self.data = {}
+        self.models = {}
+        self.row_lists = {}
         self.remove_all_windows()
+        # the service, container and soft goods windows are emptied for the next card rather than rebuilt
+        for window in self.retained_windows.values():
+            window.reset()
 
     def get_soft_goods_key(self):
         return self.soft_goods_key
@@ -57,9 +112,35 @@ class Context:
     def get_soft_goods_columns(self):
         return self.soft_goods_columns
 
+    def get_instrument_key_columns(self):
+        return self.instrument_key_columns
+
+    def get_soft_goods_key_columns(self):
+        return self.soft_goods_key_columns
+
     def get_validation(self):
         return self.validation
 
+    def get_search_delay(self):
+        return self.search_delay
+
+    def get_quick_entry_history(self):
+        return self.quick_entry_history
+
+    def get_card_search_limit(self):
+        return self.card_search_limit
+
+    def get_start_up_poll_interval(self):
+        return self.start_up_poll_interval
+
+    # start-up milestones as wall-clock times, so a parent process can measure from when it launched us
+    def mark_start_up(self, milestone):
+        self.start_up_times[milestone] = time.time()
+        if milestone == "interactive" and os.environ.get(STARTUP_BENCHMARK_VARIABLE):
+            print(json.dumps(self.start_up_times), flush=True)
+            self.root.after(0, self.root.destroy)
+
+    # the committed SelectionStore for the instruments or soft goods on the card being edited
     def get_data(self, key):
         if key in self.data:
             return self.data[key]
@@ -68,6 +149,45 @@ class Context:
     def set_data(self, key, data):
         self.data[key] = data
 
+    def get_model(self, key):
+        return self.models.get(key)
+
+    def set_model(self, key, model):
+        if model is None:
+            self.models.pop(key, None)
+        else:
+            self.models[key] = model
+
+    def get_row_list(self, key):
+        row_list = self.row_lists.get(key)
+        if row_list is not None and row_list.winfo_exists():
+            return row_list
+        return None
+
+    def set_row_list(self, key, row_list):
+        self.row_lists[key] = row_list
+
+    def get_catalog_index(self, name, catalog, update=None):
+        # indexes over a catalog are only rebuilt when the catalog itself is re-read, i.e. the workbook changed.
+        # When the new version was compared with the one the index was built over, update(index, changes,
+        # catalog) patches the index with just the rows that changed instead.
+        cached = self.catalog_indexes.get(name)
+        if cached is None:
+            return None
+        if cached[0] is catalog:
+            return cached[1]
+        if update is not None:
+            changes = self.catalog_cache.changes_for(catalog)
+            if changes is not None and changes.applies_to(cached[0]):
+                with instrumentation.span("update catalog index", index=name, changes=changes.summary()):
+                    index = update(cached[1], changes, catalog)
+                self.set_catalog_index(name, catalog, index)
+                return index
+        return None
+
+    def set_catalog_index(self, name, catalog, index):
+        self.catalog_indexes[name] = (catalog, index)
+
     def get_root_window(self):
         return self.root
 
@@ -83,6 +203,63 @@ class Context:
     def set_soft_goods_file(self, soft_goods_file):
         self.soft_goods_file = soft_goods_file
 
+    def get_catalog_cache(self):
+        return self.catalog_cache
+
+    # {component: bytes}; catalogs come first so the strings the lists share with them are counted there
+    def memory_report(self):
+        components = []
+        if self.catalog_cache is not None:
+            for file_path, entry in sorted(self.catalog_cache.entries.items()):
+                components.append((f"catalog {os.path.basename(file_path)}", entry.frame))
+        for name, (_, index) in sorted(self.catalog_indexes.items()):
+            components.append((name, index))
+            if getattr(index, "search_index", None) is not None:
+                # listed before the rows so it is reported on its own line
+                components.insert(-1, (f"{name} search index", index.search_index))
+        for key, model in sorted(self.models.items()):
+            components.append((f"{key} list", model))
+        components.append(("card selections", self.data))
+        if self.card_store is not None:
+            components.append(("card cache", self.card_store.row_cache))
+        if self.card_manifest is not None:
+            components.append(("card manifest", (self.card_manifest.entries, self.card_manifest.latest,
+                                                 self.card_manifest.search_index)))
+        return memory_report(components)
+
+    def get_card_store(self):
+        return self.card_store
+
+    def get_card_manifest(self):
+        return self.card_manifest
+
+    def get_export_queue(self):
+        return self.export_queue
+
+    def get_export_poll_interval(self):
+        return self.export_poll_interval
+
+    # Shows what the export queue is doing in the main window and reports any failed writes
+    def poll_exports(self):
+        current, waiting = self.export_queue.status()
+        if current is None:
+            text = ""
+        elif waiting:
+            text = f"Saving {current}... ({waiting} more waiting)"
+        else:
+            text = f"Saving {current}..."
+        if self.export_status is not None and self.export_status.winfo_exists():
+            self.export_status.config(text=text)
+        for description, e in self.export_queue.take_failures():
+            show_error(f"Failed to save {description}: {e}")
+        self.root.after(self.export_poll_interval, self.poll_exports)
+
+    # Waits for queued workbook writes before the app goes away
+    def finish_exports(self):
+        if self.export_queue is not None and self.export_queue.is_busy():
+            print("Waiting for preference card files to finish saving...", flush=True)
+            self.export_queue.wait()
+
     def start(self):
         self.root.mainloop()
 
@@ -103,6 +280,9 @@ class Context:
                   text="Edit Existing", command=select_editable_preference_card_file).pack(pady=5)
         tk.Button(self.root,
                   text="Exit", command=exit_app).pack(pady=5)
+        self.export_status = tk.Label(self.root, text="")
+        self.export_status.pack(pady=5)
+        self.poll_exports()
 
     def get_in_directory(self):
         return self.data_in_directory
@@ -118,7 +298,19 @@ class Context:
             self.windows[key] = window
         return window
 
+    # A window that is built once a session and hidden rather than destroyed (see ListWindow)
+    def get_retained_window(self, key):
+        window = self.retained_windows.get(key)
+        if window is not None and window.window.winfo_exists():
+            return window
+        return None
+
+    def set_retained_window(self, key, window):
+        self.retained_windows[key] = window
+
     def remove_all_windows(self):
+        for window in self.retained_windows.values():
+            window.hide()
         for key in self.windows.keys():
             try:
                 # was 'withdraw' but I think will actually kill the window which we don't need anymore,
@@ -137,11 +329,6 @@ class Context:
 global context
 
 
-def make_quantity_entry_widget(frame, width=5):
-    # link this to the associated checkbox so that the checkbox xan be deactivated/activated based on having content
-    return tk.Entry(frame, width=width, validate="key", validatecommand=(context.get_validation(), "%S"))
-
-
 def only_digits(char):
     # for number entry fields (see Context)
     return char.isdigit()
@@ -151,14 +338,20 @@ def show_error(message):
     messagebox.showerror("Error", message)
 
 
+@instrumented
 def read_excel_file_as_dataframe(file_path):
     try:
-        return pd.read_excel(file_path)
+        # the cached frame is shared, so callers must not modify it in place
+        df = context.get_catalog_cache().read(file_path)
+        note(rows=len(df))
+        return df
     except Exception as e:
         show_error(f"Failed to read Excel file: {e}")
+    import pandas as pd
     return pd.DataFrame()
 
 
+@instrumented
 def load_excel_file(file_path, group, container_name):
     # Read the Excel file
     df = read_excel_file_as_dataframe(file_path)
@@ -166,11 +359,68 @@ def load_excel_file(file_path, group, container_name):
         return df
         # Group values in column B based on categories in column A
     try:
-        return df.groupby(group)[container_name].apply(list).reset_index()
+        # observed=True so a categorical column doesn't produce empty groups
+        grouped_data = df.groupby(group, observed=True)[container_name].apply(list).reset_index()
+        note(rows=len(df), groups=len(grouped_data))
+        return grouped_data
     except Exception as e:
         show_error(f"Failed to parse Excel file: {e}")
 
 
+# The rows (as tuples of columns) that are still somewhere in the catalog
+def rows_in_catalog(catalog, columns, rows):
+    rows = set(rows)
+    if not rows or catalog.empty:
+        return set()
+    # narrowed down on the first column, only the few candidate rows are compared in full
+    candidates = catalog[catalog[columns[0]].isin({row[0] for row in rows})]
+    return set(zip(*(candidates[column] for column in columns))) & rows
+
+
+def changed_rows(changes, columns):
+    # (rows that were removed or changed, rows that were added or changed) as tuples of columns
+    old_rows = [tuple(row) for frame in (changes.removed, changes.changed_before)
+                for row in frame.reindex(columns=columns).itertuples(index=False)]
+    new_rows = [tuple(row) for frame in (changes.added, changes.changed_after)
+                for row in frame.reindex(columns=columns).itertuples(index=False)]
+    return old_rows, new_rows
+
+
+def update_service_containers(services, changes, catalog):
+    import pandas as pd
+    old_rows, new_rows = changed_rows(changes, ['Service', 'Container Name'])
+    present = rows_in_catalog(catalog, ['Service', 'Container Name'], old_rows + new_rows)
+    updated = dict(services)
+    for service, container_name in dict.fromkeys(old_rows + new_rows):
+        if pd.isna(service):
+            continue
+        container_names = updated.get(service, [])
+        if (service, container_name) in present:
+            if container_name not in container_names:
+                updated[service] = container_names + [container_name]
+        elif container_name in container_names:
+            updated[service] = [name for name in container_names if name != container_name]
+            if not updated[service]:
+                del updated[service]
+    # services are listed in order, as groupby lists them
+    return dict(sorted(updated.items()))
+
+
+def load_service_containers(file_path):
+    # Service -> container names, worked out once per parsed container workbook
+    df = read_excel_file_as_dataframe(file_path)
+    services = context.get_catalog_index("service containers", df, update_service_containers)
+    if services is None:
+        services = {}
+        grouped_data = load_excel_file(file_path, 'Service', 'Container Name')
+        if grouped_data is not None and not grouped_data.empty:
+            for service, container_names in zip(grouped_data['Service'], grouped_data['Container Name']):
+                # a container listed twice under one service is only shown once
+                services[service] = list(dict.fromkeys(container_names))
+        context.set_catalog_index("service containers", df, services)
+    return services
+
+
 def select_excel_file(directory, title="Select Excel File", default_file=None):
     file_path = filedialog.askopenfilename(initialdir=directory, title=title,
                                            filetypes=(("Excel", "*.xlsx"), ("Excel", "*.xls")),
@@ -183,32 +433,22 @@ def on_frame_configure(canvas):
     canvas.configure(scrollregion=canvas.bbox("all"))
 
 
-def convert_instrument_data(instrument_entries):
-    instruments_data = []
-    for container_label, (an_entry, checkbox, frame) in instrument_entries.items():
-        container_name = container_label["text"].split(': ')[1]
-        service_name = container_label["text"].split(': ')[0]
-        quantity = an_entry.get()
-        hold = checkbox.get()
-        if quantity.strip():
-            instruments_data.append([int(quantity), service_name, container_name, None, None, hold])
-    return pd.DataFrame(instruments_data, columns=context.get_sheet_columns())
+# Both conversions only visit the selected items, however large the catalogs are
+def convert_instrument_data(instrument_model):
+    return instrument_model.get_selection().to_dataframe(context.get_sheet_columns(),
+                                                         context.get_instrument_key_columns(),
+                                                         instrument_model.get_rows().positions)
 
 
-# Convert the data contained within UI widgets
-def convert_soft_goods_data(soft_goods_entries):
-    soft_goods_data = []
-    if soft_goods_entries:
-        for (item_descr, vendor_part_num), (an_entry, checkbox, frame) in soft_goods_entries.items():
-            quantity = an_entry.get()
-            hold = checkbox.get()
-            if quantity.strip():
-                soft_goods_data.append([int(quantity), None, None, item_descr, vendor_part_num, hold])
-    return pd.DataFrame(soft_goods_data, columns=context.get_sheet_columns())
+def convert_soft_goods_data(soft_goods_selection):
+    if soft_goods_selection is None:
+        soft_goods_selection = SelectionStore()
+    return soft_goods_selection.to_dataframe(context.get_sheet_columns(), context.get_soft_goods_key_columns())
 
 
 def export_to_excel(directory, instrument_dataframe, soft_goods_dataframe):
 
+    import pandas as pd
     # Concatenate the DataFrames
     combined_df = pd.concat([instrument_dataframe, soft_goods_dataframe], ignore_index=True)
 
@@ -221,22 +461,26 @@ def export_to_excel(directory, instrument_dataframe, soft_goods_dataframe):
     if doctor_name is not None:
         # Create the file path based on doctor's name
         file_path = os.path.join(directory, f"{doctor_name}.xlsx")
+        store = context.get_card_store()
+        if os.path.isfile(file_path) and store.holds_workbook(file_path):
+            # pick up any sheets that were added to or edited in the workbook outside the app
+            store.sync_workbook(file_path)
 
-        # Check if the file already exists
-        if os.path.isfile(file_path):
+        # Check if the doctor already has cards
+        if store.has_doctor(doctor_name) or os.path.isfile(file_path):
             # File exists, ask user if they want to append to existing file
             choice = messagebox.askyesno(
                 "File Exists",
                 f"File '{doctor_name}.xlsx' already exists. Do you want to append to this file?")
             if choice:
-                # Append to existing file
-                with pd.ExcelWriter(file_path, mode='a') as writer:
-                    # Prompt user for surgery name
-                    surgery_name = \
-                        simpledialog.askstring("Enter Name of Surgery",
-                                               "Please enter the name of the surgery performed:")
-                    sheet_name = f"{surgery_name}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
-                    combined_df.to_excel(writer, sheet_name=sheet_name, index=False)
+                # Prompt user for surgery name
+                surgery_name = \
+                    simpledialog.askstring("Enter Name of Surgery",
+                                           "Please enter the name of the surgery performed:")
+                # Append to the store, the workbook is regenerated from it
+                with instrumentation.span("export_to_excel", rows=len(combined_df)):
+                    sheet_name = store.add_card(doctor_name, surgery_name, combined_df)
+                export_workbook_in_background(doctor_name)
                 messagebox.showinfo(
                     "Export Successful",
                     f"Selected instruments appended to '{sheet_name}' in '{doctor_name}.xlsx' successfully.")
@@ -250,7 +494,7 @@ def export_to_excel(directory, instrument_dataframe, soft_goods_dataframe):
                                                          initialfile=f"{doctor_name}.xlsx",
                                                          title="Save As")
                 if file_path:
-                    combined_df.to_excel(file_path, index=False)
+                    export_file_in_background(file_path, combined_df)
                     messagebox.showinfo("Export Successful", "Selected instruments exported successfully.")
 
                     ask_restart()
@@ -266,8 +510,9 @@ def export_to_excel(directory, instrument_dataframe, soft_goods_dataframe):
                 surgery_name = \
                     simpledialog.askstring("Enter Name of Surgery",
                                            "Please enter the name of the surgery performed:")
-                sheet_name = f"{surgery_name}_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}"
-                combined_df.to_excel(file_path, sheet_name=sheet_name, index=False)
+                with instrumentation.span("export_to_excel", rows=len(combined_df)):
+                    sheet_name = store.add_card(doctor_name, surgery_name, combined_df)
+                export_workbook_in_background(doctor_name)
                 messagebox.showinfo(
                     "Export Successful",
                     f"Selected instruments exported to '{sheet_name}' in '{doctor_name}.xlsx' successfully.")
@@ -277,243 +522,647 @@ def export_to_excel(directory, instrument_dataframe, soft_goods_dataframe):
                 messagebox.showwarning("Warning", "Operation canceled.")
 
 
-def filter_soft_goods(event, widgets):
-    text = event.widget.get().lower()
-    for label, frame in reversed(widgets):
-        if text not in label["text"].lower():
-            if frame.winfo_ismapped():
-                frame.grid_remove()
-        else:
-            if not frame.winfo_ismapped():
-                frame.grid()
+def export_workbook(doctor_name):
+    with instrumentation.span("export workbook", sheets=len(context.get_card_store().get_sheet_names(doctor_name))):
+        context.get_card_store().export_workbook(doctor_name)
 
 
-def select_soft_goods(filename, selected_soft_goods_data=None):
+def export_workbook_in_background(doctor_name):
+    # the card itself is already safe in the store; a doctor's workbook that is still waiting to be written
+    # picks up this card too, so back-to-back saves for one doctor only write the workbook once
+    context.get_export_queue().submit(("workbook", doctor_name), f"{doctor_name}.xlsx", export_workbook, doctor_name)
+
+
+# Saves that were cut short last time (e.g. the app was closed before a workbook was written) are finished by
+# writing those doctors' workbooks again
+def finish_pending_saves():
+    for doctor_name in context.get_card_store().pending_doctors():
+        export_workbook_in_background(doctor_name)
+
+
+def export_file_in_background(file_path, frame):
+    context.get_export_queue().submit(("file", os.path.abspath(file_path)), os.path.basename(file_path),
+                                      write_workbook, file_path, [("Sheet1", frame)])
+
+
+def filter_rows(text, row_list, search_index):
+    model = row_list.get_model()
+    # rows added after the window opened (e.g. by quick entry) still need to be searchable
+    for index in range(len(search_index), model.row_count()):
+        search_index.add(model.get_key(index))
+    rows = search_index.search(text)
+    if rows is None:
+        model.show_all()
+    else:
+        model.set_visible(rows)
+    note(rows=len(model.visible))
+    # only the handful of on-screen rows are redrawn, however many rows matched
+    row_list.reload()
+
+
+# Returns a function that empties the box again, for a window that is reused with other rows
+def make_search_box(window, row_list, filter_command):
+    search_frame = tk.Frame(window)
+    search_frame.pack(fill=tk.Y, expand=True)
+
+    search_label = tk.Label(search_frame, width=8, text="Search: ")
+    search_label.grid(row=0, column=0)
+    search_entry = tk.Entry(search_frame, width=12)
+    search_entry.grid(row=0, column=1)
+
+    state = {"pending": None, "text": ""}
+
+    def search(event):
+        # a search that is still waiting is stale once a newer one runs
+        if state["pending"] is not None:
+            search_entry.after_cancel(state["pending"])
+            state["pending"] = None
+        state["text"] = search_entry.get()
+        rows = row_list.get_model().get_rows()
+        if rows.search_index is None:
+            # the row keys are the searchable fields: (description, vendor part #) or (service, container name)
+            rows.search_index = SearchIndex(rows.keys)
+        filter_command(event, row_list, rows.search_index)
+
+    def search_as_you_type(event):
+        if search_entry.get() == state["text"]:
+            return
+        if state["pending"] is not None:
+            search_entry.after_cancel(state["pending"])
+        state["pending"] = search_entry.after(context.get_search_delay(), lambda: search(event))
+
+    def clear():
+        if state["pending"] is not None:
+            search_entry.after_cancel(state["pending"])
+            state["pending"] = None
+        state["text"] = ""
+        search_entry.delete(0, tk.END)
+
+    search_entry.bind("<Return>", search)
+    search_entry.bind("<KeyRelease>", search_as_you_type)
+    return clear
+
+
+@instrumented
+def filter_soft_goods(event, soft_goods_list, search_index):
+    filter_rows(event.widget.get(), soft_goods_list, search_index)
+
+
+def describe_container(key):
+    return f"{key[0]}: {key[1]}"
+
+
+def describe_soft_good(key):
+    return f"{key[0]}, Vendor Part #: {key[1]}"
+
+
+def soft_good_order(key):
+    # by description, then part # (as text, since a part # can be read as a number), blanks last.  Both the
+    # catalog rows and the rows patched in later are sorted with it, so a patched row lands where a fresh
+    # sort would have put it.
+    order = []
+    for value in key:
+        text = value if isinstance(value, str) else text_value(value)
+        order.append((1, "") if text is None else (0, text))
+    return tuple(order)
+
+
+def update_soft_goods_rows(rows, changes, catalog):
+    old_keys, new_keys = changed_rows(changes, ['ITEM DESCRIPTION', 'VENDOR PART#'])
+    present = rows_in_catalog(catalog, ['ITEM DESCRIPTION', 'VENDOR PART#'], old_keys)
+    removed = {key for key in old_keys if key not in present and key in rows}
+    updated, new_positions = rows.patched(removed, ((key, None) for key in new_keys), soft_good_order)
+    search_index = rows.search_index
+    if search_index is not None:
+        # the index moves to the new rows; windows still showing the old rows build their own if searched
+        rows.search_index = None
+        for key in removed:
+            search_index.remove(rows.positions[key])
+        search_index.renumber(new_positions, len(updated))
+        for key in dict.fromkeys(new_keys):
+            if key not in rows.positions or key in removed:
+                search_index.replace(updated.positions[key], key)
+        updated.search_index = search_index
+    return updated
+
+
+def get_soft_goods_rows(filename):
     soft_goods_df = read_excel_file_as_dataframe(filename)
-    soft_goods_frame, soft_goods_window = create_container_window("Select Soft Goods")
-    if selected_soft_goods_data is not None:
-        preselected = selected_soft_goods_data.set_index(['Item Description', 'Vendor Part #'])
+    rows = context.get_catalog_index("soft goods rows", soft_goods_df, update_soft_goods_rows)
+    if rows is None:
+        rows = RowSet(describe=describe_soft_good)
+        for key in sorted(zip(soft_goods_df['ITEM DESCRIPTION'], soft_goods_df['VENDOR PART#']), key=soft_good_order):
+            rows.add(key)
+        context.set_catalog_index("soft goods rows", soft_goods_df, rows)
+    return rows
+
+
+@instrumented
+def select_soft_goods(filename, selected_soft_goods_data=None):
+    # the catalog rows are shared between openings, so reopening only copies the selected items
+    selection = selected_soft_goods_data.copy() if selected_soft_goods_data is not None else None
+    model = RowModel(get_soft_goods_rows(filename), selection)
+    note(rows=model.row_count())
+    context.set_model(context.get_soft_goods_key(), model)
+
+    title = "Select Soft Goods"
+    list_window = context.get_retained_window(title)
+    if list_window is None:
+        list_window = make_soft_goods_window(title, model)
     else:
-        preselected = None
-
-    entries = {}
-
-    count = 0
-    widgets = []
-    for index, row in soft_goods_df.sort_values(by="ITEM DESCRIPTION").iterrows():
-        item_description = row['ITEM DESCRIPTION']
-        vendor_part_number = row['VENDOR PART#']
-
-        entry_frame = tk.Frame(soft_goods_frame)
-
-        label = tk.Label(entry_frame, text=f"{item_description}, Vendor Part #: {vendor_part_number}",
-                         width=50, anchor="w", wraplength=400, justify="left")
-        entry = make_quantity_entry_widget(entry_frame, width=5)
-
-        check_var = tk.BooleanVar()
-        checkbox = tk.Checkbutton(entry_frame, width=1, height=1, variable=check_var, onvalue=True, offvalue=False)
-        label.grid(row=0, column=0)
-        entry.grid(row=0, column=1)
-        checkbox.grid(row=0, column=2)
-        entries[(item_description, vendor_part_number)] = (entry, check_var, entry_frame)
-        entry_frame.grid(row=count, column=0)
-        widgets.append([label, entry_frame])
-        key = (item_description, vendor_part_number)
-        if preselected is not None:
-            if key in preselected.index:
-                quantity = preselected.loc[key, 'Quantity']
-                hold = preselected.loc[key, 'Hold']
-                entry.insert(0, str(quantity))
-                if hold:
-                    checkbox.select()
-        count = count+1
+        list_window.show(model)
+    context.set_row_list(context.get_soft_goods_key(), list_window.row_list)
+
+
+def make_soft_goods_window(title, model):
+    list_window = ListWindow(title, model)
+    context.set_retained_window(title, list_window)
+    soft_goods_list = list_window.row_list
+    soft_goods_window = list_window.window
 
     def done_command():
-        context.set_data(context.get_soft_goods_key(), convert_soft_goods_data(entries))
+        # items on the card that are no longer in the catalog are dropped here, as they always have been
+        context.set_data(context.get_soft_goods_key(), soft_goods_list.get_model().listed_selection())
+        context.set_model(context.get_soft_goods_key(), None)
+        hide_window(soft_goods_window)
+
+    def cancel_command():
+        context.set_model(context.get_soft_goods_key(), None)
         hide_window(soft_goods_window)
 
     done_soft_goods_button = tk.Button(soft_goods_window, text="Done", command=done_command)
     done_soft_goods_button.pack(padx=10, pady=10)
-    cancel_soft_goods_button = tk.Button(soft_goods_window, text="Cancel",
-                                         command=lambda: hide_window(soft_goods_window))
+    cancel_soft_goods_button = tk.Button(soft_goods_window, text="Cancel", command=cancel_command)
     cancel_soft_goods_button.pack(padx=10, pady=10)
+    soft_goods_window.protocol("WM_DELETE_WINDOW", cancel_command)
 
-    search_frame = tk.Frame(soft_goods_window)
-    search_frame.pack(fill=tk.Y, expand=True)
+    list_window.clear_search = make_search_box(soft_goods_window, soft_goods_list, filter_soft_goods)
+    return list_window
 
-    search_label = tk.Label(search_frame, width=8, text="Search: ")
-    search_label.grid(row=0, column=0)
-    search_entry = tk.Entry(search_frame, width=12)
-    search_entry.grid(row=0, column=1)
-    search_entry.bind("<Return>", lambda event: filter_soft_goods(event, widgets))
 
-
-def filter_instruments(event, instrument_entries):
-    text = event.widget.get().lower()
-    for key in reversed(instrument_entries.keys()):
-        entry, checkbox, frame = instrument_entries[key]
-        if text not in key["text"].lower():
-            if frame.winfo_ismapped():
-                frame.grid_remove()
-        else:
-            if not frame.winfo_ismapped():
-                frame.grid()
+@instrumented
+def filter_instruments(event, instrument_list, search_index):
+    filter_rows(event.widget.get(), instrument_list, search_index)
 
 
 def select_instruments(grouped_data, types, selected_instrument_data=None):
-    container_window, instrument_entries = (
-        layout_window("Select Containers", grouped_data, types, selected_instrument_data))
+    layout_window("Select Containers", grouped_data, types, selected_instrument_data)
+
+
+def make_container_window(title, model, dimensions):
+    list_window = ListWindow(title, model, dimensions)
+    context.set_retained_window(title, list_window)
+    instrument_list = list_window.row_list
+    container_window = list_window.window
 
     def cancel_window():
         hide_window(container_window)
 
+    def export_selections():
+        export_to_excel(context.get_out_directory(), convert_instrument_data(instrument_list.get_model()),
+                        convert_soft_goods_data(context.get_data(context.get_soft_goods_key())))
+
     # display select soft goods button on window with container selections to move on to the next step
     soft_goods_button = tk.Button(container_window, text="Select Soft Goods",
                                   command=lambda: select_soft_goods(context.get_soft_goods_file(),
                                                                     context.get_data(context.get_soft_goods_key())))
     soft_goods_button.pack(padx=10, pady=10)
-    export_to_excel_button = tk.Button(container_window, text="Export to Excel",
-                                       command=lambda: export_to_excel(context.get_out_directory(),
-                                                                       convert_instrument_data(instrument_entries),
-                                                                       context.get_data(context.get_soft_goods_key())))
+    quick_entry_button = tk.Button(container_window, text="Quick Entry", command=lambda: quick_entry(instrument_list))
+    quick_entry_button.pack(padx=10, pady=10)
+    export_to_excel_button = tk.Button(container_window, text="Export to Excel", command=export_selections)
     export_to_excel_button.pack(padx=10, pady=10)
     cancel_instruments_button = tk.Button(container_window, text="Cancel", command=cancel_window)
     cancel_instruments_button.pack(padx=10, pady=10)
 
-    search_frame = tk.Frame(container_window)
-    search_frame.pack(fill=tk.Y, expand=True)
-
-    search_label = tk.Label(search_frame, width=8, text="Search: ")
-    search_label.grid(row=0, column=0)
-    search_entry = tk.Entry(search_frame, width=12)
-    search_entry.grid(row=0, column=1)
-    search_entry.bind("<Return>", lambda event: filter_instruments(event, instrument_entries))
-
-
+    list_window.clear_search = make_search_box(container_window, instrument_list, filter_instruments)
+    return list_window
+
+
+def get_container_rows(grouped_data, types):
+    # the rows for a choice of services are kept until the container workbook changes, so picking the same
+    # services for the next card reuses them
+    rows_by_types = context.get_catalog_index("container rows", grouped_data)
+    if rows_by_types is None:
+        rows_by_types = {}
+        context.set_catalog_index("container rows", grouped_data, rows_by_types)
+    rows = rows_by_types.get(tuple(types))
+    if rows is None:
+        rows = RowSet(describe=describe_container)
+        for a_type in types:
+            # grouped_data maps each service to its container names, so this is a lookup rather than a search
+            for container_name in grouped_data.get(a_type, []):
+                rows.add((a_type, container_name))
+        rows_by_types[tuple(types)] = rows
+    return rows
+
+
+@instrumented
 def layout_window(title, grouped_data, types, selected_instrument_data, dimensions="800x800"):
 
-    selected_containers_frame, container_window = create_container_window(title, dimensions)
+    # the window edits a copy, so the card's containers are only replaced when it is exported
+    selection = selected_instrument_data.copy() if selected_instrument_data is not None else None
+    model = RowModel(get_container_rows(grouped_data, types), selection)
+    note(rows=model.row_count())
 
-    entries = {}
-
-    grouped_data_keys = grouped_data.keys()
-
-    if selected_instrument_data is not None:
-        preselected = selected_instrument_data.set_index(['Service', 'Container Name'])
+    list_window = context.get_retained_window(title)
+    if list_window is None:
+        list_window = make_container_window(title, model, dimensions)
     else:
-        preselected = None
-
-    row = 0
-    for a_type in types:
-        # Get the index of the row where 'Service' matches selected_service
-        index = grouped_data[grouped_data[grouped_data_keys[0]] == a_type].index.tolist()
-        # Retrieve container names for the specified service index
-        container_names = grouped_data.loc[index, grouped_data_keys[1]].iloc[0]
-        # Insert each container name into the listbox
-        #        row = 0
-        for container_name in container_names:
-            container_label = f"{a_type}: {container_name}"
-            # instrument_frame = tk.Frame(selected_containers_frame)
-            # instrument_frame.pack(fill=tk.X)
-
-            instrument_frame = tk.Frame(selected_containers_frame)
-
-            label = tk.Label(instrument_frame, text=container_label,
-                             width=50, anchor="w", wraplength=400, justify="left")
-            quantity_entry = make_quantity_entry_widget(instrument_frame, width=5)
-            check_var = tk.BooleanVar()
-            checkbox = tk.Checkbutton(instrument_frame, width=1, height=1, variable=check_var,
-                                      onvalue=True, offvalue=False)
-            label.grid(row=0, column=0)
-            quantity_entry.grid(row=0, column=1)
-            checkbox.grid(row=0, column=2)
-            instrument_frame.grid(row=row, column=0)
-            entries[label] = (quantity_entry, check_var, instrument_frame)
-            key = (a_type, container_name)
-            if preselected is not None:
-                if key in preselected.index:
-                    quantity = preselected.loc[key, 'Quantity']
-                    hold = preselected.loc[key, 'Hold']
-                    quantity_entry.insert(0, str(quantity))
-                    if hold:
-                        checkbox.select()
-            row = row + 1
-
-    return container_window, entries
-
-
-def create_container_window(title, dimensions="800x800"):
-    container_window = new_window(title)
+        list_window.show(model)
+    context.set_model(context.get_instruments_key(), model)
+    context.set_row_list(context.get_instruments_key(), list_window.row_list)
+
+    return list_window.window, list_window.row_list
+
+
+def update_part_index(part_column, key_columns, skip_blank_parts=False):
+    # patches a PartIndex of part_column -> (key_columns) in place
+    def update(index, changes, catalog):
+        import pandas as pd
+        columns = [part_column] + key_columns
+        old_rows, new_rows = changed_rows(changes, columns)
+        present = rows_in_catalog(catalog, columns, old_rows)
+        for row in old_rows:
+            if row not in present:
+                index.remove(row[0], row[1:])
+        for row in new_rows:
+            if not (skip_blank_parts and pd.isna(row[0])):
+                index.add(row[0], row[1:])
+        return index
+    return update
+
+
+def get_part_index(key):
+    if key == context.get_soft_goods_key():
+        catalog = read_excel_file_as_dataframe(context.get_soft_goods_file())
+        update = update_part_index('VENDOR PART#', ['ITEM DESCRIPTION', 'VENDOR PART#'])
+    else:
+        catalog = read_excel_file_as_dataframe(context.get_container_file())
+        update = update_part_index('Reference ID', ['Service', 'Container Name'], skip_blank_parts=True)
+    index = context.get_catalog_index(f"{key} parts", catalog, update)
+    if index is None:
+        if catalog.empty:
+            index = PartIndex()
+        elif key == context.get_soft_goods_key():
+            keys = zip(catalog['ITEM DESCRIPTION'], catalog['VENDOR PART#'])
+            index = PartIndex(zip(catalog['VENDOR PART#'], keys))
+        else:
+            # containers without a reference ID can't be scanned
+            catalog_with_ids = catalog.dropna(subset=['Reference ID'])
+            keys = zip(catalog_with_ids['Service'], catalog_with_ids['Container Name'])
+            index = PartIndex(zip(catalog_with_ids['Reference ID'], keys))
+        context.set_catalog_index(f"{key} parts", catalog, index)
+    return index
+
+
+def quick_entry(instrument_list):
+    title = "Quick Entry"
+    quick_entry_window = new_window(title)
+    quick_entry_window.title(title)
+    quick_entry_window.geometry("500x400")
+
+    soft_goods_key = context.get_soft_goods_key()
+    instruments_key = context.get_instruments_key()
+    indexes = {soft_goods_key: get_part_index(soft_goods_key), instruments_key: get_part_index(instruments_key)}
+    cursors = [PartCursor(index) for index in indexes.values()]
+
+    tk.Label(quick_entry_window, text="Scan or type a vendor part # or container reference ID:").pack(pady=10)
+    scan_entry = tk.Entry(quick_entry_window, width=30)
+    scan_entry.pack(pady=5)
+    scan_entry.focus_set()
+    status_label = tk.Label(quick_entry_window, text="", justify=tk.LEFT, wraplength=450)
+    status_label.pack(pady=5)
+    history = tk.Listbox(quick_entry_window, height=context.get_quick_entry_history())
+    history.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+
+    def describe(key, row_key):
+        if key == soft_goods_key:
+            return describe_soft_good(row_key)
+        return describe_container(row_key)
+
+    def on_key(event):
+        # each keystroke is one step down the part number trie, nothing is rebuilt
+        if event.keysym == "Return":
+            # leave the result of the scan on screen
+            return
+        text = scan_entry.get()
+        if not text.strip():
+            status_label.config(text="")
+            return
+        matches = 0
+        for cursor in cursors:
+            cursor.update(text)
+            matches += cursor.matches()
+        if matches == 0:
+            status_label.config(text="No matching part #")
+        elif matches == 1:
+            for key, cursor in zip(indexes, cursors):
+                for row_key in cursor.completions(1):
+                    status_label.config(text=describe(key, row_key))
+        else:
+            status_label.config(text=f"{matches} matching items")
+
+    def on_scan(event):
+        text = scan_entry.get().strip()
+        scan_entry.delete(0, tk.END)
+        for cursor in cursors:
+            cursor.reset()
+        if not text:
+            return
+        found = [(key, row_key) for key, index in indexes.items() for row_key in index.lookup(text)]
+        if len(found) != 1:
+            quick_entry_window.bell()
+            if not found:
+                status_label.config(text=f"No item with part # {text}")
+            else:
+                status_label.config(text=f"{text} matches {len(found)} items, please pick one from the list instead")
+            return
+
+        key, row_key = found[0]
+        if key == soft_goods_key:
+            # scanned soft goods go straight onto the card, and into the soft goods window if it is open
+            selection = context.get_data(soft_goods_key)
+            if selection is None:
+                selection = SelectionStore()
+                context.set_data(soft_goods_key, selection)
+            quantity = selection.add_quantity(row_key)
+            model = context.get_model(soft_goods_key)
+            if model is not None:
+                model.get_selection().add_quantity(row_key)
+        else:
+            model = instrument_list.get_model()
+            if row_key not in model:
+                # a container from a service that wasn't selected; the rows are shared with later openings of
+                # the window, so it goes into a copy
+                model.set_rows(model.get_rows().copy())
+                model.add_row(row_key, describe(key, row_key))
+                model.show_all()
+            quantity = model.get_selection().add_quantity(row_key)
+        row_list = context.get_row_list(key)
+        if row_list is not None:
+            row_list.refresh()
+
+        status_label.config(text=f"Added {describe(key, row_key)}")
+        history.insert(0, f"{quantity} x {describe(key, row_key)}")
+        history.delete(context.get_quick_entry_history(), tk.END)
+
+    scan_entry.bind("<KeyRelease>", on_key)
+    scan_entry.bind("<Return>", on_scan)
+
+    done_button = tk.Button(quick_entry_window, text="Done", command=lambda: hide_window(quick_entry_window))
+    done_button.pack(padx=10, pady=10)
+
+
+def create_container_window(title, model, dimensions="800x800"):
+    container_window = new_window()
     container_window.title(title)
 
     # Set the size of the window
     container_window.geometry(dimensions)
 
-    # Create a canvas for scrollable view
-    canvas = tk.Canvas(container_window)
-    canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    # Only enough rows to fill the window are built, and they are reused as the list scrolls
+    row_list = VirtualList(container_window, model, validatecommand=(context.get_validation(), "%S"))
+    row_list.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-    # Add a scrollbar to the canvas
-    scrollbar = tk.Scrollbar(container_window, orient=tk.VERTICAL, command=canvas.yview)
-    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    return row_list, container_window
 
-    # Configure the canvas to scroll with the scrollbar
-    canvas.configure(yscrollcommand=scrollbar.set)
 
-    # Create a frame to contain the list of instruments
-    selected_containers_frame = tk.Frame(canvas)
-    selected_containers_frame.pack(fill=tk.BOTH, expand=True)
+# The service, container and soft goods windows are built the first time they're needed and kept for the
+# session.  Closing one only hides it, and opening it again fills the same widgets with the next card, so
+# reopening a window costs no more than redrawing what is on screen.  Context.initialize resets them.
+class RetainedWindow:
 
-    # Add the frame to the canvas
-    canvas.create_window((0, 0), window=selected_containers_frame, anchor=tk.NW)
+    def __init__(self, window):
+        self.window = window
+        window.protocol("WM_DELETE_WINDOW", self.hide)
 
-    selected_containers_frame.bind("<Configure>", lambda event: on_frame_configure(canvas))
+    def show(self):
+        self.window.deiconify()
+        self.window.lift()
 
-    return selected_containers_frame, container_window
+    def hide(self):
+        if self.window.winfo_exists():
+            self.window.withdraw()
 
+    def reset(self):
+        self.hide()
 
-def select_surgery_service(selected_types=None):
-    if selected_types is None:
-        selected_types = []
-    grouped_data = load_excel_file(context.get_container_file(), 'Service', 'Container Name')
 
-    context.remove_all_windows()
-    title = "Select Service"
-    service_window = new_window(title)
-    service_window.title(title)
+class ListWindow(RetainedWindow):
 
-    # Set the size of the window
-    service_window.geometry("400x500")
+    def __init__(self, title, model, dimensions="800x800"):
+        self.row_list, window = create_container_window(title, model, dimensions)
+        super().__init__(window)
+        # set once the search box has been added below the buttons
+        self.clear_search = None
+
+    def show(self, model=None):
+        if self.clear_search is not None:
+            self.clear_search()
+        if model is not None:
+            self.row_list.set_model(model)
+        super().show()
+
+    def reset(self):
+        super().reset()
+        if self.window.winfo_exists():
+            if self.clear_search is not None:
+                self.clear_search()
+            # the last card's selection isn't held on to while the window waits for the next one
+            self.row_list.set_model(RowModel())
+
+
+class ServiceWindow(RetainedWindow):
+
+    def __init__(self, title):
+        window = new_window()
+        window.title(title)
+
+        # Set the size of the window
+        window.geometry("400x500")
+        super().__init__(window)
+        self.services = None
+
+        self.listbox = tk.Listbox(window, selectmode=tk.MULTIPLE)
+        self.listbox.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
 
-    selected_services = tk.Listbox(service_window, selectmode=tk.MULTIPLE)
-    selected_services.pack(expand=True, fill=tk.BOTH, padx=10, pady=10)
+        select_button = tk.Button(window, text="Select", command=self.select)
+        select_button.pack(padx=10, pady=10)
+        exit_button = tk.Button(window, text="Cancel", command=self.hide)
+        exit_button.pack(padx=10, pady=10)
 
-    services = grouped_data['Service'].unique()  # Access unique values in 'Service' column directly
-    # Insert service options into the listbox\
-    for service in services:
-        selected_services.insert(tk.END, service)
-        if service in selected_types:
-            selected_services.select_set(tk.END)
+    def show(self, services=None, selected_types=()):
+        if services is not None and services is not self.services:
+            # the first card, or the container workbook changed, so the services are listed again
+            self.listbox.delete(0, tk.END)
+            self.listbox.insert(tk.END, *services)
+            self.services = services
+        self.listbox.selection_clear(0, tk.END)
+        for position, service in enumerate(self.services or ()):
+            if service in selected_types:
+                self.listbox.select_set(position)
+        self.listbox.see(0)
+        super().show()
 
-    def select():
+    def reset(self):
+        super().reset()
+        if self.window.winfo_exists():
+            self.listbox.selection_clear(0, tk.END)
+
+    def select(self):
         # Retrieve the indices of selected items
-        selected_indices = selected_services.curselection()
+        selected_indices = self.listbox.curselection()
         # Retrieve the selected services based on the indices
-        selected = [selected_services.get(idx) for idx in selected_indices]
+        selected = [self.listbox.get(idx) for idx in selected_indices]
         # Pass the selected services to the next function
         if selected:
-            select_instruments(grouped_data, selected, context.get_data(context.get_instruments_key()))
+            select_instruments(self.services, selected, context.get_data(context.get_instruments_key()))
         else:
             messagebox.showinfo("Nothing selected", "Please select at least one service first.")
 
-    select_button = tk.Button(service_window, text="Select", command=select)
-    select_button.pack(padx=10, pady=10)
-    exit_button = tk.Button(service_window, text="Cancel", command=lambda: hide_window(service_window))
-    exit_button.pack(padx=10, pady=10)
+
+def select_surgery_service(selected_types=None):
+    if selected_types is None:
+        selected_types = []
+    grouped_data = load_service_containers(context.get_container_file())
+    selected_types = set(selected_types)
+
+    context.remove_all_windows()
+    title = "Select Service"
+    service_window = context.get_retained_window(title)
+    if service_window is None:
+        service_window = ServiceWindow(title)
+        context.set_retained_window(title, service_window)
+    service_window.show(grouped_data, selected_types)
 
 
 def select_editable_preference_card_file():
-    select_surgery_sheet(context.get_out_directory())
+    find_card()
+
+
+# Lists the saved cards of every doctor from the manifest; typing filters by doctor, surgery or date
+def find_card():
+    manifest = context.get_card_manifest()
+    try:
+        manifest.refresh()
+    except Exception as e:
+        show_error(f"Failed to read the saved preference cards: {e}")
+        return
+
+    title = "Find Preference Card"
+    find_window = new_window(title)
+    find_window.title(title)
+    find_window.geometry("700x500")
+
+    search_frame = tk.Frame(find_window)
+    search_frame.pack(pady=10)
+    tk.Label(search_frame, text="Search: ").grid(row=0, column=0)
+    search_entry = tk.Entry(search_frame, width=40)
+    search_entry.grid(row=0, column=1)
+    latest_only = tk.BooleanVar(value=True)
+    tk.Checkbutton(search_frame, text="Latest versions only", variable=latest_only,
+                   command=lambda: update_results()).grid(row=0, column=2, padx=10)
+
+    list_frame = tk.Frame(find_window)
+    list_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+    scrollbar = tk.Scrollbar(list_frame, orient=tk.VERTICAL)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    card_listbox = tk.Listbox(list_frame, selectmode=tk.SINGLE, yscrollcommand=scrollbar.set)
+    card_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scrollbar.config(command=card_listbox.yview)
+
+    status_label = tk.Label(find_window, text="")
+    status_label.pack()
+
+    state = {"pending": None, "text": None, "results": []}
+
+    def update_results():
+        if state["pending"] is not None:
+            search_entry.after_cancel(state["pending"])
+            state["pending"] = None
+        state["text"] = search_entry.get()
+        limit = context.get_card_search_limit()
+        state["results"] = manifest.search(state["text"], latest_only.get(), limit)
+        card_listbox.delete(0, tk.END)
+        for entry in state["results"]:
+            card_listbox.insert(tk.END, entry.describe(not latest_only.get() and manifest.is_latest(entry)))
+        more = " (refine the search to see the rest)" if len(state["results"]) >= limit else ""
+        status_label.config(text=f"{len(state['results'])} of {len(manifest)} saved cards{more}")
+
+    def search_as_you_type(event):
+        if search_entry.get() == state["text"]:
+            return
+        if state["pending"] is not None:
+            search_entry.after_cancel(state["pending"])
+        state["pending"] = search_entry.after(context.get_search_delay(), update_results)
+
+    def open_selected(event=None):
+        selected = card_listbox.curselection()
+        if not selected:
+            messagebox.showinfo("Nothing selected", "Please select a preference card first.")
+            return
+        entry = state["results"][selected[0]]
+        find_window.destroy()
+        open_card(context.get_card_store().workbook_path(entry.doctor), entry.sheet_name)
+
+    def browse():
+        find_window.destroy()
+        select_surgery_sheet(context.get_out_directory())
+
+    def compare_selected():
+        selected = card_listbox.curselection()
+        if not selected:
+            messagebox.showinfo("Nothing selected", "Please select a preference card first.")
+            return
+        show_card_changes(state["results"][selected[0]])
+
+    search_entry.bind("<Return>", lambda event: update_results())
+    search_entry.bind("<KeyRelease>", search_as_you_type)
+    card_listbox.bind("<Double-Button-1>", open_selected)
+
+    button_frame = tk.Frame(find_window)
+    button_frame.pack(pady=10)
+    tk.Button(button_frame, text="Open", command=open_selected).grid(row=0, column=0, padx=5)
+    tk.Button(button_frame, text="Compare with Previous", command=compare_selected).grid(row=0, column=1, padx=5)
+    tk.Button(button_frame, text="Browse for File...", command=browse).grid(row=0, column=2, padx=5)
+    tk.Button(button_frame, text="Cancel", command=find_window.destroy).grid(row=0, column=3, padx=5)
+
+    update_results()
+    search_entry.focus_set()
+
+
+# Lists what changed on a card since the version of the same surgery before it
+def show_card_changes(entry):
+    store = context.get_card_store()
+    try:
+        previous_id = store.previous_card_id(entry.card_id)
+        differences = store.diff_cards(previous_id, entry.card_id)
+    except Exception as e:
+        show_error(f"Failed to compare preference cards: {e}")
+        return
+
+    title = "Card Changes"
+    changes_window = new_window(title)
+    changes_window.title(f"{entry.doctor} - {entry.surgery}")
+    changes_window.geometry("600x400")
+    if previous_id is None:
+        heading = f"Version {entry.version} is the first saved version"
+    else:
+        heading = f"Changes from version {entry.version - 1} to version {entry.version}"
+    tk.Label(changes_window, text=heading).pack(pady=10)
+
+    text_frame = tk.Frame(changes_window)
+    text_frame.pack(fill=tk.BOTH, expand=True, padx=10)
+    scrollbar = tk.Scrollbar(text_frame, orient=tk.VERTICAL)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    changes_text = tk.Text(text_frame, wrap=tk.WORD, yscrollcommand=scrollbar.set)
+    changes_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    scrollbar.config(command=changes_text.yview)
+    lines = [describe_difference(*difference) for difference in differences]
+    changes_text.insert(tk.END, "\n".join(lines) if lines else "No changes.")
+    changes_text.config(state=tk.DISABLED)
+
+    tk.Button(changes_window, text="Close", command=changes_window.destroy).pack(pady=10)
 
 
 def select_surgery_sheet(directory):
@@ -526,10 +1175,12 @@ def select_surgery_sheet(directory):
 
 def get_sheet_names(excel_file):
     try:
-        workbook = openpyxl.load_workbook(excel_file, read_only=True)
-        sheet_names = workbook.sheetnames
-        workbook.close()
-        return sheet_names
+        store = context.get_card_store()
+        if store.holds_workbook(excel_file):
+            store.sync_workbook(excel_file)
+            return store.get_sheet_names(doctor_for_workbook(excel_file))
+        # only the workbook's list of sheets is read, none of the sheets themselves
+        return xlsx_reader.sheet_names(excel_file)
     except Exception as e:
         show_error(f"Failed to read Excel file: {e}")
         return []
@@ -540,10 +1191,7 @@ def show_sheet_selection_window(file_path, sheet_names):
         selected_sheet.set(sheet_listbox.get(sheet_listbox.curselection()))
         selection_window.destroy()
         messagebox.showinfo("Sheet Selected", f"You have selected the sheet: {selected_sheet.get()}")
-        types, selected_container_data, selected_soft_goods_data = process_sheet(file_path, selected_sheet.get())
-        context.set_data(context.get_instruments_key(), selected_container_data)
-        context.set_data(context.get_soft_goods_key(), selected_soft_goods_data)
-        select_surgery_service(types)
+        open_card(file_path, selected_sheet.get())
 
     selection_window = tk.Toplevel()
     selection_window.title("Select Sheet")
@@ -561,10 +1209,29 @@ def show_sheet_selection_window(file_path, sheet_names):
     sheet_listbox.bind('<<ListboxSelect>>', on_select)
 
 
+def open_card(file_path, sheet_name):
+    processed = process_sheet(file_path, sheet_name)
+    if processed is None:
+        return
+    types, selected_container_data, selected_soft_goods_data = processed
+    context.set_data(context.get_instruments_key(),
+                     SelectionStore.from_dataframe(selected_container_data, context.get_instrument_key_columns()))
+    context.set_data(context.get_soft_goods_key(),
+                     SelectionStore.from_dataframe(selected_soft_goods_data, context.get_soft_goods_key_columns()))
+    select_surgery_service(types)
+
+
+@instrumented
 def process_sheet(file_path, sheet_name):
 
     try:
-        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        store = context.get_card_store()
+        if store.holds_workbook(file_path):
+            df = store.load_card(doctor_for_workbook(file_path), sheet_name)
+        else:
+            # only the card's own sheet is read, and only the card columns in it
+            df = xlsx_reader.read_excel(file_path, sheet_name, columns=context.get_sheet_columns())
+        note(rows=len(df))
 
         # Assuming the columns are in the order:
         # Quantity, Service, Container Name, Item Description, Vendor Part #, Hold
@@ -603,6 +1270,7 @@ def ask_restart():
 
 
 def exit_app():
+    context.finish_exports()
     sys.exit(0)
 
 
@@ -634,8 +1302,17 @@ def confirm_files():
         preview_text = ""
         for (file_type, file_path) in [('Container File', container_file), ('Soft Goods File', soft_goods_file)]:
             if file_path is not None:
-                df = pd.read_excel(file_path, nrows=10)
-                preview_text += f"Preview of {file_type}: {file_path}:\n\n{df.head(10)}\n\n\n"
+                df = read_excel_file_as_dataframe(file_path)
+                changes = context.get_catalog_cache().get_changes(file_path)
+                if changes is None:
+                    # nothing to compare a file with the first time it's read
+                    preview_text += f"Preview of {file_type}: {file_path} ({len(df)} rows):\n\n{df.head(10)}\n\n\n"
+                elif changes.is_empty():
+                    preview_text += (f"{file_type}: {file_path} ({len(df)} rows)\n"
+                                     f"No rows changed since the version before it.\n\n\n")
+                else:
+                    preview_text += (f"{file_type}: {file_path} ({len(df)} rows)\n"
+                                     f"Changes since the version before it: {changes.report()}\n\n\n")
             else:
                 preview_text += f"No {file_type} found!\n\n\n"
         preview_label.config(text=preview_text)
@@ -666,8 +1343,7 @@ def confirm_files():
     def not_confirm_container_file():
         corrected_file = select_excel_file(in_directory)
         if corrected_file:
-            df = pd.read_excel(corrected_file)
-            if not {'Service', 'Container Name', 'Reference ID'}.issubset(df.columns):
+            if not has_columns(corrected_file, CONTAINER_COLUMNS):
                 show_error("The selected file does not have the expected columns for a container file.")
                 return
             context.set_container_file(corrected_file)
@@ -676,8 +1352,7 @@ def confirm_files():
     def not_confirm_soft_goods_file():
         corrected_file = select_excel_file(in_directory)
         if corrected_file:
-            df = pd.read_excel(corrected_file)
-            if not {'ITEM DESCRIPTION', 'VENDOR PART#'}.issubset(df.columns):
+            if not has_columns(corrected_file, SOFT_GOODS_COLUMNS):
                 show_error("The selected file does not have the expected columns for a soft goods file.")
                 return
             context.set_soft_goods_file(corrected_file)
@@ -698,24 +1373,20 @@ def confirm_files():
     exit_button.pack(pady=10)
 
 
-def select_and_confirm_files():
+def find_input_files():
     directory = context.get_in_directory()  # Directory where information files live
-    files = glob.glob(f"{directory}/*.xlsx")  # Find the full path for the in directory
 
-    container_file = None
-    soft_goods_file = None
-    # Search for the 2 files with the specific colum headers to determine which file contains which information
-    for file in files:
-        df = pd.read_excel(file)
-        if {'Service', 'Container Name', 'Reference ID'}.issubset(df.columns):
-            container_file = file
-            if soft_goods_file is not None:
-                break
-        elif {'ITEM DESCRIPTION', 'VENDOR PART#'}.issubset(df.columns):
-            soft_goods_file = file
-            if container_file is not None:
-                break
+    # Search for the 2 files with the specific colum headers to determine which file contains which information.
+    # Only header rows are read, and files that haven't changed since the last launch aren't opened at all.
+    return discover_input_files(directory, context.get_catalog_cache().get_cache_directory())
+
 
+def select_and_confirm_files():
+    container_file, soft_goods_file = find_input_files()
+    confirm_input_files(container_file, soft_goods_file)
+
+
+def confirm_input_files(container_file, soft_goods_file):
     # If both files are found, move on to user confirmation
     if container_file and soft_goods_file:
         context.set_container_file(container_file)
@@ -723,7 +1394,62 @@ def select_and_confirm_files():
     confirm_files()
 
 
+# Runs on a worker thread while the start-up window is showing; it must not touch any Tk widgets
+def load_input_files(result):
+    try:
+        container_file, soft_goods_file = find_input_files()
+        result["files"] = (container_file, soft_goods_file)
+        # parse both catalogs now so the confirmation preview and the selection windows find them cached
+        for file_path in (container_file, soft_goods_file):
+            if file_path is not None:
+                context.get_catalog_cache().read(file_path)
+    except Exception as e:
+        result["error"] = e
+    finally:
+        result["done"] = True
+
+
+def start_up():
+    root = context.get_root_window()
+    root.deiconify()
+    root.title("Preference Card System")
+    root.geometry("500x300")
+    start_up_frame = tk.Frame(root)
+    start_up_frame.pack(expand=True)
+    tk.Label(start_up_frame, text="Loading the container and soft goods files...").pack(pady=10)
+    progress = ttk.Progressbar(start_up_frame, mode="indeterminate", length=300)
+    progress.pack(pady=10)
+    progress.start()
+    root.update()
+    context.mark_start_up("first window")
+
+    result = {"done": False, "files": (None, None), "error": None}
+    threading.Thread(target=load_input_files, args=(result,), daemon=True).start()
+
+    def check():
+        if not result["done"]:
+            root.after(context.get_start_up_poll_interval(), check)
+            return
+        progress.stop()
+        start_up_frame.destroy()
+        root.withdraw()
+        if result["error"] is not None:
+            show_error(f"Failed to read the input files: {result['error']}")
+        finish_pending_saves()
+        confirm_input_files(*result["files"])
+        root.after_idle(lambda: context.mark_start_up("interactive"))
+
+    root.after(context.get_start_up_poll_interval(), check)
+
+
 def main(args):
+    instrument = is_requested(args)
+    args = [arg for arg in args if arg != "--instrument"]
+    service_url = os.environ.get(SERVICE_VARIABLE)
+    if "--service" in args:
+        position = args.index("--service")
+        service_url = args[position + 1] if position + 1 < len(args) else None
+        del args[position:position + 2]
     in_directory = "."
     out_directory = "."
     if args:
@@ -736,9 +1462,15 @@ def main(args):
             out_directory = in_directory
     global context
     root = tk.Tk()
-    context = Context(root, in_directory, out_directory)
-    select_and_confirm_files()
+    context = Context(root, in_directory, out_directory, service_url)
+    if instrument:
+        # timings go to a log next to the cards; F12 shows the latest ones
+        instrumentation.enable(out_directory, root, context.memory_report)
+    context.mark_start_up("started")
+    start_up()
     context.start()
+    # the main window was closed with saves still queued
+    context.finish_exports()
 
 
 if __name__ == "__main__":
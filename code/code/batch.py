@@ -0,0 +1,218 @@
+# Preference Card Batch Import
+# Creates preference cards from CSV or JSON card specs without any windows, for migrating paper cards.
+#
+# Usage: python batch.py SPEC [SPEC ...] [--in IN_DIRECTORY] [--out OUT_DIRECTORY] [--workers N] [--no-export]
+#
+# CSV specs have one row per card line with the columns Doctor, Surgery, Quantity, Service, Container Name,
+# Item Description, Vendor Part # and Hold (plus optional Card and Created columns).  Lines with the same
+# Doctor, Surgery and Card make up one card.  JSON specs are a list of
+# {"doctor": ..., "surgery": ..., "created": ..., "items": [{"Quantity": ..., "Service": ..., ...}]}.
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+from card_columns import CATALOG_CACHE_DIRECTORY_NAME, SHEET_COLUMNS
+from card_store import TIMESTAMP_FORMAT, CardStore, cell_value, quantity_value, text_value
+from catalog_cache import CatalogCache
+from file_discovery import discover_input_files
+from part_index import normalize_part_number
+
+
+class CardSpec:
+
+    __slots__ = ("doctor", "surgery", "created", "items", "source")
+
+    def __init__(self, doctor, surgery, created, items, source):
+        self.doctor = doctor
+        self.surgery = surgery
+        self.created = created
+        self.items = items
+        self.source = source
+
+
+def parse_created(value):
+    value = cell_value(value)
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value
+    for pattern in (TIMESTAMP_FORMAT, '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(str(value), pattern)
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognised date '{value}'")
+
+
+def read_csv_specs(file_path):
+    df = pd.read_csv(file_path, dtype=str, keep_default_na=False)
+    missing = {'Doctor', 'Surgery', 'Quantity'} - set(df.columns)
+    if missing:
+        raise ValueError(f"{file_path} is missing the columns {', '.join(sorted(missing))}")
+    if 'Card' not in df:
+        df['Card'] = ""
+    specs = []
+    for (doctor, surgery, card), lines in df.groupby(['Doctor', 'Surgery', 'Card'], sort=False):
+        created = parse_created(lines['Created'].iloc[0]) if 'Created' in lines else None
+        items = lines.reindex(columns=SHEET_COLUMNS).to_dict('records')
+        specs.append(CardSpec(doctor.strip(), surgery.strip(), created, items, f"{file_path} ({doctor}, {surgery})"))
+    return specs
+
+
+def read_json_specs(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        cards = json.load(f)
+    specs = []
+    for number, card in enumerate(cards, start=1):
+        specs.append(CardSpec(str(card.get("doctor", "")).strip(), str(card.get("surgery", "")).strip(),
+                              parse_created(card.get("created")), list(card.get("items", [])),
+                              f"{file_path} card {number}"))
+    return specs
+
+
+def read_specs(file_path):
+    if file_path.lower().endswith(".json"):
+        return read_json_specs(file_path)
+    return read_csv_specs(file_path)
+
+
+class CatalogValidator:
+
+    def __init__(self, container_df, soft_goods_df):
+        self.containers = set(zip(container_df['Service'], container_df['Container Name']))
+        self.soft_goods = {}
+        for item_description, vendor_part_number in zip(soft_goods_df['ITEM DESCRIPTION'],
+                                                        soft_goods_df['VENDOR PART#']):
+            self.soft_goods.setdefault(normalize_part_number(vendor_part_number),
+                                       (item_description, vendor_part_number))
+
+    # Returns (frame, problems) for one card.  Soft goods are matched on part # and take the catalog's
+    # description and part # spelling so the card lines up with the selection windows.
+    def validate(self, spec):
+        problems = []
+        if not spec.doctor:
+            problems.append("no doctor")
+        if not spec.surgery:
+            problems.append("no surgery")
+        rows = []
+        for number, item in enumerate(spec.items, start=1):
+            item = {column: cell_value(item.get(column)) for column in SHEET_COLUMNS}
+            quantity = quantity_value(item['Quantity'])
+            if quantity is None or quantity <= 0:
+                problems.append(f"line {number}: quantity '{item['Quantity']}' is not a positive whole number")
+                continue
+            hold = str(item['Hold']).strip().lower() in ("1", "true", "yes", "y", "x") if item['Hold'] else False
+            service = text_value(item['Service'])
+            container_name = text_value(item['Container Name'])
+            vendor_part_number = text_value(item['Vendor Part #'])
+            if service or container_name:
+                if (service, container_name) not in self.containers:
+                    problems.append(f"line {number}: no container '{container_name}' in service '{service}'")
+                    continue
+                rows.append([quantity, service, container_name, None, None, hold])
+            elif vendor_part_number:
+                soft_good = self.soft_goods.get(normalize_part_number(vendor_part_number))
+                if soft_good is None:
+                    problems.append(f"line {number}: no soft good with vendor part # '{vendor_part_number}'")
+                    continue
+                rows.append([quantity, None, None, soft_good[0], soft_good[1], hold])
+            else:
+                problems.append(f"line {number}: neither a container nor a vendor part #")
+        if not rows and not problems:
+            problems.append("nothing on the card")
+        return pd.DataFrame(rows, columns=SHEET_COLUMNS), problems
+
+
+def write_doctor_cards(out_directory, doctor, cards, export):
+    # runs in a worker process: one transaction for the doctor's cards, then their workbook
+    start = time.perf_counter()
+    store = CardStore(out_directory, SHEET_COLUMNS)
+    sheet_names = store.add_cards(doctor, cards)
+    if export:
+        store.export_workbook(doctor)
+    store.close()
+    return doctor, len(sheet_names), sum(len(frame) for _, frame, _ in cards), time.perf_counter() - start
+
+
+def load_catalogs(in_directory, container_file=None, soft_goods_file=None):
+    cache_directory = os.path.join(in_directory, CATALOG_CACHE_DIRECTORY_NAME)
+    if container_file is None or soft_goods_file is None:
+        found_container_file, found_soft_goods_file = discover_input_files(in_directory, cache_directory)
+        container_file = container_file or found_container_file
+        soft_goods_file = soft_goods_file or found_soft_goods_file
+    if container_file is None or soft_goods_file is None:
+        raise ValueError(f"Could not find both the container file and the soft goods file in {in_directory}")
+    cache = CatalogCache(cache_directory)
+    return cache.read(container_file), cache.read(soft_goods_file)
+
+
+def run(spec_files, in_directory, out_directory, workers=None, export=True, container_file=None,
+        soft_goods_file=None, output=sys.stdout):
+    start = time.perf_counter()
+    container_df, soft_goods_df = load_catalogs(in_directory, container_file, soft_goods_file)
+    validator = CatalogValidator(container_df, soft_goods_df)
+
+    by_doctor = {}
+    rejected = 0
+    for spec_file in spec_files:
+        for spec in read_specs(spec_file):
+            frame, problems = validator.validate(spec)
+            if problems:
+                rejected += 1
+                print(f"Skipped {spec.source}: {'; '.join(problems)}", file=output)
+                continue
+            by_doctor.setdefault(spec.doctor, []).append((spec.surgery, frame, spec.created))
+    validated = time.perf_counter()
+
+    # make sure the schema exists before the workers race to create it
+    CardStore(out_directory, SHEET_COLUMNS).close()
+    written = 0
+    rows = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(write_doctor_cards, out_directory, doctor, cards, export)
+                   for doctor, cards in by_doctor.items()]
+        for future in as_completed(futures):
+            doctor, cards, card_rows, seconds = future.result()
+            written += cards
+            rows += card_rows
+            print(f"{doctor}: {cards} cards ({card_rows} lines) in {seconds:.2f}s", file=output)
+
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {written} cards ({rows} lines) for {len(by_doctor)} doctors in {elapsed:.2f}s "
+          f"({written / elapsed if elapsed else 0:.1f} cards/s, validation {validated - start:.2f}s); "
+          f"{rejected} cards skipped", file=output)
+    return written, rejected
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Create preference cards from CSV or JSON card specs.")
+    parser.add_argument("specs", nargs="+", help="CSV or JSON card spec files")
+    parser.add_argument("--in", dest="in_directory", default=".", help="directory with the input catalogs")
+    parser.add_argument("--out", dest="out_directory", default=None,
+                        help="directory for the preference cards (defaults to the in directory)")
+    parser.add_argument("--container-file", default=None, help="container catalog, if not found automatically")
+    parser.add_argument("--soft-goods-file", default=None, help="soft goods catalog, if not found automatically")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (defaults to one per CPU)")
+    parser.add_argument("--no-export", action="store_true", help="don't regenerate the doctor workbooks")
+    options = parser.parse_args(args)
+
+    in_directory = os.path.abspath(options.in_directory)
+    out_directory = os.path.abspath(options.out_directory or options.in_directory)
+    try:
+        written, rejected = run(options.specs, in_directory, out_directory, options.workers, not options.no_export,
+                                options.container_file, options.soft_goods_file)
+    except (OSError, ValueError) as e:
+        print(f"Batch import failed: {e}", file=sys.stderr)
+        return 1
+    return 0 if not rejected else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,318 @@
+# Pipeline Benchmark
+# Generates synthetic catalogs and doctor workbooks at a chosen scale and times each step of
+# load -> select -> export, writing the results as JSON so runs on different code or data can be compared.
+#
+# Usage: python benchmark.py DATA_DIRECTORY [--containers N] [--soft-goods N] [--doctors N] [--sheets N]
+#                            [--rows N] [--repeat N] [--regenerate] [--skip-gui] [--json FILE]
+#
+# DATA_DIRECTORY gets in/ and out/ sub-directories; data that is already there for the same sizes is reused.
+# Window construction and filtering through the real lists are only timed when a display is available
+# (run under a headless X server such as Xvfb, e.g. "xvfb-run python benchmark.py ..."); without one the
+# search itself is timed instead.
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import openpyxl
+import pandas as pd
+
+import Preference_Card_Software_v2 as app
+import xlsx_reader
+from batch import write_doctor_cards
+from card_store import CardStore
+from catalog_cache import CatalogCache
+from pull_list import make_pull_list
+from search_index import SearchIndex
+from selection import SelectionStore
+from virtual_list import RowModel
+
+CONTAINER_FILE_NAME = "Synthetic Containers.xlsx"
+SOFT_GOODS_FILE_NAME = "Synthetic Soft Goods.xlsx"
+CONFIG_FILE_NAME = "benchmark.json"
+SERVICES = ("BURNS", "CARDIAC", "ENT", "GENERAL", "GYN", "NEURO", "OPHTHO", "ORTHO", "PLASTICS", "PODIATRY",
+            "THORACIC", "TRAUMA", "UROLOGY", "VASCULAR", "ROBOTICS", "SPINE", "HAND", "TRANSPLANT", "DENTAL", "ENDO")
+WORDS = ("RETRACTOR", "FORCEP", "SUTURE", "DRAPE", "GAUZE", "SPONGE", "CLAMP", "SCISSOR", "NEEDLE", "DRESSING",
+         "CATHETER", "GLOVE", "SYRINGE", "TUBING", "BLADE", "STAPLER", "TROCAR", "MESH", "PACK", "TRAY")
+SURGERIES = ("Lap Chole", "Appendectomy", "Hernia Repair", "Knee Arthroscopy", "Hip Replacement", "CABG",
+             "Tonsillectomy", "Cataract", "Carpal Tunnel", "Spinal Fusion", "Mastectomy", "Hysterectomy")
+QUERIES = ("ret", "tray 1", "suture 4", "zzz", "b")
+PULL_LIST_CASES = 200
+
+
+def generate_catalogs(in_directory, containers, soft_goods, seed=0):
+    rng = random.Random(seed)
+    container_rows = []
+    for number in range(containers):
+        service = SERVICES[number % len(SERVICES)]
+        container_rows.append((service, f"{rng.choice(WORDS)} {rng.choice(WORDS)} TRAY {number}", f"C{number:07d}"))
+    soft_goods_rows = []
+    for number in range(soft_goods):
+        description = f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 40)}MM {number}"
+        soft_goods_rows.append((description, f"{rng.choice('ABCDEFGH')}{rng.choice('XYZ')}-{number:07d}"))
+    pd.DataFrame(container_rows, columns=['Service', 'Container Name', 'Reference ID']).to_excel(
+        os.path.join(in_directory, CONTAINER_FILE_NAME), index=False)
+    pd.DataFrame(soft_goods_rows, columns=['ITEM DESCRIPTION', 'VENDOR PART#']).to_excel(
+        os.path.join(in_directory, SOFT_GOODS_FILE_NAME), index=False)
+    return container_rows, soft_goods_rows
+
+
+def generate_cards(out_directory, container_rows, soft_goods_rows, doctors, sheets, rows, seed=0):
+    rng = random.Random(seed)
+    by_doctor = {}
+    for doctor_number in range(doctors):
+        cards = []
+        for sheet_number in range(sheets):
+            items = [[rng.randint(1, 4), service, container_name, None, None, rng.random() < 0.1]
+                     for service, container_name, _ in rng.sample(container_rows, min(rows // 2, len(container_rows)))]
+            items += [[rng.randint(1, 4), None, None, description, part, rng.random() < 0.1]
+                      for description, part in rng.sample(soft_goods_rows,
+                                                          min(rows - len(items), len(soft_goods_rows)))]
+            created = pd.Timestamp("2024-01-01") + pd.Timedelta(hours=sheet_number)
+            cards.append((SURGERIES[sheet_number % len(SURGERIES)],
+                          pd.DataFrame(items, columns=app.Context.sheet_columns), created.to_pydatetime()))
+        by_doctor[f"Doctor {doctor_number:04d}"] = cards
+    CardStore(out_directory, app.Context.sheet_columns).close()
+    with ProcessPoolExecutor() as executor:
+        for future in [executor.submit(write_doctor_cards, out_directory, doctor, cards, True)
+                       for doctor, cards in by_doctor.items()]:
+            future.result()
+
+
+def prepare_data(data_directory, config, regenerate=False, output=sys.stdout):
+    in_directory = os.path.join(data_directory, "in")
+    out_directory = os.path.join(data_directory, "out")
+    config_path = os.path.join(data_directory, CONFIG_FILE_NAME)
+    if not regenerate and os.path.exists(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            if json.load(f) == config:
+                return in_directory, out_directory
+    for directory in (in_directory, out_directory):
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+    start = time.perf_counter()
+    container_rows, soft_goods_rows = generate_catalogs(in_directory, config["containers"], config["soft_goods"])
+    generate_cards(out_directory, container_rows, soft_goods_rows, config["doctors"], config["sheets"],
+                   config["rows"])
+    with open(config_path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    print(f"Generated data in {time.perf_counter() - start:.1f}s", file=output)
+    return in_directory, out_directory
+
+
+class Timer:
+
+    def __init__(self, repeat, output):
+        self.repeat = repeat
+        self.output = output
+        self.results = {}
+
+    # Times function repeat times (setup runs untimed before each call) and returns the last result
+    def time(self, name, function, setup=None, repeat=None, **details):
+        samples = []
+        result = None
+        for _ in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            result = function()
+            samples.append(time.perf_counter() - start)
+        self.results[name] = dict(details, seconds=statistics.median(samples), min=min(samples), max=max(samples),
+                                  runs=samples)
+        print(f"{name:<48} {statistics.median(samples) * 1000:10.1f} ms", file=self.output)
+        return result
+
+
+def make_context(in_directory, out_directory, root=None):
+    if root is not None:
+        context = app.Context(root, in_directory, out_directory)
+    else:
+        # without a display only the parts of the context that don't need Tk are set up
+        context = app.Context.__new__(app.Context)
+        context.data_in_directory = in_directory
+        context.data_out_directory = out_directory
+        context.catalog_cache = CatalogCache(os.path.join(in_directory, app.Context.catalog_cache_directory_name))
+        context.card_store = CardStore(out_directory, app.Context.sheet_columns)
+    context.catalog_indexes = {}
+    context.retained_windows = {}
+    context.set_container_file(os.path.join(in_directory, CONTAINER_FILE_NAME))
+    context.set_soft_goods_file(os.path.join(in_directory, SOFT_GOODS_FILE_NAME))
+    app.context = context
+    return context
+
+
+def forget_window(context, title, index_name=None):
+    # so the window and the rows it lists are built from scratch, as they are the first time in a session
+    window = context.retained_windows.pop(title, None)
+    if window is not None:
+        window.window.destroy()
+    if index_name is not None:
+        context.catalog_indexes.pop(index_name, None)
+
+
+def open_display():
+    try:
+        import tkinter as tk
+        return tk.Tk()
+    except Exception:
+        return None
+
+
+def run(data_directory, config, repeat=3, regenerate=False, gui=True, output=sys.stdout):
+    in_directory, out_directory = prepare_data(data_directory, config, regenerate, output)
+    root = open_display() if gui else None
+    context = make_context(in_directory, out_directory, root)
+    container_file = context.get_container_file()
+    soft_goods_file = context.get_soft_goods_file()
+    cache = context.get_catalog_cache()
+    timer = Timer(repeat, output)
+
+    for file_type, file_path in (("containers", container_file), ("soft goods", soft_goods_file)):
+        timer.time(f"read_excel_file_as_dataframe {file_type} (parse)",
+                   lambda: app.read_excel_file_as_dataframe(file_path),
+                   setup=lambda: (shutil.rmtree(cache.get_cache_directory(), ignore_errors=True), cache.invalidate()))
+        timer.time(f"read_excel_file_as_dataframe {file_type} (snapshot)",
+                   lambda: app.read_excel_file_as_dataframe(file_path), setup=cache.invalidate)
+        timer.time(f"read_excel_file_as_dataframe {file_type} (memory)",
+                   lambda: app.read_excel_file_as_dataframe(file_path))
+        # the parse above is xlsx_reader; this is what it replaced
+        timer.time(f"pd.read_excel {file_type}", lambda: pd.read_excel(file_path))
+    timer.time("load_excel_file", lambda: app.load_excel_file(container_file, 'Service', 'Container Name'))
+    services = timer.time("load_service_containers", lambda: app.load_service_containers(container_file),
+                          setup=lambda: context.catalog_indexes.clear())
+    app.read_excel_file_as_dataframe(soft_goods_file)
+    soft_goods_rows = timer.time("get_soft_goods_rows", lambda: app.get_soft_goods_rows(soft_goods_file),
+                                 setup=lambda: context.catalog_indexes.clear())
+    soft_goods_rows.search_index = timer.time("soft goods search index", lambda: SearchIndex(soft_goods_rows.keys))
+
+    # a card that uses a tenth of each service's containers and a few hundred soft goods
+    types = list(services)
+    instrument_selection = SelectionStore()
+    for service in types:
+        for container_name in services[service][::10]:
+            instrument_selection.set_quantity((service, container_name), 2)
+    soft_goods_selection = SelectionStore()
+    for key in soft_goods_rows.keys[::max(1, len(soft_goods_rows.keys) // 300)]:
+        soft_goods_selection.set_quantity(key, 1)
+
+    if root is not None:
+        timer.time("layout_window",
+                   lambda: app.layout_window("Select Containers", services, types, instrument_selection),
+                   setup=lambda: forget_window(context, "Select Containers", "container rows"))
+        container_window, instrument_list = timer.time(
+            "layout_window (reopen)",
+            lambda: app.layout_window("Select Containers", services, types, instrument_selection))
+        timer.time("select_soft_goods", lambda: app.select_soft_goods(soft_goods_file, soft_goods_selection),
+                   setup=lambda: forget_window(context, "Select Soft Goods"))
+        timer.time("select_soft_goods (reopen)", lambda: app.select_soft_goods(soft_goods_file, soft_goods_selection))
+        soft_goods_list = context.get_row_list(context.get_soft_goods_key())
+        root.update()
+        instrument_index = SearchIndex(instrument_list.get_model().get_rows().keys)
+        for query in QUERIES:
+            timer.time(f"filter_instruments '{query}'",
+                       lambda: app.filter_rows(query, instrument_list, instrument_index))
+            timer.time(f"filter_soft_goods '{query}'",
+                       lambda: app.filter_rows(query, soft_goods_list, soft_goods_rows.search_index))
+        instrument_model = instrument_list.get_model()
+        # what "select another preference card" does to the windows before the next card
+        timer.time("initialize (reset windows)", context.initialize)
+    else:
+        rows = app.RowSet(describe=app.describe_container)
+        for service in types:
+            for container_name in services[service]:
+                rows.add((service, container_name))
+        instrument_model = RowModel(rows, instrument_selection.copy())
+        instrument_index = SearchIndex(rows.keys)
+        for query in QUERIES:
+            timer.time(f"search instruments '{query}'", lambda: instrument_index.search(query))
+            timer.time(f"search soft goods '{query}'", lambda: soft_goods_rows.search_index.search(query))
+
+    instrument_frame = timer.time("convert_instrument_data", lambda: app.convert_instrument_data(instrument_model),
+                                  rows=len(instrument_selection))
+    soft_goods_frame = timer.time("convert_soft_goods_data", lambda: app.convert_soft_goods_data(soft_goods_selection),
+                                  rows=len(soft_goods_selection))
+    card = pd.concat([instrument_frame, soft_goods_frame], ignore_index=True)
+
+    # export_to_excel's append is a store transaction followed by the workbook being written again
+    store = context.get_card_store()
+    doctor = "Doctor 0000"
+    sheet_name = timer.time("export_to_excel append (store)",
+                            lambda: store.add_card(doctor, SURGERIES[0], card), rows=len(card))
+    timer.time("export_to_excel append (workbook)", lambda: store.export_workbook(doctor),
+               sheets=len(store.get_sheet_names(doctor)))
+    workbook = store.workbook_path(doctor)
+    timer.time("get_sheet_names", lambda: app.get_sheet_names(workbook))
+    # a workbook the store doesn't hold is read directly; one card sheet out of the doctor's workbook
+    sheets = len(store.get_sheet_names(doctor))
+    timer.time("xlsx_reader sheet names", lambda: xlsx_reader.sheet_names(workbook), sheets=sheets)
+    timer.time("openpyxl sheet names", lambda: openpyxl.load_workbook(workbook, read_only=True).sheetnames,
+               sheets=sheets)
+    timer.time("xlsx_reader card sheet",
+               lambda: xlsx_reader.read_excel(workbook, sheet_name, columns=context.get_sheet_columns()),
+               sheets=sheets)
+    timer.time("pd.read_excel card sheet", lambda: pd.read_excel(workbook, sheet_name=sheet_name), sheets=sheets)
+    timer.time("process_sheet", lambda: app.process_sheet(workbook, sheet_name))
+    timer.time("process_sheet (not cached)", lambda: app.process_sheet(workbook, sheet_name),
+               setup=lambda: store.row_cache.clear())
+    manifest = app.CardManifest(store)
+    timer.time("card manifest refresh", manifest.refresh, setup=lambda: app.CardManifest.__init__(manifest, store),
+               cards=config["doctors"] * config["sheets"])
+    timer.time("card manifest search 'lap'", lambda: manifest.search("lap", True, 500))
+    # a day of cases drawn from the latest cards, some surgeries booked more than once
+    latest = list(manifest.latest.values())
+    rng = random.Random(0)
+    cases = [rng.choice(latest) for _ in range(PULL_LIST_CASES)]
+    schedule = pd.DataFrame({'Doctor': [entry.doctor for entry in cases],
+                             'Surgery': [entry.surgery for entry in cases]})
+    timer.time(f"pull list ({PULL_LIST_CASES} cases)", lambda: make_pull_list(store, schedule, manifest),
+               setup=lambda: store.row_cache.clear(), cases=PULL_LIST_CASES)
+
+    memory = context.memory_report()
+    if root is not None:
+        root.destroy()
+    store.close()
+    return {
+        "config": config,
+        "environment": {"python": sys.version.split()[0], "pandas": pd.__version__, "platform": platform.platform(),
+                        "cpus": os.cpu_count(), "gui": root is not None},
+        "results": timer.results,
+        "memory": memory,
+    }
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Time the load, select and export pipeline on synthetic data.")
+    parser.add_argument("data_directory", help="directory for the synthetic data")
+    parser.add_argument("--containers", type=int, default=10000, help="containers in the catalog (default 10000)")
+    parser.add_argument("--soft-goods", type=int, default=100000, help="soft goods in the catalog (default 100000)")
+    parser.add_argument("--doctors", type=int, default=50, help="doctor workbooks (default 50)")
+    parser.add_argument("--sheets", type=int, default=20, help="cards per doctor (default 20)")
+    parser.add_argument("--rows", type=int, default=40, help="items per card (default 40)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each timing, the median is reported")
+    parser.add_argument("--regenerate", action="store_true", help="generate the data even if it already exists")
+    parser.add_argument("--skip-gui", action="store_true", help="don't build any windows even with a display")
+    parser.add_argument("--json", default=None, help="write the results to this file (default: print them)")
+    options = parser.parse_args(args)
+
+    config = {"containers": options.containers, "soft_goods": options.soft_goods, "doctors": options.doctors,
+              "sheets": options.sheets, "rows": options.rows}
+    results = run(os.path.abspath(options.data_directory), config, options.repeat, options.regenerate,
+                  not options.skip_gui, output=sys.stderr if options.json is None else sys.stdout)
+    if options.json is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
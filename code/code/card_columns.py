@@ -0,0 +1,15 @@
+# Card Columns
+# The layout of a preference card sheet and the names the program keeps its files and settings under, shared
+# by the program and the command line tools so the tools don't have to load the windows to know them.
+
+# every card sheet has these columns, in this order
+SHEET_COLUMNS = ['Quantity', 'Service', 'Container Name', 'Item Description', 'Vendor Part #', 'Hold']
+INSTRUMENT_COLUMNS = ['Quantity', 'Service', 'Container Name', 'Hold']
+SOFT_GOODS_SHEET_COLUMNS = ['Quantity', 'Item Description', 'Vendor Part #', 'Hold']
+# the columns that identify a selected container or soft good
+INSTRUMENT_KEY_COLUMNS = ['Service', 'Container Name']
+SOFT_GOODS_KEY_COLUMNS = ['Item Description', 'Vendor Part #']
+# the parsed copies of the input workbooks are kept in this directory inside the in-directory
+CATALOG_CACHE_DIRECTORY_NAME = ".catalog_cache"
+# set to any value to have the app report its start-up times on stdout and quit (see startup_benchmark.py)
+STARTUP_BENCHMARK_VARIABLE = "PREFERENCE_CARD_STARTUP_BENCHMARK"
@@ -0,0 +1,100 @@
+# Card History
+# A new version of a card is stored as the rows that changed since the version before it.  Rows are keyed by
+# (Service, Container Name) for containers and (Item Description, Vendor Part #) for soft goods.  A change
+# records where the row sits in the new version (or that it was removed), so a version is rebuilt exactly,
+# in order, from the version before it.
+#
+# Rows are tuples in ROW_FIELDS order: (quantity, service, container name, item description, vendor part #, hold)
+
+from difflib import SequenceMatcher
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+def row_key(row):
+    _, service, container_name, item_description, vendor_part, _ = row
+    if container_name is not None:
+        return ("container", service, container_name)
+    return ("soft good", item_description, vendor_part)
+
+
+def has_duplicate_keys(keys):
+    return len(set(keys)) < len(keys)
+
+
+# (position, row) pairs that turn old_rows into new_rows; position is None for a removed row.  Rows that kept
+# their values and their order relative to each other aren't listed.  Returns None when either version has
+# the same item twice, because such a card can't be keyed (it's stored in full instead).
+def row_changes(old_rows, new_rows):
+    old_keys = [row_key(row) for row in old_rows]
+    new_keys = [row_key(row) for row in new_rows]
+    if has_duplicate_keys(old_keys) or has_duplicate_keys(new_keys):
+        return None
+    unchanged = set()
+    matcher = SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for old_start, new_start, size in matcher.get_matching_blocks():
+        for offset in range(size):
+            if old_rows[old_start + offset] == new_rows[new_start + offset]:
+                unchanged.add(new_keys[new_start + offset])
+    changes = [(position, row) for position, (key, row) in enumerate(zip(new_keys, new_rows))
+               if key not in unchanged]
+    new_key_set = set(new_keys)
+    changes.extend((None, row) for key, row in zip(old_keys, old_rows) if key not in new_key_set)
+    return changes
+
+
+def apply_changes(old_rows, changes, row_count):
+    changed_keys = {row_key(row) for _, row in changes}
+    rows = [None] * row_count
+    for position, row in changes:
+        if position is not None:
+            rows[position] = row
+    # the unchanged rows fill the remaining places in the order they had before
+    unchanged = iter(row for row in old_rows if row_key(row) not in changed_keys)
+    for position in range(row_count):
+        if rows[position] is None:
+            rows[position] = next(unchanged)
+    return rows
+
+
+# (change, old row, new row) for every item that was added, removed or had its quantity or hold changed,
+# in the order of the new version with removed items last
+def diff_rows(old_rows, new_rows):
+    old_by_key = {}
+    for row in old_rows:
+        old_by_key.setdefault(row_key(row), row)
+    differences = []
+    seen = set()
+    for row in new_rows:
+        key = row_key(row)
+        if key in seen:
+            continue
+        seen.add(key)
+        old_row = old_by_key.get(key)
+        if old_row is None:
+            differences.append((ADDED, None, row))
+        elif (old_row[0], bool(old_row[5])) != (row[0], bool(row[5])):
+            differences.append((CHANGED, old_row, row))
+    differences.extend((REMOVED, row, None) for key, row in old_by_key.items() if key not in seen)
+    return differences
+
+
+def describe_item(row):
+    _, service, container_name, item_description, vendor_part, _ = row
+    if container_name is not None:
+        return f"{container_name} ({service})" if service else str(container_name)
+    return f"{item_description} (#{vendor_part})"
+
+
+def describe_amount(row):
+    return f"{row[0]}{' on hold' if row[5] else ''}"
+
+
+def describe_difference(change, old_row, new_row):
+    if change == ADDED:
+        return f"+ {describe_item(new_row)}: {describe_amount(new_row)}"
+    if change == REMOVED:
+        return f"- {describe_item(old_row)}: was {describe_amount(old_row)}"
+    return f"~ {describe_item(new_row)}: {describe_amount(old_row)} -> {describe_amount(new_row)}"
@@ -0,0 +1,93 @@
+# Card Manifest
+# Every saved card in the out-directory (doctor, surgery, timestamp, version, row count) held in memory
+# with a search index over it, so a card can be found across all doctors without opening any workbook.
+# The manifest is read from the card store; refreshing it only picks up cards saved since the last refresh,
+# unless cards were deleted since then.
+
+from search_index import SearchIndex
+
+
+class ManifestEntry:
+
+    __slots__ = ("card_id", "doctor", "surgery", "created", "sheet_name", "version", "row_count")
+
+    def __init__(self, card_id, doctor, surgery, created, sheet_name, version, row_count):
+        self.card_id = card_id
+        self.doctor = doctor
+        self.surgery = surgery
+        self.created = created
+        self.sheet_name = sheet_name
+        self.version = version
+        self.row_count = row_count
+
+    def describe(self, latest=False):
+        date, _, time = self.created.partition("_")
+        created = f"{date} {time.replace('-', ':')}" if time else self.sheet_name
+        return (f"{self.doctor} - {self.surgery} - {created} "
+                f"(v{self.version}, {self.row_count} items){' latest' if latest else ''}")
+
+
+class CardManifest:
+
+    def __init__(self, store):
+        self.store = store
+        self.clear()
+
+    def clear(self):
+        self.entries = []
+        self.latest = {}
+        self.search_index = SearchIndex()
+        self.last_card_id = 0
+        self.generation = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    # Picks up new cards: workbooks changed outside the app are synced into the store first (unchanged ones
+    # cost a stat call; an edited sheet comes in as a new version), then only cards with ids past the last one
+    # seen are read.  When cards were deleted since the last refresh (compact_cards --keep) the manifest is
+    # read again from scratch.  Returns the number of cards read.
+    def refresh(self, sync=True):
+        if sync:
+            self.store.sync_directory()
+        # read before the cards, so cards deleted after this point are noticed on the next refresh
+        generation = self.store.generation()
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+        rows = self.store.connect().execute(
+            "SELECT id, doctor, surgery, created, sheet_name, version, row_count FROM cards WHERE id > ? ORDER BY id",
+            (self.last_card_id,)).fetchall()
+        for row in rows:
+            entry = ManifestEntry(*row)
+            self.entries.append(entry)
+            self.search_index.add((entry.doctor, entry.surgery, entry.created))
+            latest = self.latest.get((entry.doctor, entry.surgery))
+            if latest is None or entry.version > latest.version:
+                self.latest[(entry.doctor, entry.surgery)] = entry
+            self.last_card_id = entry.card_id
+        return len(rows)
+
+    def is_latest(self, entry):
+        return self.latest.get((entry.doctor, entry.surgery)) is entry
+
+    # Newest cards first.  An empty query lists everything.
+    def search(self, query, latest_only=False, limit=None):
+        rows = self.search_index.search(query)
+        if rows is None:
+            rows = range(len(self.entries))
+        found = []
+        for row in reversed(rows):
+            entry = self.entries[row]
+            if latest_only and not self.is_latest(entry):
+                continue
+            found.append(entry)
+            if limit is not None and len(found) >= limit:
+                break
+        return found
+
+    def get_doctors(self):
+        return sorted({doctor for doctor, _ in self.latest})
+
+    def get_latest(self, doctor, surgery):
+        return self.latest.get((doctor, surgery))
@@ -0,0 +1,218 @@
+# Card Service
+# An optional shared service: one process keeps the parsed catalogs in memory and hands them to the
+# workstations over HTTP, so a catalog is only parsed once however many workstations start up.
+#
+# Usage: python card_service.py [--in IN_DIRECTORY] [--host HOST] [--port PORT]
+#
+# Start the app with --service http://127.0.0.1:PORT (or set PREFERENCE_CARD_SERVICE) and it fetches the
+# catalogs from /catalog (see service_client).  Requests are GETs with query parameters and every answer is JSON:
+#   /status                                   catalogs held, requests served
+#   /catalog?name=FILE&size=N&mtime_ns=N      a catalog in the input directory as {"columns", "data"}; with
+#                                             size and mtime_ns, only if the service read that same version
+# It listens on localhost unless --host says otherwise.
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from card_columns import CATALOG_CACHE_DIRECTORY_NAME
+from catalog_cache import CatalogCache
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8470
+MAX_HEADER_LINES = 100
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           500: "Internal Server Error"}
+
+
+class RequestError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# What the service works out once per parsed version of a catalog
+class ServedCatalog:
+
+    __slots__ = ("entry", "frame", "payload", "lock")
+
+    def __init__(self, entry):
+        # the CatalogEntry, which says which version of the workbook was parsed
+        self.entry = entry
+        self.frame = entry.frame
+        self.payload = None
+        self.lock = threading.Lock()
+
+
+class CardService:
+
+    def __init__(self, in_directory):
+        self.in_directory = in_directory
+        self.catalog_cache = CatalogCache(os.path.join(in_directory, CATALOG_CACHE_DIRECTORY_NAME))
+        self.catalogs = {}
+        self.catalogs_lock = threading.Lock()
+        self.requests = 0
+        self.started = time.time()
+
+    def catalog(self, name):
+        # only workbooks in the input directory are served, whatever path the workstation sent
+        file_path = os.path.join(self.in_directory, os.path.basename(name or ""))
+        if not name or not file_path.lower().endswith(".xlsx") or not os.path.isfile(file_path):
+            raise RequestError(404, f"No catalog '{name}' in the input directory")
+        catalog_entry = self.catalog_cache.read_entry(file_path)
+        with self.catalogs_lock:
+            entry = self.catalogs.get(file_path)
+            if entry is None or entry.frame is not catalog_entry.frame:
+                # the workbook changed since it was last served
+                entry = self.catalogs[file_path] = ServedCatalog(catalog_entry)
+            return entry
+
+    def get_catalog(self, parameters):
+        entry = self.catalog(parameters.get("name"))
+        size = integer_parameter(parameters, "size", None)
+        mtime_ns = integer_parameter(parameters, "mtime_ns", None)
+        if ((size is not None and size != entry.entry.size) or
+                (mtime_ns is not None and mtime_ns != entry.entry.mtime_ns)):
+            # another file of the same name, or the workstation or the service has an older copy
+            raise RequestError(409, f"The service's copy of '{parameters.get('name')}' is a different version")
+        with entry.lock:
+            if entry.payload is None:
+                entry.payload = entry.frame.to_json(orient="split", index=False, date_format="iso").encode("utf-8")
+            return entry.payload
+
+    def status(self, parameters):
+        with self.catalogs_lock:
+            catalogs = dict(self.catalogs)
+        return {"catalogs": {os.path.basename(path): len(entry.frame) for path, entry in catalogs.items()},
+                "requests": self.requests, "uptime": round(time.time() - self.started, 1)}
+
+    # Returns the response body for a request path, e.g. "/catalog?name=..."
+    def respond(self, target):
+        url = urlsplit(target)
+        parameters = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        handler = {
+            "/status": self.status,
+            "/catalog": self.get_catalog,
+        }.get(url.path)
+        if handler is None:
+            raise RequestError(404, f"Unknown path {url.path}")
+        self.requests += 1
+        body = handler(parameters)
+        return body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+
+
+def integer_parameter(parameters, name, default):
+    value = parameters.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise RequestError(400, f"{name} must be a whole number")
+
+
+async def read_request(reader):
+    # (method, target, keep alive) or None when the workstation closed the connection
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    try:
+        method, target, version = request_line.decode("latin-1").split()
+    except ValueError:
+        raise RequestError(400, "Malformed request line")
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise RequestError(400, "Too many headers")
+    if headers.get("content-length"):
+        # no request has a body, but one sent anyway mustn't be read as the next request
+        await reader.readexactly(int(headers["content-length"]))
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method, target, keep_alive
+
+
+def write_response(writer, status, body, keep_alive):
+    writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                 f"Content-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n"
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body)
+
+
+async def handle_connection(service, reader, writer):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            keep_alive = False
+            try:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, target, keep_alive = request
+                if method != "GET":
+                    raise RequestError(405, f"{method} is not supported")
+                # parsing a catalog or building an index takes a while, so requests run on worker threads
+                # and one slow request doesn't hold up the others
+                status, body = 200, await loop.run_in_executor(None, service.respond, target)
+            except RequestError as e:
+                status, body = e.status, json.dumps({"error": str(e)}).encode("utf-8")
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                status, body = 500, json.dumps({"error": f"{type(e).__name__}: {e}"}).encode("utf-8")
+            write_response(writer, status, body, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, ready=None):
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(service, reader, writer),
+                                        host, port)
+    if ready is not None:
+        ready(server)
+    async with server:
+        await server.serve_forever()
+
+
+def run(in_directory, host=DEFAULT_HOST, port=DEFAULT_PORT, output=sys.stdout):
+    service = CardService(in_directory)
+
+    def ready(server):
+        address = server.sockets[0].getsockname()
+        print(f"Serving the catalogs in {in_directory} on http://{address[0]}:{address[1]}", file=output, flush=True)
+
+    asyncio.run(serve(service, host, port, ready))
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Share the parsed catalogs with the workstations.")
+    parser.add_argument("--in", dest="in_directory", default=".", help="directory with the input catalogs")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on (default {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port to listen on (default {DEFAULT_PORT})")
+    options = parser.parse_args(args)
+    try:
+        run(os.path.abspath(options.in_directory), options.host, options.port)
+    except OSError as e:
+        print(f"Card service failed: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
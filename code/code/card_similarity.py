@@ -0,0 +1,255 @@
+# Card Similarity
+# Finds groups of near-duplicate preference cards across doctors (e.g. several surgeons' cards for the same
+# procedure that differ by an item or two), as candidates for one standard template.
+#
+# Usage: python card_similarity.py [--out OUT_DIRECTORY] [--threshold SIMILARITY] [--permutations N]
+#                                  [--report FILE]
+#
+# Each card (the latest version of every doctor's surgeries) is treated as the set of its (Service, Container
+# Name) and (Vendor Part #, Quantity) items, and two cards are near-duplicates when their Jaccard similarity
+# (items in common / items on either) is at least the threshold.  Rather than comparing every card with every
+# other, each card's set is sketched as a MinHash signature and the signatures are split into bands; only
+# cards that share a band are compared, which finds similar pairs in roughly linear time.  Pairs are checked
+# against the exact similarity and joined into clusters.  Every cluster is reported against its template (the
+# items on more than half of its cards): what each card adds to it and what each card leaves out.
+
+import argparse
+import hashlib
+import os
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from card_columns import SHEET_COLUMNS
+from card_manifest import CardManifest
+from card_store import CardStore, text_value
+from drift import normalize_part_numbers
+from pull_list import CONTAINER, SOFT_GOOD, card_lines
+
+REPORT_FILE_NAME = "card_similarity.csv"
+REPORT_COLUMNS = ['Cluster', 'Doctor', 'Surgery', 'Card ID', 'Similarity', 'Change', 'Kind', 'Service',
+                  'Container Name', 'Item Description', 'Vendor Part #', 'Quantity']
+ITEM_COLUMNS = ['Kind', 'Service', 'Container Name', 'Item Description', 'Vendor Part #', 'Quantity']
+DEFAULT_THRESHOLD = 0.8
+DEFAULT_PERMUTATIONS = 128
+# the largest prime below 2**32: item hashes are 32 bits, so (a * hash + b) stays within 64 bits
+PRIME = 4294967291
+# fixed so a card gets the same signature on every run
+SEED = 20261018
+# items hashed at once when signing, a (items x permutations) block of 64 bit numbers
+CHUNK_SIZE = 1 << 15
+# clusters whose cards are listed when the scan finishes; the report has all of them
+PRINTED_CLUSTER_LIMIT = 10
+
+
+def clean_text(values):
+    # each distinct value is cleaned once; blanks become ""
+    codes, uniques = pd.factorize(values)
+    cleaned = [(text_value(value) or "").strip().casefold() for value in uniques] + [""]
+    return np.array(cleaned, dtype=object)[codes]
+
+
+# One key per card line: containers by service and name, soft goods by vendor part # (or description when a
+# line has no part #) and quantity.  Case, spacing and punctuation in part numbers are ignored.
+def item_keys(lines):
+    is_container = lines['Container Name'].notna().to_numpy()
+    part_codes, part_numbers = pd.factorize(lines['Vendor Part #'])
+    parts = np.append(normalize_part_numbers(pd.Series(part_numbers, dtype=object)).to_numpy(dtype=object), "")
+    parts = parts[part_codes]
+    soft_goods = (np.where(parts != "", "P\x1f" + parts, "D\x1f" + clean_text(lines['Item Description'])) +
+                  "\x1f" + clean_text(lines['Quantity']))
+    containers = "C\x1f" + clean_text(lines['Service']) + "\x1f" + clean_text(lines['Container Name'])
+    return np.where(is_container, containers, soft_goods)
+
+
+def item_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+# Items are numbered in the order they first appear.  Returns the card ids with at least one item, each
+# card's item numbers as a frozenset and their hashes as an array, and each item's key and columns (as it
+# was written on the first card that has it).
+def card_items(lines):
+    item_codes, keys = pd.factorize(item_keys(lines))
+    card_codes, card_ids = pd.factorize(lines['Card ID'])
+    firsts = np.unique(item_codes, return_index=True)[1]
+    kinds = np.where(lines['Container Name'].notna().to_numpy(), CONTAINER, SOFT_GOOD)
+    first_lines = lines.iloc[firsts].assign(Kind=kinds[firsts])
+    first_lines['Quantity'] = first_lines['Quantity'].map(text_value)
+    items = [(key,) + row for key, row in zip(keys, first_lines[ITEM_COLUMNS].itertuples(index=False, name=None))]
+    hashes = np.fromiter((item_hash(key) for key in keys), dtype=np.uint64, count=len(keys))
+    # each card's distinct items, grouped by card
+    pairs = np.unique(np.stack([card_codes, item_codes], axis=1), axis=0)
+    groups = np.split(pairs[:, 1], np.flatnonzero(np.diff(pairs[:, 0])) + 1) if len(pairs) else []
+    item_sets = [frozenset(group.tolist()) for group in groups]
+    hash_sets = [hashes[group] for group in groups]
+    return [int(card_ids[code]) for code in np.unique(pairs[:, 0])], item_sets, hash_sets, items
+
+
+def minhash_signatures(hash_sets, permutations=DEFAULT_PERMUTATIONS, seed=SEED):
+    generator = np.random.default_rng(seed)
+    a = generator.integers(1, PRIME, permutations, dtype=np.uint64)
+    b = generator.integers(0, PRIME, permutations, dtype=np.uint64)
+    signatures = np.empty((len(hash_sets), permutations), dtype=np.uint64)
+    start = 0
+    while start < len(hash_sets):
+        # a chunk of whole cards: every item through every permutation at once, then the minimum per card
+        end = start + 1
+        size = len(hash_sets[start])
+        while end < len(hash_sets) and size + len(hash_sets[end]) <= CHUNK_SIZE:
+            size += len(hash_sets[end])
+            end += 1
+        lengths = np.fromiter((len(hashes) for hashes in hash_sets[start:end]), dtype=np.int64, count=end - start)
+        hashed = (np.concatenate(hash_sets[start:end])[:, None] * a + b) % PRIME
+        signatures[start:end] = np.minimum.reduceat(hashed, np.concatenate(([0], np.cumsum(lengths[:-1]))), axis=0)
+        start = end
+    return signatures
+
+
+# (bands, rows per band) for the signature length.  Two cards share at least one band with a probability that
+# climbs steeply around (1 / bands) ** (1 / rows); the banding whose climb is closest below the threshold is
+# used, so that near-duplicates are rarely missed (pairs that aren't similar enough are dropped afterwards).
+def lsh_bands(threshold, permutations):
+    best = None
+    for rows in range(1, permutations + 1):
+        bands = permutations // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if midpoint <= threshold and (best is None or midpoint > best[0]):
+            best = (midpoint, bands, rows)
+    return best[1:] if best is not None else (permutations, 1)
+
+
+def jaccard(first, second):
+    union = len(first | second)
+    return len(first & second) / union if union else 1.0
+
+
+class DisjointSets:
+
+    def __init__(self, size):
+        self.parents = list(range(size))
+
+    def find(self, member):
+        parents = self.parents
+        while parents[member] != member:
+            parents[member] = parents[parents[member]]
+            member = parents[member]
+        return member
+
+    def join(self, first, second):
+        self.parents[self.find(second)] = self.find(first)
+
+    def groups(self):
+        groups = {}
+        for member in range(len(self.parents)):
+            groups.setdefault(self.find(member), []).append(member)
+        return [members for members in groups.values() if len(members) > 1]
+
+
+# Clusters of card positions (largest first) and the number of pairs whose exact similarity was checked
+def find_clusters(item_sets, signatures, threshold, bands, rows):
+    clusters = DisjointSets(len(item_sets))
+    compared = 0
+    for band in range(bands):
+        buckets = {}
+        for position, key in enumerate(map(bytes, signatures[:, band * rows:(band + 1) * rows])):
+            buckets.setdefault(key, []).append(position)
+        for members in buckets.values():
+            for index, first in enumerate(members):
+                for second in members[index + 1:]:
+                    # cards already joined through other pairs aren't compared again
+                    if clusters.find(first) == clusters.find(second):
+                        continue
+                    compared += 1
+                    if jaccard(item_sets[first], item_sets[second]) >= threshold:
+                        clusters.join(first, second)
+    return sorted(clusters.groups(), key=lambda members: (-len(members), members[0])), compared
+
+
+# One report line per item a card adds to or leaves out of its cluster's template ("+" and "-"), or a single
+# "=" line for a card that matches the template exactly
+def cluster_report(clusters, entries, item_sets, items):
+    def item_order(item):
+        # containers, then soft goods, by key
+        return items[item][0]
+
+    lines = []
+    for number, members in enumerate(clusters, start=1):
+        counts = Counter(item for member in members for item in item_sets[member])
+        template = frozenset(item for item, count in counts.items() if count * 2 > len(members))
+        for member in sorted(members, key=lambda member: (entries[member].doctor, entries[member].surgery)):
+            entry = entries[member]
+            card = [number, entry.doctor, entry.surgery, entry.card_id, round(jaccard(item_sets[member], template), 3)]
+            changes = ([("+", item) for item in sorted(item_sets[member] - template, key=item_order)] +
+                       [("-", item) for item in sorted(template - item_sets[member], key=item_order)])
+            if not changes:
+                lines.append(card + ["="] + [None] * len(ITEM_COLUMNS))
+            lines.extend(card + [change] + list(items[item][1:]) for change, item in changes)
+    return pd.DataFrame(lines, columns=REPORT_COLUMNS)
+
+
+def find_similar_cards(store, manifest, threshold=DEFAULT_THRESHOLD, permutations=DEFAULT_PERMUTATIONS):
+    by_id = {entry.card_id: entry for entry in manifest.latest.values()}
+    card_ids, item_sets, hash_sets, items = card_items(card_lines(store, sorted(by_id)))
+    signatures = minhash_signatures(hash_sets, permutations)
+    bands, rows = lsh_bands(threshold, permutations)
+    clusters, compared = find_clusters(item_sets, signatures, threshold, bands, rows)
+    entries = [by_id[card_id] for card_id in card_ids]
+    return cluster_report(clusters, entries, item_sets, items), len(card_ids), compared
+
+
+def run(out_directory, threshold=DEFAULT_THRESHOLD, permutations=DEFAULT_PERMUTATIONS, report_path=None,
+        output=sys.stdout):
+    if not 0 < threshold <= 1:
+        raise ValueError("the threshold must be above 0 and at most 1")
+    start = time.perf_counter()
+    store = CardStore(out_directory, SHEET_COLUMNS)
+    try:
+        manifest = CardManifest(store)
+        manifest.refresh()
+        report, card_count, compared = find_similar_cards(store, manifest, threshold, permutations)
+    finally:
+        store.close()
+    if report_path is None:
+        report_path = os.path.join(out_directory, REPORT_FILE_NAME)
+    report.to_csv(report_path, index=False)
+    clusters = report.groupby('Cluster', sort=True)
+    print(f"{card_count} cards sketched, {compared} candidate pairs checked: {len(clusters)} clusters of cards at "
+          f"least {threshold:.0%} alike ({report['Card ID'].nunique()} cards) in {time.perf_counter() - start:.2f}s. "
+          f"Report written to {report_path}", file=output)
+    for number, cluster in list(clusters)[:PRINTED_CLUSTER_LIMIT]:
+        cards = cluster.groupby(['Doctor', 'Surgery', 'Card ID'], sort=False)
+        print(f"  Cluster {number}: {len(cards)} cards", file=output)
+        for (doctor, surgery, card_id), changes in cards:
+            added = (changes['Change'] == "+").sum()
+            missing = (changes['Change'] == "-").sum()
+            print(f"    {doctor} - {surgery}: {changes['Similarity'].iloc[0]:.0%} of the template, "
+                  f"{added} added, {missing} left out", file=output)
+    if len(clusters) > PRINTED_CLUSTER_LIMIT:
+        print(f"  ... and {len(clusters) - PRINTED_CLUSTER_LIMIT} more clusters", file=output)
+    return report
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Find groups of near-duplicate preference cards across doctors.")
+    parser.add_argument("--out", dest="out_directory", default=".", help="directory with the preference cards")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"least share of items two cards have in common (default {DEFAULT_THRESHOLD})")
+    parser.add_argument("--permutations", type=int, default=DEFAULT_PERMUTATIONS,
+                        help=f"MinHash signature length (default {DEFAULT_PERMUTATIONS})")
+    parser.add_argument("--report", default=None, help=f"CSV report to write (defaults to {REPORT_FILE_NAME} "
+                                                        f"in the out directory)")
+    options = parser.parse_args(args)
+    try:
+        run(os.path.abspath(options.out_directory), options.threshold, options.permutations, options.report)
+    except (OSError, ValueError) as e:
+        print(f"Similarity scan failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
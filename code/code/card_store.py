@@ -0,0 +1,574 @@
+# Card Store
+# Every saved preference card lives in one SQLite database in the out-directory.  Saving a card is a single
+# small transaction however many cards the doctor already has, and <doctor>.xlsx is generated from the store
+# for sterile processing rather than being rewritten in place on every save.
+# Each new version of a surgery's card only stores the rows that changed (see card_history), with a full copy
+# every SNAPSHOT_INTERVAL versions so rebuilding a version never has to replay a long chain.
+# Saves and workbook writes for one doctor hold that doctor's lock (see doctor_lock), and every save is
+# journaled until its workbook is written (see save_journal), since the out-directory can be shared.
+
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from card_history import apply_changes, diff_rows, row_changes
+from doctor_lock import DoctorLocks
+from save_journal import SaveJournal
+from xlsx_reader import XlsxWorkbook
+
+DATABASE_NAME = "preference_cards.db"
+TIMESTAMP_FORMAT = '%Y-%m-%d_%H-%M-%S'
+# sheets are named {surgery}_{timestamp}
+SHEET_NAME_PATTERN = re.compile(r"^(?P<surgery>.*)_(?P<created>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})$")
+# the database columns, in the same order as the sheet columns
+ROW_FIELDS = ("quantity", "service", "container_name", "item_description", "vendor_part", "hold")
+# most versions in a row stored as changes before the next full copy
+SNAPSHOT_INTERVAL = 20
+# rebuilt versions kept in memory; consecutive versions are usually rebuilt one after another
+ROW_CACHE_SIZE = 256
+
+# AUTOINCREMENT so the id of a card dropped by compaction is never given to another card, which a copy of the
+# id kept elsewhere (a row cache, a render state) would then take for the old one
+CARDS_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doctor TEXT NOT NULL,
+    surgery TEXT NOT NULL,
+    created TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    base_id INTEGER REFERENCES cards (id),
+    depth INTEGER NOT NULL DEFAULT 0
+);
+"""
+CARD_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS cards_by_sheet ON cards (doctor, sheet_name);
+CREATE INDEX IF NOT EXISTS cards_by_surgery ON cards (doctor, surgery, version);
+"""
+SCHEMA = CARDS_TABLE.format(name="cards") + CARD_INDEXES + """
+CREATE TABLE IF NOT EXISTS card_rows (
+    card_id INTEGER NOT NULL REFERENCES cards (id),
+    position INTEGER NOT NULL,
+    quantity INTEGER,
+    service TEXT,
+    container_name TEXT,
+    item_description TEXT,
+    vendor_part TEXT,
+    hold INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (card_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS card_changes (
+    card_id INTEGER NOT NULL REFERENCES cards (id),
+    sequence INTEGER NOT NULL,
+    position INTEGER,
+    quantity INTEGER,
+    service TEXT,
+    container_name TEXT,
+    item_description TEXT,
+    vendor_part TEXT,
+    hold INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (card_id, sequence)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS store_info (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workbooks (
+    doctor TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+"""
+
+
+def cards_autoincrement(connection):
+    table = connection.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'cards'").fetchone()
+    return "AUTOINCREMENT" in table[0].upper()
+
+
+def split_sheet_name(sheet_name):
+    match = SHEET_NAME_PATTERN.match(sheet_name)
+    if match is None:
+        return sheet_name, ""
+    return match.group("surgery"), match.group("created")
+
+
+def is_workbook_name(name):
+    # skips Excel's lock files and our own half-written exports
+    return name.endswith(".xlsx") and not name.startswith(("~$", "."))
+
+
+def doctor_for_workbook(file_path):
+    return os.path.splitext(os.path.basename(file_path))[0]
+
+
+def temporary_workbook_path(file_path):
+    # the writer needs an .xlsx name; the leading dot keeps the half-written file out of directory scans
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.xlsx")
+
+
+# Writes (sheet name, frame) pairs to a temporary file and renames it over file_path, so the workbook is
+# either the old one or the complete new one even if the app is closed in the middle of a write
+def write_workbook(file_path, sheets):
+    import pandas as pd
+    temp = temporary_workbook_path(file_path)
+    try:
+        with pd.ExcelWriter(temp, engine="openpyxl") as writer:
+            for sheet_name, frame in sheets:
+                frame.to_excel(writer, sheet_name=sheet_name, index=False)
+        os.replace(temp, file_path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def cell_value(value):
+    # blank spreadsheet cells come back as NaN
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return value
+
+
+def text_value(value):
+    value = cell_value(value)
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def quantity_value(value):
+    value = cell_value(value)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def frame_rows(frame, sheet_columns):
+    # older sheets can be missing columns (e.g. Service), those cells are left empty
+    frame = frame.reindex(columns=sheet_columns)
+    rows = []
+    for quantity, service, container_name, item_description, vendor_part, hold in frame.itertuples(index=False):
+        hold = cell_value(hold)
+        rows.append((quantity_value(quantity), text_value(service), text_value(container_name),
+                     text_value(item_description), text_value(vendor_part), 1 if hold else 0))
+    return rows
+
+
+class CardStore:
+
+    def __init__(self, directory, sheet_columns):
+        self.directory = directory
+        self.database_path = os.path.join(directory, DATABASE_NAME)
+        self.sheet_columns = list(sheet_columns)
+        self.local = threading.local()
+        self.row_cache = OrderedDict()
+        self.row_cache_lock = threading.Lock()
+        self.locks = DoctorLocks(directory)
+        self.journal = SaveJournal(directory)
+        os.makedirs(directory, exist_ok=True)
+        with self.transaction() as connection:
+            connection.executescript(SCHEMA)
+            self.migrate(connection)
+
+    @staticmethod
+    def migrate(connection):
+        # databases from before card history was stored as changes: their cards all become full copies
+        columns = {row[1] for row in connection.execute("PRAGMA table_info(cards)")}
+        if "base_id" not in columns:
+            connection.execute("ALTER TABLE cards ADD COLUMN base_id INTEGER REFERENCES cards (id)")
+            connection.execute("ALTER TABLE cards ADD COLUMN depth INTEGER NOT NULL DEFAULT 0")
+        # databases from before card ids were AUTOINCREMENT are copied into a table whose ids are
+        if not cards_autoincrement(connection):
+            if not connection.in_transaction:
+                connection.execute("BEGIN IMMEDIATE")
+            # another workstation may have copied it while this one waited for the write lock
+            if not cards_autoincrement(connection):
+                connection.execute(CARDS_TABLE.format(name="cards_autoincrement"))
+                connection.execute("INSERT INTO cards_autoincrement SELECT id, doctor, surgery, created, sheet_name, "
+                                   "version, row_count, base_id, depth FROM cards")
+                connection.execute("DROP TABLE cards")
+                connection.execute("ALTER TABLE cards_autoincrement RENAME TO cards")
+                for statement in CARD_INDEXES.split(";"):
+                    connection.execute(statement)
+
+    def get_directory(self):
+        return self.directory
+
+    def connect(self):
+        # sqlite connections can't be shared between threads, so each thread gets its own
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            # the default rollback journal (not WAL) because the out-directory is often a network share
+            connection = sqlite3.connect(self.database_path, timeout=30)
+            self.local.connection = connection
+        return connection
+
+    # Used as "with store.transaction() as connection:", commits on success and rolls back on error.  Rows
+    # rebuilt or stored during the transaction are only cached once it commits: the id of a card whose save was
+    # rolled back is handed out again, possibly to another user's card.
+    @contextmanager
+    def transaction(self):
+        connection = self.connect()
+        pending = self.local.pending_rows = {}
+        try:
+            with connection:
+                yield connection
+        finally:
+            self.local.pending_rows = None
+        for card_id, rows in pending.items():
+            self.cache_rows(card_id, rows)
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    # Used as "with store.doctor_lock(doctor):" around anything that changes the doctor's cards or workbook
+    def doctor_lock(self, doctor):
+        return self.locks.get(doctor)
+
+    def workbook_path(self, doctor):
+        return os.path.join(self.directory, f"{doctor}.xlsx")
+
+    # only workbooks in the out-directory are backed by the store, anything else is read as a plain file
+    def holds_workbook(self, file_path):
+        return os.path.dirname(os.path.abspath(file_path)) == os.path.abspath(self.directory)
+
+    # Bumped whenever cards are deleted, so anything that lists the cards knows to read them all again
+    def generation(self):
+        row = self.connect().execute("SELECT value FROM store_info WHERE name = 'generation'").fetchone()
+        return row[0] if row is not None else 0
+
+    def has_doctor(self, doctor):
+        row = self.connect().execute("SELECT 1 FROM cards WHERE doctor = ? LIMIT 1", (doctor,)).fetchone()
+        return row is not None
+
+    def get_doctors(self):
+        return [row[0] for row in self.connect().execute("SELECT DISTINCT doctor FROM cards ORDER BY doctor")]
+
+    def get_sheet_names(self, doctor):
+        return [row[0] for row in
+                self.connect().execute("SELECT sheet_name FROM cards WHERE doctor = ? ORDER BY id", (doctor,))]
+
+    def has_sheet(self, doctor, sheet_name):
+        row = self.connect().execute("SELECT 1 FROM cards WHERE doctor = ? AND sheet_name = ?",
+                                     (doctor, sheet_name)).fetchone()
+        return row is not None
+
+    def insert_card(self, connection, doctor, sheet_name, rows):
+        surgery, created = split_sheet_name(sheet_name)
+        previous = connection.execute(
+            "SELECT id, version, depth FROM cards WHERE doctor = ? AND surgery = ? ORDER BY version DESC LIMIT 1",
+            (doctor, surgery)).fetchone()
+        version = previous[1] + 1 if previous is not None else 1
+        card_id = connection.execute(
+            "INSERT INTO cards (doctor, surgery, created, sheet_name, version, row_count) VALUES (?, ?, ?, ?, ?, ?)",
+            (doctor, surgery, created, sheet_name, version, len(rows))).lastrowid
+        if previous is not None:
+            previous = (previous[0], previous[2], self.rebuild_rows(connection, previous[0]))
+        self.store_rows(connection, card_id, rows, previous)
+        return card_id
+
+    # Stores a version's rows as changes from the previous version, i.e. (card id, depth, rows), when that is
+    # smaller than a full copy and the chain back to the last full copy isn't too long yet
+    def store_rows(self, connection, card_id, rows, previous=None):
+        rows = [tuple(row) for row in rows]
+        changes = None
+        if previous is not None and previous[1] + 1 < SNAPSHOT_INTERVAL:
+            changes = row_changes(previous[2], rows)
+        if changes is None or len(changes) >= len(rows):
+            connection.execute("UPDATE cards SET base_id = NULL, depth = 0 WHERE id = ?", (card_id,))
+            connection.executemany(
+                f"INSERT INTO card_rows (card_id, position, {', '.join(ROW_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(card_id, position) + row for position, row in enumerate(rows)])
+            self.keep_rows(card_id, rows)
+            return 0
+        connection.execute("UPDATE cards SET base_id = ?, depth = ? WHERE id = ?",
+                           (previous[0], previous[1] + 1, card_id))
+        connection.executemany(
+            f"INSERT INTO card_changes (card_id, sequence, position, {', '.join(ROW_FIELDS)}) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(card_id, sequence, position) + row for sequence, (position, row) in enumerate(changes)])
+        self.keep_rows(card_id, rows)
+        return previous[1] + 1
+
+    def cached_rows(self, card_id):
+        pending = getattr(self.local, "pending_rows", None)
+        if pending and card_id in pending:
+            return pending[card_id]
+        with self.row_cache_lock:
+            rows = self.row_cache.get(card_id)
+            if rows is not None:
+                self.row_cache.move_to_end(card_id)
+            return rows
+
+    def keep_rows(self, card_id, rows):
+        pending = getattr(self.local, "pending_rows", None)
+        if pending is not None:
+            pending[card_id] = rows
+        else:
+            self.cache_rows(card_id, rows)
+
+    def cache_rows(self, card_id, rows):
+        with self.row_cache_lock:
+            self.row_cache[card_id] = rows
+            self.row_cache.move_to_end(card_id)
+            while len(self.row_cache) > ROW_CACHE_SIZE:
+                self.row_cache.popitem(last=False)
+
+    # The rows of one version as tuples in ROW_FIELDS order: the nearest cached version or full copy
+    # before it, with the changes after that applied in order
+    def rebuild_rows(self, connection, card_id):
+        chain = []
+        current = card_id
+        while True:
+            rows = self.cached_rows(current)
+            if rows is not None:
+                break
+            card = connection.execute("SELECT base_id, row_count FROM cards WHERE id = ?", (current,)).fetchone()
+            if card is None:
+                raise KeyError(f"No card with id {current}")
+            if card[0] is None:
+                rows = [tuple(row) for row in connection.execute(
+                    f"SELECT {', '.join(ROW_FIELDS)} FROM card_rows WHERE card_id = ? ORDER BY position",
+                    (current,))]
+                self.keep_rows(current, rows)
+                break
+            chain.append((current, card[1]))
+            current = card[0]
+        for current, row_count in reversed(chain):
+            changes = [(row[0], tuple(row[1:])) for row in connection.execute(
+                f"SELECT position, {', '.join(ROW_FIELDS)} FROM card_changes WHERE card_id = ? ORDER BY sequence",
+                (current,))]
+            rows = apply_changes(rows, changes, row_count)
+            self.keep_rows(current, rows)
+        return rows
+
+    def unused_sheet_name(self, doctor, surgery, created, taken=()):
+        # two saves of the same surgery in one second would otherwise share a sheet name
+        while True:
+            sheet_name = f"{surgery}_{created.strftime(TIMESTAMP_FORMAT)}"
+            if sheet_name not in taken and not self.has_sheet(doctor, sheet_name):
+                return sheet_name
+            created += timedelta(seconds=1)
+
+    # Saves a new version of a card and returns its sheet name
+    def add_card(self, doctor, surgery, frame, created=None):
+        return self.add_cards(doctor, [(surgery, frame, created)])[0]
+
+    # Saves several cards for one doctor in a single transaction; cards are (surgery, frame, created) tuples
+    def add_cards(self, doctor, cards):
+        with self.doctor_lock(doctor):
+            journaled = []
+            sheet_names = set()
+            for surgery, frame, created in cards:
+                if created is None:
+                    created = datetime.now()
+                sheet_name = self.unused_sheet_name(doctor, surgery, created, sheet_names)
+                sheet_names.add(sheet_name)
+                journaled.append((sheet_name, frame_rows(frame, self.sheet_columns)))
+            entry = self.journal.record(doctor, journaled)
+            try:
+                with self.transaction() as connection:
+                    for sheet_name, rows in journaled:
+                        self.insert_card(connection, doctor, sheet_name, rows)
+            except BaseException:
+                # the save was rolled back and reported, so there is nothing to finish later
+                self.journal.discard(entry)
+                raise
+        return [sheet_name for sheet_name, _ in journaled]
+
+    # Stores the cards of journal entries whose save was cut short (the rest are stored already).  The
+    # caller holds the doctor's lock, so no other save of this doctor is still running.
+    def replay_journal(self, entries):
+        replayed = 0
+        with self.transaction() as connection:
+            for entry in entries:
+                for sheet_name, rows in entry.cards:
+                    if not self.has_sheet(entry.doctor, sheet_name):
+                        self.insert_card(connection, entry.doctor, sheet_name, rows)
+                        replayed += 1
+        return replayed
+
+    # Doctors with saves whose workbook hasn't been written yet, including saves a crash cut short
+    def pending_doctors(self):
+        return self.journal.pending_doctors()
+
+    def load_card(self, doctor, sheet_name):
+        connection = self.connect()
+        card = connection.execute("SELECT id FROM cards WHERE doctor = ? AND sheet_name = ?",
+                                  (doctor, sheet_name)).fetchone()
+        if card is None:
+            raise KeyError(f"No card '{sheet_name}' for '{doctor}'")
+        return self.load_card_rows(card[0])
+
+    def load_card_rows(self, card_id):
+        import pandas as pd
+        rows = self.rebuild_rows(self.connect(), card_id)
+        frame = pd.DataFrame(rows, columns=self.sheet_columns)
+        frame[self.sheet_columns[-1]] = frame[self.sheet_columns[-1]].astype(bool)
+        return frame
+
+    def previous_card_id(self, card_id):
+        row = self.connect().execute(
+            "SELECT previous.id FROM cards AS card JOIN cards AS previous "
+            "ON previous.doctor = card.doctor AND previous.surgery = card.surgery AND previous.version < card.version "
+            "WHERE card.id = ? ORDER BY previous.version DESC LIMIT 1", (card_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    # (change, old row, new row) for every item that differs between two versions, see card_history.diff_rows
+    def diff_cards(self, old_card_id, new_card_id):
+        connection = self.connect()
+        old_rows = self.rebuild_rows(connection, old_card_id) if old_card_id is not None else []
+        return diff_rows(old_rows, self.rebuild_rows(connection, new_card_id))
+
+    # Re-stores the history of every surgery (or one doctor's) as full copies plus changes, e.g. for cards saved
+    # before history was kept as changes.  With keep, only the newest keep versions of each surgery are kept.
+    # Returns the doctors whose cards were dropped, whose workbooks need exporting again.
+    def compact_history(self, doctor=None, keep=None):
+        query = "SELECT id, doctor, surgery FROM cards"
+        parameters = ()
+        if doctor is not None:
+            query += " WHERE doctor = ?"
+            parameters = (doctor,)
+        changed_doctors = set()
+        with self.transaction() as connection:
+            # the write lock is taken before the cards are read, so another user can't save a card (based on a
+            # version that is about to be dropped) in between
+            connection.execute("BEGIN IMMEDIATE")
+            chains = OrderedDict()
+            for card_id, card_doctor, surgery in connection.execute(query + " ORDER BY doctor, surgery, version",
+                                                                    parameters).fetchall():
+                chains.setdefault((card_doctor, surgery), []).append(card_id)
+            for (card_doctor, surgery), card_ids in chains.items():
+                dropped = []
+                if keep is not None and len(card_ids) > keep:
+                    dropped, card_ids = card_ids[:-keep], card_ids[-keep:]
+                    changed_doctors.add(card_doctor)
+                versions = [(card_id, self.rebuild_rows(connection, card_id)) for card_id in card_ids]
+                for card_id in dropped + card_ids:
+                    connection.execute("DELETE FROM card_rows WHERE card_id = ?", (card_id,))
+                    connection.execute("DELETE FROM card_changes WHERE card_id = ?", (card_id,))
+                connection.executemany("DELETE FROM cards WHERE id = ?", [(card_id,) for card_id in dropped])
+                if dropped:
+                    connection.execute("INSERT INTO store_info (name, value) VALUES ('generation', 1) "
+                                       "ON CONFLICT (name) DO UPDATE SET value = value + 1")
+                previous = None
+                for card_id, rows in versions:
+                    depth = self.store_rows(connection, card_id, rows, previous)
+                    previous = (card_id, depth, rows)
+        with self.row_cache_lock:
+            self.row_cache.clear()
+        connection.execute("VACUUM")
+        return sorted(changed_doctors)
+
+    def latest_sheet_name(self, doctor, surgery):
+        row = self.connect().execute(
+            "SELECT sheet_name FROM cards WHERE doctor = ? AND surgery = ? ORDER BY version DESC LIMIT 1",
+            (doctor, surgery)).fetchone()
+        return row[0] if row is not None else None
+
+    def remember_workbook(self, connection, doctor, file_path):
+        stat = os.stat(file_path)
+        connection.execute("INSERT OR REPLACE INTO workbooks (doctor, size, mtime_ns) VALUES (?, ?, ?)",
+                           (doctor, stat.st_size, stat.st_mtime_ns))
+
+    def workbook_changed(self, doctor, file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return False
+        known = self.connect().execute("SELECT size, mtime_ns FROM workbooks WHERE doctor = ?", (doctor,)).fetchone()
+        return known is None or known != (stat.st_size, stat.st_mtime_ns)
+
+    # Brings in any sheets that were added to <doctor>.xlsx outside the app (or before the store existed), and
+    # any sheets that were edited there: an edited sheet becomes a new version of its surgery, dated when the
+    # workbook was saved, so the edit isn't lost when the workbook is next written.  Unchanged workbooks cost a
+    # stat call.  Returns the number of cards stored.
+    def sync_workbook(self, file_path):
+        doctor = doctor_for_workbook(file_path)
+        if not self.workbook_changed(doctor, file_path):
+            return 0
+        with self.doctor_lock(doctor):
+            # another user may have written the workbook while this one waited for the lock
+            if not self.workbook_changed(doctor, file_path):
+                return 0
+            with XlsxWorkbook(file_path) as workbook:
+                # the text columns are read as they were written, or a part # like "0012" would come back as
+                # 12 and an untouched sheet would look edited
+                sheets = {sheet_name: frame_rows(workbook.read_sheet(sheet_name, self.sheet_columns,
+                                                                     self.sheet_columns[1:-1]),
+                                                 self.sheet_columns)
+                          for sheet_name in workbook.sheet_names()}
+            edited = datetime.fromtimestamp(os.stat(file_path).st_mtime).replace(microsecond=0)
+            imported = 0
+            with self.transaction() as connection:
+                new_sheet_names = set()
+                for sheet_name, rows in sheets.items():
+                    card = connection.execute("SELECT id FROM cards WHERE doctor = ? AND sheet_name = ?",
+                                              (doctor, sheet_name)).fetchone()
+                    if card is None:
+                        self.insert_card(connection, doctor, sheet_name, rows)
+                    elif self.rebuild_rows(connection, card[0]) != rows:
+                        surgery, _ = split_sheet_name(sheet_name)
+                        # the workbook isn't rewritten here, so an edit stored by an earlier sync is still there
+                        latest = connection.execute(
+                            "SELECT id FROM cards WHERE doctor = ? AND surgery = ? ORDER BY version DESC LIMIT 1",
+                            (doctor, surgery)).fetchone()
+                        if latest[0] != card[0] and self.rebuild_rows(connection, latest[0]) == rows:
+                            continue
+                        edited_sheet_name = self.unused_sheet_name(doctor, surgery, edited, new_sheet_names)
+                        new_sheet_names.add(edited_sheet_name)
+                        self.insert_card(connection, doctor, edited_sheet_name, rows)
+                    else:
+                        continue
+                    imported += 1
+                self.remember_workbook(connection, doctor, file_path)
+        return imported
+
+    def sync_directory(self):
+        imported = 0
+        for name in sorted(os.listdir(self.directory)):
+            if is_workbook_name(name):
+                imported += self.sync_workbook(os.path.join(self.directory, name))
+        return imported
+
+    # Writes every card for the doctor to <doctor>.xlsx, one sheet per card in the order they were saved.
+    # Writing the doctor's own workbook also finishes any of the doctor's journaled saves.
+    def export_workbook(self, doctor, file_path=None):
+        if file_path is None:
+            file_path = self.workbook_path(doctor)
+        if not self.holds_workbook(file_path):
+            return self.write_cards(doctor, file_path)
+        with self.doctor_lock(doctor):
+            # read under the lock, so every save that finished before the lock was taken is in the workbook
+            entries = self.journal.entries(doctor)
+            if entries:
+                self.replay_journal(entries)
+            written = self.write_cards(doctor, file_path)
+            if written is not None:
+                with self.transaction() as connection:
+                    self.remember_workbook(connection, doctor, file_path)
+            for entry in entries:
+                self.journal.discard(entry)
+        return written
+
+    def write_cards(self, doctor, file_path):
+        cards = self.connect().execute("SELECT id, sheet_name FROM cards WHERE doctor = ? ORDER BY id",
+                                       (doctor,)).fetchall()
+        if not cards:
+            return None
+        write_workbook(file_path, ((sheet_name, self.load_card_rows(card_id)) for card_id, sheet_name in cards))
+        return file_path
@@ -0,0 +1,289 @@
+# Catalog Cache
+# Keeps parsed copies of the input workbooks so each one is only read from Excel once (with xlsx_reader, keeping
+# just the columns the app uses from a container or soft goods catalog).  When a workbook is
+# replaced (e.g. the weekly export), the new version is compared with the one read before it and the changes
+# are kept with it (see catalog_changes).
+
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+
+from catalog_changes import CatalogChanges, compare_catalogs
+from file_discovery import CONTAINER_COLUMNS, SOFT_GOODS_COLUMNS
+from xlsx_reader import read_excel as read_workbook
+
+# bump this whenever the snapshot layout changes so old snapshots are ignored
+SNAPSHOT_VERSION = 5
+SNAPSHOT_EXTENSION = ".snapshot"
+# the frames held in a CatalogChanges, in the order its constructor takes them
+CHANGES_FRAMES = ("added", "removed", "changed_before", "changed_after")
+# level 1 keeps snapshots small without making them noticeably slower to load
+SNAPSHOT_COMPRESSION = 1
+# text columns with at most this share of distinct values are stored as categories
+CATEGORY_RATIO = 0.5
+
+
+def catalog_columns(header):
+    # only the columns the app uses are kept from a container or soft goods catalog
+    for columns in (CONTAINER_COLUMNS, SOFT_GOODS_COLUMNS):
+        if columns.issubset(header):
+            return columns
+    return None
+
+
+def read_excel(file_path):
+    return compact_frame(read_workbook(file_path, columns=catalog_columns))
+
+
+# Text columns that repeat a handful of values (e.g. Service) become categories; other text values are
+# interned so the same description or part # on several rows (multi-site reports) is stored once.  The
+# row lists and indexes built from the frame then share the same string objects.
+def compact_frame(frame):
+    import pandas as pd
+    for column in frame.columns:
+        values = frame[column]
+        # object columns, or the str columns newer pandas versions make
+        if isinstance(values.dtype, pd.CategoricalDtype) or not pd.api.types.is_string_dtype(values.dtype):
+            continue
+        present = values.dropna()
+        if present.empty:
+            continue
+        if not all(isinstance(value, str) for value in present):
+            frame[column] = values.map(lambda value: sys.intern(value) if isinstance(value, str) else value)
+        elif present.nunique() <= len(present) * CATEGORY_RATIO:
+            frame[column] = values.astype("category")
+        else:
+            frame[column] = values.map(sys.intern, na_action="ignore")
+    return frame
+
+
+# Snapshots are JSON, a column at a time with its dtype, so loading one from the shared in-directory can only
+# ever give back data.  Strings are interned again as compact_frame has them.
+def column_state(values):
+    import pandas as pd
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return {"categories": column_state(pd.Series(values.cat.categories)), "codes": values.cat.codes.tolist()}
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return {"dtype": str(values.dtype),
+                "values": [None if pd.isna(value) else value.isoformat() for value in values]}
+    return {"dtype": str(values.dtype), "values": values.astype(object).where(values.notna(), None).tolist()}
+
+
+def column_from_state(state):
+    import numpy as np
+    import pandas as pd
+    if "codes" in state:
+        return pd.Categorical.from_codes(state["codes"], categories=pd.Index(column_from_state(state["categories"])))
+    if state["dtype"].startswith("datetime64"):
+        return pd.Series(pd.to_datetime(state["values"], format="ISO8601")).astype(state["dtype"])
+    values = [sys.intern(value) if isinstance(value, str) else np.nan if value is None else value
+              for value in state["values"]]
+    return pd.Series(values, dtype=state["dtype"])
+
+
+def frame_state(frame):
+    return {"length": len(frame), "columns": [[name, column_state(frame[name])] for name in frame.columns]}
+
+
+def frame_from_state(state):
+    import pandas as pd
+    return pd.DataFrame({name: column_from_state(column) for name, column in state["columns"]},
+                        index=pd.RangeIndex(state["length"]))
+
+
+def changes_state(changes):
+    if changes is None:
+        return None
+    state = {name: frame_state(getattr(changes, name)) for name in CHANGES_FRAMES}
+    state.update(key_columns=changes.key_columns, unchanged=int(changes.unchanged),
+                 columns_changed=bool(changes.columns_changed))
+    return state
+
+
+def changes_from_state(state):
+    if state is None:
+        return None
+    # the catalog the changes were worked out against isn't kept, so they don't patch anything built before
+    return CatalogChanges(state["key_columns"], *(frame_from_state(state[name]) for name in CHANGES_FRAMES),
+                          state["unchanged"], None, columns_changed=state["columns_changed"])
+
+
+def file_digest(file_path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CatalogEntry:
+
+    __slots__ = ("path", "size", "mtime_ns", "digest", "frame", "changes")
+
+    def __init__(self, path, size, mtime_ns, digest, frame, changes=None):
+        self.path = path
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.digest = digest
+        self.frame = frame
+        # how this version differs from the one read before it, None for the first version read
+        self.changes = changes
+
+    def matches(self, stat):
+        return self.size == stat.st_size and self.mtime_ns == stat.st_mtime_ns
+
+
+class CatalogCache:
+
+    def __init__(self, cache_directory, reader=None):
+        self.cache_directory = cache_directory
+        self.reader = reader if reader is not None else read_excel
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.load_seconds = 0.0
+        self.last_load_seconds = {}
+
+    def get_cache_directory(self):
+        return self.cache_directory
+
+    def snapshot_path(self, file_path):
+        name = hashlib.sha1(file_path.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_directory, name + SNAPSHOT_EXTENSION)
+
+    # Returns the parsed DataFrame for file_path.  The frame is shared between callers, so treat it as read only.
+    def read(self, file_path):
+        return self.read_entry(file_path).frame
+
+    # The CatalogEntry for file_path, for callers that need to know which version of the file was parsed
+    def read_entry(self, file_path):
+        file_path = os.path.abspath(file_path)
+        start = time.perf_counter()
+        stat = os.stat(file_path)
+        with self.lock:
+            entry = self.entries.get(file_path)
+            if entry is not None and entry.matches(stat):
+                self.memory_hits += 1
+                self.record_time(file_path, start)
+                return entry
+        previous = entry
+
+        # the workbook is new to this session or has been touched, so compare contents with the snapshot
+        digest = file_digest(file_path)
+        entry = self.load_snapshot(file_path)
+        if entry is not None and entry.digest == digest:
+            hit = True
+            if not entry.matches(stat):
+                # same contents with a new timestamp (e.g. copied over), keep the snapshot current
+                entry.size = stat.st_size
+                entry.mtime_ns = stat.st_mtime_ns
+                self.save_snapshot(entry)
+        else:
+            hit = False
+            frame = self.reader(file_path)
+            # the version in memory is preferred, because that's the one the indexes were built over
+            previous_frame = previous.frame if previous is not None else entry.frame if entry is not None else None
+            changes = self.compare(previous_frame, frame)
+            if changes is not None and changes.is_empty():
+                # exported again without any row changing, so everything built over the old copy still holds
+                frame = previous_frame
+            entry = CatalogEntry(file_path, stat.st_size, stat.st_mtime_ns, digest, frame, changes)
+            self.save_snapshot(entry)
+
+        with self.lock:
+            self.entries[file_path] = entry
+            if hit:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+            self.record_time(file_path, start)
+        return entry
+
+    @staticmethod
+    def compare(previous_frame, frame):
+        if previous_frame is None or previous_frame.empty:
+            return None
+        try:
+            return compare_catalogs(previous_frame, frame)
+        except (TypeError, ValueError):
+            # a layout the comparison can't handle just means the new version is treated as brand new
+            return None
+
+    # How the current version of file_path differs from the version read before it (None if unknown)
+    def get_changes(self, file_path):
+        with self.lock:
+            entry = self.entries.get(os.path.abspath(file_path))
+            return entry.changes if entry is not None else None
+
+    # The changes that produced catalog, for patching what was built over the catalog before it
+    def changes_for(self, catalog):
+        with self.lock:
+            for entry in self.entries.values():
+                if entry.frame is catalog:
+                    return entry.changes
+        return None
+
+    def record_time(self, file_path, start):
+        elapsed = time.perf_counter() - start
+        self.load_seconds += elapsed
+        self.last_load_seconds[file_path] = elapsed
+
+    def load_snapshot(self, file_path):
+        try:
+            with open(self.snapshot_path(file_path), "rb") as f:
+                snapshot = json.loads(zlib.decompress(f.read()))
+            if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("path") != file_path:
+                return None
+            return CatalogEntry(file_path, snapshot["size"], snapshot["mtime_ns"], snapshot["digest"],
+                                frame_from_state(snapshot["frame"]), changes_from_state(snapshot["changes"]))
+        except (OSError, zlib.error, ValueError, TypeError, KeyError, AttributeError):
+            # unreadable, from an older version or not a snapshot at all: the workbook is just read again
+            return None
+
+    def save_snapshot(self, entry):
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "path": entry.path,
+            "size": entry.size,
+            "mtime_ns": entry.mtime_ns,
+            "digest": entry.digest,
+            "frame": frame_state(entry.frame),
+            "changes": changes_state(entry.changes),
+        }
+        target = self.snapshot_path(entry.path)
+        temp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.cache_directory, exist_ok=True)
+            with open(temp, "wb") as f:
+                f.write(zlib.compress(json.dumps(snapshot).encode("utf-8"), SNAPSHOT_COMPRESSION))
+            os.replace(temp, target)
+        except (OSError, TypeError, ValueError):
+            # a read-only in-directory (or a value JSON can't hold) just means we only get the in-memory copy
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+
+    def invalidate(self, file_path=None):
+        with self.lock:
+            if file_path is None:
+                self.entries = {}
+            else:
+                self.entries.pop(os.path.abspath(file_path), None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "load_seconds": round(self.load_seconds, 6),
+                "last_load_seconds": {path: round(seconds, 6) for path, seconds in self.last_load_seconds.items()},
+                "cached_files": sorted(self.entries.keys()),
+            }
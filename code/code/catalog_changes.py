@@ -0,0 +1,122 @@
+# Catalog Changes
+# Compares a refreshed catalog export with the version read before it, row by row.  Each row is identified
+# by its key (Service, Container Name and Reference ID for containers, VENDOR PART# for soft goods; a key
+# that appears on several rows is matched in order) and fingerprinted by all of its values, so the weekly
+# export comes down to the rows that were added, changed or removed.  The changes are shown when the files
+# are confirmed and the indexes built over the catalog are patched with them instead of being rebuilt.
+
+import weakref
+
+from card_store import text_value
+
+# the first key whose columns are all in the catalog is used; without one whole rows are compared
+CATALOG_KEYS = (['Service', 'Container Name', 'Reference ID'], ['VENDOR PART#'])
+# rows of each kind listed in the report before the rest are only counted
+REPORT_ROW_LIMIT = 15
+
+
+def key_columns(frame):
+    for columns in CATALOG_KEYS:
+        if all(column in frame.columns for column in columns):
+            return columns
+    return list(frame.columns)
+
+
+def hash_rows(frame):
+    import pandas as pd
+    # text and category columns hash the same whichever way they were read; numbers are compared as text,
+    # because a column with a blank cell comes back as floats (12345.0)
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(values.dtype):
+            columns[column] = values
+        else:
+            columns[column] = values.map(text_value).astype(object)
+    return pd.util.hash_pandas_object(pd.DataFrame(columns, index=frame.index), index=False).to_numpy()
+
+
+def row_identities(frame, columns):
+    import pandas as pd
+    keys = pd.Series(hash_rows(frame[columns]))
+    # the first row with a key matches the first row with that key in the other version, and so on
+    return pd.DataFrame({"key": keys, "occurrence": keys.groupby(keys).cumcount(),
+                         "fingerprint": hash_rows(frame), "position": range(len(frame))})
+
+
+# Rows that were added, rows that were removed, and changed rows as before/after frames (row i of changed_before
+# became row i of changed_after).  previous refers weakly to the catalog it was compared with, so indexes built
+# over that catalog can tell the changes apply to them.
+class CatalogChanges:
+
+    __slots__ = ("key_columns", "added", "removed", "changed_before", "changed_after", "unchanged",
+                 "previous", "columns_changed")
+
+    def __init__(self, key_columns, added, removed, changed_before, changed_after, unchanged, previous,
+                 columns_changed=False):
+        self.key_columns = key_columns
+        self.added = added
+        self.removed = removed
+        self.changed_before = changed_before
+        self.changed_after = changed_after
+        self.unchanged = unchanged
+        self.previous = weakref.ref(previous) if previous is not None else None
+        self.columns_changed = columns_changed
+
+    def is_empty(self):
+        return self.added.empty and self.removed.empty and self.changed_after.empty and not self.columns_changed
+
+    def applies_to(self, catalog):
+        return self.previous is not None and self.previous() is catalog
+
+    def summary(self):
+        return (f"{len(self.added)} added, {len(self.changed_after)} changed, {len(self.removed)} removed, "
+                f"{self.unchanged} unchanged")
+
+    def describe_row(self, row):
+        return ", ".join(f"{column} {text_value(row[column])}" for column in self.key_columns
+                         if text_value(row[column]) is not None) or "(blank key)"
+
+    def report(self, limit=REPORT_ROW_LIMIT):
+        lines = [self.summary()]
+        if self.columns_changed:
+            lines.append("The columns changed, so every row is compared as changed")
+        for sign, frame in (("+", self.added), ("-", self.removed)):
+            for _, row in frame.head(limit).iterrows():
+                others = [f"{text_value(row[column])}" for column in frame.columns
+                          if column not in self.key_columns and text_value(row[column]) is not None]
+                lines.append(f"{sign} {self.describe_row(row)}{': ' + ', '.join(others) if others else ''}")
+            if len(frame) > limit:
+                lines.append(f"{sign} ... and {len(frame) - limit} more")
+        for position in range(min(len(self.changed_after), limit)):
+            before = self.changed_before.iloc[position]
+            after = self.changed_after.iloc[position]
+            differences = [f"{column} {text_value(before.get(column))} -> {text_value(after[column])}"
+                           for column in self.changed_after.columns
+                           if text_value(before.get(column)) != text_value(after[column])]
+            lines.append(f"~ {self.describe_row(after)}: {'; '.join(differences)}")
+        if len(self.changed_after) > limit:
+            lines.append(f"~ ... and {len(self.changed_after) - limit} more")
+        return "\n".join(lines)
+
+
+def compare_catalogs(previous, current):
+    columns = key_columns(current)
+    if not all(column in previous.columns for column in columns):
+        columns = [column for column in current.columns if column in previous.columns]
+    old = row_identities(previous, columns)
+    new = row_identities(current, columns)
+    matched = old.merge(new, on=["key", "occurrence"], how="outer", suffixes=("_old", "_new"), indicator=True)
+    both = matched[matched["_merge"] == "both"]
+    changed = both[both["fingerprint_old"] != both["fingerprint_new"]]
+    added = matched.loc[matched["_merge"] == "right_only", "position_new"].astype(int).sort_values()
+    removed = matched.loc[matched["_merge"] == "left_only", "position_old"].astype(int).sort_values()
+    return CatalogChanges(
+        columns,
+        current.iloc[added.to_numpy()].reset_index(drop=True),
+        previous.iloc[removed.to_numpy()].reset_index(drop=True),
+        previous.iloc[changed["position_old"].astype(int).to_numpy()].reset_index(drop=True),
+        current.iloc[changed["position_new"].astype(int).to_numpy()].reset_index(drop=True),
+        len(both) - len(changed),
+        previous,
+        columns_changed=list(previous.columns) != list(current.columns))
@@ -0,0 +1,50 @@
+# Card History Compaction
+# Re-stores saved cards as full copies plus changes (cards saved before that were each stored in full) and,
+# with --keep, drops all but the newest versions of each surgery.
+#
+# Usage: python compact_cards.py [--out OUT_DIRECTORY] [--doctor DOCTOR] [--keep N]
+
+import argparse
+import os
+import sys
+import time
+
+from card_columns import SHEET_COLUMNS
+from card_store import DATABASE_NAME, CardStore
+
+
+def run(out_directory, doctor=None, keep=None, output=sys.stdout):
+    start = time.perf_counter()
+    database_path = os.path.join(out_directory, DATABASE_NAME)
+    size = os.path.getsize(database_path) if os.path.exists(database_path) else 0
+    store = CardStore(out_directory, SHEET_COLUMNS)
+    # sheets added to the workbooks by hand are brought in first so they aren't lost when a workbook is rewritten
+    store.sync_directory()
+    changed_doctors = store.compact_history(doctor, keep)
+    for changed_doctor in changed_doctors:
+        store.export_workbook(changed_doctor)
+    store.close()
+    print(f"Compacted {DATABASE_NAME} from {size / 1024:.0f} KB to {os.path.getsize(database_path) / 1024:.0f} KB "
+          f"in {time.perf_counter() - start:.2f}s; {len(changed_doctors)} workbooks rewritten", file=output)
+    return changed_doctors
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Compact the saved preference card history.")
+    parser.add_argument("--out", dest="out_directory", default=".", help="directory with the preference cards")
+    parser.add_argument("--doctor", default=None, help="only compact this doctor's cards")
+    parser.add_argument("--keep", type=int, default=None,
+                        help="keep only the newest N versions of each surgery (default: keep every version)")
+    options = parser.parse_args(args)
+    if options.keep is not None and options.keep < 1:
+        parser.error("--keep must be at least 1")
+    try:
+        run(os.path.abspath(options.out_directory), options.doctor, options.keep)
+    except (OSError, ValueError) as e:
+        print(f"Compaction failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
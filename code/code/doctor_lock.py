@@ -0,0 +1,102 @@
+# Doctor Locks
+# Several people can run the app against the same out-directory.  Saving a card and writing <doctor>.xlsx
+# hold an advisory lock on .locks/<doctor>.lock, so saves for the same doctor queue up behind each other
+# while saves for different doctors go ahead in parallel.  The operating system drops the lock when the
+# process holding it exits, so a crash never leaves a doctor locked.
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_DIRECTORY_NAME = ".locks"
+LOCK_TIMEOUT = 120  # seconds to wait for another save of the same doctor, e.g. a large workbook being written
+LOCK_POLL_INTERVAL = 0.05  # seconds between attempts while another process holds the lock
+
+
+def try_lock_file(file):
+    try:
+        if fcntl is not None:
+            fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            file.seek(0)
+            msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def unlock_file(file):
+    if fcntl is not None:
+        fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+    else:
+        file.seek(0)
+        msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Used as "with lock:".  The thread holding it can take it again (e.g. a save that also writes the workbook);
+# other threads in this process wait on the thread lock, other processes on the file lock.
+class DoctorLock:
+
+    def __init__(self, path, doctor, timeout=LOCK_TIMEOUT):
+        self.path = path
+        self.doctor = doctor
+        self.timeout = timeout
+        self.thread_lock = threading.RLock()
+        self.file = None
+        self.depth = 0
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        if not self.thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Timed out waiting for another save of {self.doctor}'s cards")
+        if self.depth == 0:
+            try:
+                self.file = self.lock_file(deadline)
+            except BaseException:
+                self.thread_lock.release()
+                raise
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.depth -= 1
+        if self.depth == 0:
+            try:
+                unlock_file(self.file)
+            finally:
+                self.file.close()
+                self.file = None
+        self.thread_lock.release()
+        return False
+
+    def lock_file(self, deadline):
+        file = open(self.path, "a+")
+        while not try_lock_file(file):
+            if time.monotonic() >= deadline:
+                file.close()
+                raise TimeoutError(f"Timed out waiting for another user's save of {self.doctor}'s cards")
+            time.sleep(LOCK_POLL_INTERVAL)
+        return file
+
+
+class DoctorLocks:
+
+    def __init__(self, directory):
+        self.directory = os.path.join(directory, LOCK_DIRECTORY_NAME)
+        self.locks = {}
+        self.guard = threading.Lock()
+
+    # the same DoctorLock for every call with the same doctor, so threads of this process share it
+    def get(self, doctor):
+        with self.guard:
+            lock = self.locks.get(doctor)
+            if lock is None:
+                os.makedirs(self.directory, exist_ok=True)
+                lock = self.locks[doctor] = DoctorLock(os.path.join(self.directory, f"{doctor}.lock"), doctor)
+            return lock
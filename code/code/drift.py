@@ -0,0 +1,222 @@
+# Catalog Drift Scan
+# Finds preference cards that refer to containers or soft goods that are no longer in the input catalogs.
+#
+# Usage: python drift.py [--in IN_DIRECTORY] [--out OUT_DIRECTORY] [--report FILE] [--workers N]
+#
+# The cards are read from the card store.  Only workbooks the store doesn't hold (or that were edited in Excel
+# since the store last wrote or read them) are read from the files, in worker processes, and what they refer
+# to is cached next to the cards, so later scans only re-read those whose size or modification time changed.
+# Every scan joins all of the references against the current catalogs in one go, so a retired part or renamed
+# container shows up on the next run even if no card changed.
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from card_columns import CATALOG_CACHE_DIRECTORY_NAME, SHEET_COLUMNS
+from card_store import CardStore, doctor_for_workbook, is_workbook_name, text_value
+from catalog_cache import CatalogCache, frame_from_state, frame_state
+from file_discovery import discover_input_files
+from part_index import NON_ALPHANUMERIC
+from xlsx_reader import XlsxWorkbook
+
+SCAN_DIRECTORY_NAME = ".drift_scan"
+STATE_FILE_NAME = "state.json"
+REPORT_FILE_NAME = "catalog_drift.csv"
+REFERENCE_COLUMNS = ['Doctor', 'Sheet', 'Service', 'Container Name', 'Item Description', 'Vendor Part #']
+REPORT_COLUMNS = ['Doctor', 'Sheet', 'Kind', 'Service', 'Container Name', 'Item Description', 'Vendor Part #',
+                  'Problem']
+
+
+def normalize_part_numbers(part_numbers):
+    # the vectorized form of part_index.normalize_part_number; text_value keeps 12345.0 from becoming "123450"
+    return part_numbers.map(text_value).astype(str).str.replace(NON_ALPHANUMERIC, "", regex=True).str.upper()
+
+
+def extract_references(file_path):
+    # runs in a worker process; returns the items every sheet of one workbook refers to, as text like the
+    # card store keeps them
+    doctor = doctor_for_workbook(file_path)
+    rows = []
+    with XlsxWorkbook(file_path) as workbook:
+        for sheet_name in workbook.sheet_names():
+            df = workbook.read_sheet(sheet_name, REFERENCE_COLUMNS[2:], REFERENCE_COLUMNS[2:])
+            df = df.reindex(columns=REFERENCE_COLUMNS[2:])
+            for items in zip(*(df[column] for column in REFERENCE_COLUMNS[2:])):
+                rows.append((doctor, sheet_name) + tuple(text_value(item) for item in items))
+    return pd.DataFrame(rows, columns=REFERENCE_COLUMNS)
+
+
+def store_references(store, doctors):
+    # the items every card of the given doctors refers to, in the order their workbooks list the cards
+    connection = store.connect()
+    rows = []
+    for card_id, doctor, sheet_name in connection.execute("SELECT id, doctor, sheet_name FROM cards "
+                                                          "ORDER BY doctor, id").fetchall():
+        if doctor in doctors:
+            rows.extend((doctor, sheet_name, service, container_name, item_description, vendor_part_number)
+                        for _, service, container_name, item_description, vendor_part_number, _
+                        in store.rebuild_rows(connection, card_id))
+    return pd.DataFrame(rows, columns=REFERENCE_COLUMNS)
+
+
+def load_state(scan_directory):
+    try:
+        with open(os.path.join(scan_directory, STATE_FILE_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(scan_directory, state):
+    target = os.path.join(scan_directory, STATE_FILE_NAME)
+    temp = f"{target}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(temp, target)
+
+
+def snapshot_path(scan_directory, name):
+    # JSON (see catalog_cache.frame_state) rather than pickles, which could run code left in a shared out-directory
+    return os.path.join(scan_directory, name + ".references.json")
+
+
+# Returns the references, the number of doctors scanned and the number of workbooks read from Excel this time
+def collect_references(out_directory, workers=None):
+    store = CardStore(out_directory, SHEET_COLUMNS)
+    try:
+        store_doctors = set(store.get_doctors())
+        names = []
+        for name in sorted(name for name in os.listdir(out_directory) if is_workbook_name(name)):
+            file_path = os.path.join(out_directory, name)
+            doctor = doctor_for_workbook(file_path)
+            if doctor not in store_doctors or store.workbook_changed(doctor, file_path):
+                # the workbook has cards the store doesn't, so it is read instead of the store's cards
+                store_doctors.discard(doctor)
+                names.append(name)
+        references = store_references(store, store_doctors)
+    finally:
+        store.close()
+    file_references, changed = collect_file_references(out_directory, names, workers)
+    return pd.concat([references, file_references], ignore_index=True), len(store_doctors) + len(names), changed
+
+
+# The references of the named workbooks, re-reading only those that changed since the last scan
+def collect_file_references(out_directory, names, workers=None):
+    scan_directory = os.path.join(out_directory, SCAN_DIRECTORY_NAME)
+    os.makedirs(scan_directory, exist_ok=True)
+    state = load_state(scan_directory)
+
+    changed = []
+    stats = {}
+    for name in names:
+        stat = os.stat(os.path.join(out_directory, name))
+        stats[name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if state.get(name) != stats[name] or not os.path.exists(snapshot_path(scan_directory, name)):
+            changed.append(name)
+
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            paths = [os.path.join(out_directory, name) for name in changed]
+            for name, references in zip(changed, executor.map(extract_references, paths)):
+                with open(snapshot_path(scan_directory, name), "w", encoding="utf-8") as f:
+                    json.dump(frame_state(references), f)
+                state[name] = stats[name]
+
+    for name in set(state) - set(names):
+        # the workbook was deleted, or the store holds its cards now
+        del state[name]
+        try:
+            os.remove(snapshot_path(scan_directory, name))
+        except OSError:
+            pass
+    save_state(scan_directory, state)
+
+    frames = []
+    for name in names:
+        with open(snapshot_path(scan_directory, name), "r", encoding="utf-8") as f:
+            frames.append(frame_from_state(json.load(f)))
+    references = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=REFERENCE_COLUMNS)
+    return references, len(changed)
+
+
+def find_drift(references, container_df, soft_goods_df):
+    reports = []
+
+    containers = references.dropna(subset=['Container Name'])
+    if not containers.empty:
+        # compared as text, as the cards have them
+        catalog = pd.DataFrame({column: container_df[column].map(text_value)
+                                for column in ['Service', 'Container Name']}).drop_duplicates()
+        joined = containers.merge(catalog.assign(known=True), on=['Service', 'Container Name'], how='left')
+        missing = joined[joined['known'].isna()].drop(columns='known')
+        # a container that is still in the catalog under another service was moved rather than retired
+        moved_to = catalog.groupby('Container Name')['Service'].agg(lambda services: ", ".join(sorted(services)))
+        problem = missing['Container Name'].map(moved_to)
+        missing = missing.assign(
+            Kind='container',
+            Problem=problem.map(lambda services: f"container now under {services}", na_action='ignore')
+            .fillna("container not in catalog"))
+        reports.append(missing)
+
+    soft_goods = references.dropna(subset=['Vendor Part #'])
+    if not soft_goods.empty:
+        known_parts = set(normalize_part_numbers(soft_goods_df['VENDOR PART#'].dropna()))
+        unknown = ~normalize_part_numbers(soft_goods['Vendor Part #']).isin(known_parts)
+        reports.append(soft_goods[unknown].assign(Kind='soft good', Problem="vendor part # not in catalog"))
+
+    if not reports:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    return pd.concat(reports, ignore_index=True)[REPORT_COLUMNS].sort_values(['Doctor', 'Sheet'], kind='stable')
+
+
+def load_catalogs(in_directory):
+    cache_directory = os.path.join(in_directory, CATALOG_CACHE_DIRECTORY_NAME)
+    container_file, soft_goods_file = discover_input_files(in_directory, cache_directory)
+    if container_file is None or soft_goods_file is None:
+        raise ValueError(f"Could not find both the container file and the soft goods file in {in_directory}")
+    cache = CatalogCache(cache_directory)
+    return cache.read(container_file), cache.read(soft_goods_file)
+
+
+def scan(in_directory, out_directory, report_path=None, workers=None, output=sys.stdout):
+    start = time.perf_counter()
+    container_df, soft_goods_df = load_catalogs(in_directory)
+    references, doctors, changed = collect_references(out_directory, workers)
+    drift = find_drift(references, container_df, soft_goods_df)
+    if report_path is None:
+        report_path = os.path.join(out_directory, REPORT_FILE_NAME)
+    drift.to_csv(report_path, index=False)
+    cards = references[['Doctor', 'Sheet']].drop_duplicates()
+    affected = drift[['Doctor', 'Sheet']].drop_duplicates()
+    print(f"Scanned {len(cards)} cards of {doctors} doctors ({changed} workbooks re-read) in "
+          f"{time.perf_counter() - start:.2f}s: {len(drift)} missing items on {len(affected)} cards. "
+          f"Report written to {report_path}", file=output)
+    return drift
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Report preference cards that use items missing from the catalogs.")
+    parser.add_argument("--in", dest="in_directory", default=".", help="directory with the input catalogs")
+    parser.add_argument("--out", dest="out_directory", default=None,
+                        help="directory with the doctor workbooks (defaults to the in directory)")
+    parser.add_argument("--report", default=None, help=f"CSV report to write (defaults to {REPORT_FILE_NAME} "
+                                                        f"in the out directory)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (defaults to one per CPU)")
+    options = parser.parse_args(args)
+    try:
+        scan(os.path.abspath(options.in_directory), os.path.abspath(options.out_directory or options.in_directory),
+             options.report, options.workers)
+    except (OSError, ValueError) as e:
+        print(f"Drift scan failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
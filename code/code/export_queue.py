@@ -0,0 +1,78 @@
+# Export Queue
+# Workbook writes run one at a time on a background thread, so saving a card never freezes the windows
+# and the next card can be started straight away.  Jobs are keyed (e.g. by doctor): a job that is still
+# waiting is replaced by a newer one with the same key rather than running twice.
+
+import threading
+import traceback
+
+
+class ExportJob:
+
+    __slots__ = ("key", "description", "function", "args")
+
+    def __init__(self, key, description, function, args):
+        self.key = key
+        self.description = description
+        self.function = function
+        self.args = args
+
+
+class ExportQueue:
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.pending = {}
+        self.current = None
+        self.completed = 0
+        self.failures = []
+        self.thread = None
+
+    def submit(self, key, description, function, *args):
+        with self.condition:
+            # dicts keep insertion order, so a replaced job keeps its place in the queue
+            self.pending[key] = ExportJob(key, description, function, args)
+            if self.thread is None:
+                # a daemon thread so a stuck write can't keep the app open; exiting calls wait() first
+                self.thread = threading.Thread(target=self.work, name="export queue", daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def work(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                key = next(iter(self.pending))
+                self.current = self.pending.pop(key)
+            try:
+                self.current.function(*self.current.args)
+            except Exception as e:
+                traceback.print_exc()
+                with self.condition:
+                    self.failures.append((self.current.description, e))
+            with self.condition:
+                self.current = None
+                self.completed += 1
+                self.condition.notify_all()
+
+    def is_busy(self):
+        with self.condition:
+            return self.current is not None or bool(self.pending)
+
+    # (description of the job being written or None, number of jobs waiting behind it)
+    def status(self):
+        with self.condition:
+            current = self.current.description if self.current is not None else None
+            return current, len(self.pending)
+
+    # failures since the last call, as (description, exception) pairs
+    def take_failures(self):
+        with self.condition:
+            failures, self.failures = self.failures, []
+        return failures
+
+    # Blocks until every queued write has finished; returns False if the timeout ran out first
+    def wait(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(lambda: self.current is None and not self.pending, timeout)
@@ -0,0 +1,144 @@
+# Input File Discovery
+# Works out which workbook in the in-directory is the container file and which is the soft goods file
+# by reading only the header row of each candidate.  When several workbooks fit a role (the folder often
+# keeps older exports), the one modified most recently is used.
+
+import glob
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import xlsx_reader
+
+CONTAINER_ROLE = "container"
+SOFT_GOODS_ROLE = "soft goods"
+CONTAINER_COLUMNS = {'Service', 'Container Name', 'Reference ID'}
+SOFT_GOODS_COLUMNS = {'ITEM DESCRIPTION', 'VENDOR PART#'}
+ROLES = (CONTAINER_ROLE, SOFT_GOODS_ROLE)
+
+CLASSIFICATION_FILE_NAME = "discovery.json"
+
+
+def read_header(file_path):
+    # the first sheet is the one pd.read_excel reads; its XML is streamed, so only the first row is parsed
+    return [str(value).strip() for value in xlsx_reader.read_header(file_path)]
+
+
+def classify_header(columns):
+    columns = set(columns)
+    if CONTAINER_COLUMNS.issubset(columns):
+        return CONTAINER_ROLE
+    if SOFT_GOODS_COLUMNS.issubset(columns):
+        return SOFT_GOODS_ROLE
+    return None
+
+
+def classify_file(file_path):
+    try:
+        return classify_header(read_header(file_path))
+    except Exception:
+        # anything unreadable (open in Excel, corrupt, not really xlsx) just isn't an input file
+        return None
+
+
+def has_columns(file_path, columns):
+    try:
+        return set(columns).issubset(read_header(file_path))
+    except Exception:
+        return False
+
+
+def is_candidate(file_path):
+    # skip the lock files Excel leaves next to open workbooks
+    return not os.path.basename(file_path).startswith("~$")
+
+
+class ClassificationCache:
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.classifications = {}
+        self.changed = False
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.file_path, "r", encoding="utf-8") as f:
+                self.classifications = json.load(f)
+        except (OSError, ValueError):
+            self.classifications = {}
+
+    def save(self):
+        if not self.changed:
+            return
+        temp = f"{self.file_path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+            with open(temp, "w", encoding="utf-8") as f:
+                json.dump(self.classifications, f, indent=1, sort_keys=True)
+            os.replace(temp, self.file_path)
+            self.changed = False
+        except OSError:
+            pass
+
+    # returns (True, role) when the file is unchanged since it was last classified
+    def lookup(self, file_path, stat):
+        with self.lock:
+            known = self.classifications.get(file_path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return True, known["role"]
+        return False, None
+
+    def store(self, file_path, stat, role):
+        with self.lock:
+            self.classifications[file_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "role": role}
+            self.changed = True
+
+    def forget_missing(self, file_paths):
+        with self.lock:
+            for file_path in set(self.classifications) - set(file_paths):
+                del self.classifications[file_path]
+                self.changed = True
+
+
+def discover_input_files(directory, cache_directory=None, max_workers=8):
+    files = sorted(os.path.abspath(f) for f in glob.glob(os.path.join(directory, "*.xlsx")) if is_candidate(f))
+    cache = None
+    if cache_directory is not None:
+        cache = ClassificationCache(os.path.join(cache_directory, CLASSIFICATION_FILE_NAME))
+        cache.forget_missing(files)
+
+    roles = {}
+    unknown = []
+    stats = {}
+    for file_path in files:
+        try:
+            stats[file_path] = os.stat(file_path)
+        except OSError:
+            continue
+        known, role = cache.lookup(file_path, stats[file_path]) if cache is not None else (False, None)
+        if known:
+            roles[file_path] = role
+        else:
+            unknown.append(file_path)
+
+    # every new or changed file is classified, since a newly dropped export replaces the one used before
+    if unknown:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unknown)))) as executor:
+            for file_path, role in zip(unknown, executor.map(classify_file, unknown)):
+                roles[file_path] = role
+                if cache is not None:
+                    cache.store(file_path, stats[file_path], role)
+
+    # the newest file for each role; the path decides between files modified at the same moment
+    found = {}
+    for file_path, role in roles.items():
+        if role is not None and (role not in found or (stats[file_path].st_mtime_ns, file_path) >
+                                 (stats[found[role]].st_mtime_ns, found[role])):
+            found[role] = file_path
+
+    if cache is not None:
+        cache.save()
+    return found.get(CONTAINER_ROLE), found.get(SOFT_GOODS_ROLE)
@@ -0,0 +1,232 @@
+# Instrumentation
+# Opt-in timing of the steps a user waits on.  Each step is a span that records its wall time, peak memory
+# (through tracemalloc), row and widget counts; stalls of the Tk event loop are recorded too.  Everything goes
+# to a rotating JSON-lines log and the latest entries are shown in a small overlay window (F12).  F11 logs how
+# much memory each part of the app is holding.
+#
+# Turned on with --instrument on the command line or PREFERENCE_CARD_INSTRUMENTATION=1.  When it's off a span
+# costs one attribute check.
+
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+import tkinter as tk
+import tracemalloc
+from collections import deque
+
+ENVIRONMENT_VARIABLE = "PREFERENCE_CARD_INSTRUMENTATION"
+LOG_FILE_NAME = "preference_card_timings.jsonl"
+LOG_FILE_SIZE = 1 << 20
+LOG_FILE_COUNT = 5
+RECENT_ENTRIES = 15
+STALL_CHECK_INTERVAL = 100  # milliseconds between event loop heartbeats
+STALL_THRESHOLD = 0.25  # seconds a heartbeat can be late before it counts as a stall
+OVERLAY_REFRESH_INTERVAL = 500  # milliseconds
+OVERLAY_KEY = "<F12>"
+MEMORY_KEY = "<F11>"
+
+
+class Span:
+
+    __slots__ = ("name", "details", "start", "start_memory", "peak_memory", "thread")
+
+    def __init__(self, name, details):
+        self.name = name
+        self.details = details
+        self.start = 0.0
+        self.start_memory = 0
+        self.peak_memory = 0
+        self.thread = threading.current_thread().name
+
+
+class Instrumentation:
+
+    def __init__(self):
+        self.enabled = False
+        self.logger = None
+        self.root = None
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.recent = deque(maxlen=RECENT_ENTRIES)
+        self.last_span = None
+        self.last_heartbeat = None
+        self.overlay = None
+        self.overlay_label = None
+        self.memory_report = None
+
+    # memory_report, if given, returns {component: bytes} and is logged when F11 is pressed
+    def enable(self, log_directory, root=None, memory_report=None):
+        self.logger = logging.getLogger("preference_card_timings")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(os.path.join(log_directory, LOG_FILE_NAME),
+                                                           maxBytes=LOG_FILE_SIZE, backupCount=LOG_FILE_COUNT,
+                                                           encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+        if root is not None:
+            self.root = root
+            self.last_heartbeat = time.perf_counter()
+            root.after(STALL_CHECK_INTERVAL, self.heartbeat)
+            root.bind_all(OVERLAY_KEY, lambda event: self.toggle_overlay())
+            if memory_report is not None:
+                self.memory_report = memory_report
+                root.bind_all(MEMORY_KEY, lambda event: self.record_memory())
+        self.record({"event": "enabled", "pid": os.getpid()})
+
+    def stack(self):
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def start_span(self, name, details):
+        span = Span(name, details)
+        stack = self.stack()
+        if stack:
+            # the enclosing span keeps the peak so far, because resetting the peak here would lose it
+            stack[-1].peak_memory = max(stack[-1].peak_memory, tracemalloc.get_traced_memory()[1])
+        stack.append(span)
+        # tracemalloc's peak is for the whole process, so work on other threads at the same time counts too
+        span.start_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        span.start = time.perf_counter()
+        return span
+
+    def end_span(self, span, error=None):
+        seconds = time.perf_counter() - span.start
+        stack = self.stack()
+        stack.pop()
+        peak = max(span.peak_memory, tracemalloc.get_traced_memory()[1])
+        if stack:
+            stack[-1].peak_memory = max(stack[-1].peak_memory, peak)
+        entry = {"event": "span", "name": span.name, "seconds": round(seconds, 6),
+                 "peak_kb": round(max(peak - span.start_memory, 0) / 1024, 1), "thread": span.thread}
+        if self.root is not None and threading.current_thread() is threading.main_thread():
+            entry["widgets"] = self.count_widgets()
+        if error is not None:
+            entry["error"] = repr(error)
+        entry.update(span.details)
+        self.last_span = span.name
+        self.record(entry)
+
+    def span(self, name, **details):
+        return SpanContext(self, name, details)
+
+    # Adds details (e.g. rows=...) to the innermost span running on this thread
+    def note(self, **details):
+        if self.enabled:
+            stack = self.stack()
+            if stack:
+                stack[-1].details.update(details)
+
+    def count_widgets(self):
+        count = 0
+        pending = [self.root]
+        while pending:
+            widget = pending.pop()
+            count += 1
+            pending.extend(widget.winfo_children())
+        return count
+
+    def record(self, entry):
+        entry["time"] = round(time.time(), 3)
+        with self.lock:
+            self.recent.append(entry)
+            self.logger.info(json.dumps(entry, default=str))
+
+    def record_memory(self):
+        report = self.memory_report()
+        self.record({"event": "memory", "components": report, "total": sum(report.values()),
+                     "traced": tracemalloc.get_traced_memory()[0]})
+
+    # Runs every STALL_CHECK_INTERVAL; when it runs late, something held up the event loop for that long
+    def heartbeat(self):
+        now = time.perf_counter()
+        late = now - self.last_heartbeat - STALL_CHECK_INTERVAL / 1000
+        if late > STALL_THRESHOLD:
+            self.record({"event": "stall", "seconds": round(late, 3), "after": self.last_span})
+        self.last_heartbeat = now
+        self.root.after(STALL_CHECK_INTERVAL, self.heartbeat)
+
+    def toggle_overlay(self):
+        if self.overlay is not None and self.overlay.winfo_exists():
+            self.overlay.destroy()
+            self.overlay = None
+            return
+        self.overlay = tk.Toplevel(self.root)
+        self.overlay.title("Timings")
+        self.overlay.attributes("-topmost", True)
+        self.overlay_label = tk.Label(self.overlay, text="", justify=tk.LEFT, font=("Courier", 9), anchor=tk.NW)
+        self.overlay_label.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.refresh_overlay()
+
+    def refresh_overlay(self):
+        if self.overlay is None or not self.overlay.winfo_exists():
+            return
+        with self.lock:
+            entries = list(self.recent)
+        lines = []
+        for entry in reversed(entries):
+            if entry["event"] == "span":
+                extra = " ".join(f"{key}={entry[key]}" for key in ("rows", "widgets") if key in entry)
+                lines.append(f"{entry['name'][:32]:<32} {entry['seconds'] * 1000:9.1f} ms "
+                             f"{entry['peak_kb'] / 1024:7.1f} MB  {extra}")
+            elif entry["event"] == "stall":
+                lines.append(f"{'STALL after ' + str(entry['after'])[:26]:<32} {entry['seconds'] * 1000:9.1f} ms")
+            elif entry["event"] == "memory":
+                for name, size in entry["components"].items():
+                    lines.append(f"{'memory: ' + name[:24]:<32} {size / (1 << 20):9.2f} MB")
+        self.overlay_label.config(text="\n".join(lines) or "Nothing timed yet")
+        self.overlay.after(OVERLAY_REFRESH_INTERVAL, self.refresh_overlay)
+
+
+class SpanContext:
+
+    __slots__ = ("instrumentation", "name", "details", "span")
+
+    def __init__(self, instrumentation, name, details):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.details = details
+        self.span = None
+
+    def __enter__(self):
+        if self.instrumentation.enabled:
+            self.span = self.instrumentation.start_span(self.name, self.details)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if self.span is not None:
+            self.instrumentation.end_span(self.span, exc)
+        return False
+
+
+instrumentation = Instrumentation()
+
+
+def instrumented(function):
+    # times every call of function as a span named after it
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not instrumentation.enabled:
+            return function(*args, **kwargs)
+        with instrumentation.span(function.__name__):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def note(**details):
+    instrumentation.note(**details)
+
+
+def is_requested(args):
+    return "--instrument" in args or bool(os.environ.get(ENVIRONMENT_VARIABLE))
@@ -0,0 +1,67 @@
+# Memory Report
+# Approximate memory held by each part of the app (catalog frames, row lists, search and part indexes,
+# selections, the card cache).  Objects shared between parts, like the strings a row list takes from
+# its catalog, are only counted for the first part that holds them.
+
+import sys
+import types
+from array import array
+
+LEAF_TYPES = (str, bytes, bytearray, int, float, bool, complex, range, array, type(None))
+# code, classes and modules belong to the program rather than to any one component
+SKIPPED_TYPES = (types.FunctionType, types.MethodType, types.BuiltinFunctionType, types.ModuleType, type)
+
+
+def frame_size(frame):
+    return int(frame.memory_usage(deep=True, index=True).sum())
+
+
+def deep_size(obj, seen):
+    size = 0
+    pending = [obj]
+    while pending:
+        current = pending.pop()
+        if id(current) in seen:
+            continue
+        seen.add(id(current))
+        if hasattr(current, "memory_usage") and hasattr(current, "columns"):
+            # pandas knows the size of its own arrays, including the strings in text columns; those strings
+            # are marked as seen so the row lists built from the frame don't count them again
+            size += frame_size(current)
+            for column in current.columns:
+                values = current[column]
+                if hasattr(values, "cat"):
+                    values = values.cat.categories
+                if not hasattr(values.dtype, "itemsize") or values.dtype == object:
+                    seen.update(id(value) for value in values)
+            continue
+        if isinstance(current, SKIPPED_TYPES):
+            continue
+        size += sys.getsizeof(current)
+        if isinstance(current, LEAF_TYPES):
+            continue
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset)):
+            pending.extend(current)
+        else:
+            if hasattr(current, "__dict__"):
+                pending.append(current.__dict__)
+            for name in getattr(type(current), "__slots__", ()):
+                if hasattr(current, name):
+                    pending.append(getattr(current, name))
+    return size
+
+
+# components are (name, object) pairs; returns {name: bytes} in the same order
+def memory_report(components):
+    seen = set()
+    return {name: deep_size(obj, seen) for name, obj in components}
+
+
+def format_report(report):
+    total = sum(report.values())
+    lines = [f"{name:<40} {size / (1 << 20):8.2f} MB" for name, size in report.items()]
+    lines.append(f"{'total':<40} {total / (1 << 20):8.2f} MB")
+    return "\n".join(lines)
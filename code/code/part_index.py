@@ -0,0 +1,149 @@
+# Part Index
+# Exact and prefix lookup of vendor part numbers and container reference IDs for quick (barcode) entry.
+# Part numbers are compared without case or punctuation, so "b-d371110" and "BD371110" are the same part.
+
+import re
+
+NON_ALPHANUMERIC = re.compile(r"[^0-9A-Za-z]")
+
+
+def normalize_part_number(part_number):
+    if part_number is None:
+        return ""
+    return NON_ALPHANUMERIC.sub("", str(part_number)).upper()
+
+
+class TrieNode:
+
+    __slots__ = ("children", "count", "keys")
+
+    def __init__(self):
+        self.children = {}
+        self.count = 0
+        self.keys = None
+
+
+class PartIndex:
+
+    def __init__(self, entries=()):
+        # entries are (part number, row key) pairs
+        self.exact = {}
+        self.root = TrieNode()
+        for part_number, key in entries:
+            self.add(part_number, key)
+
+    def __len__(self):
+        return self.root.count
+
+    def add(self, part_number, key):
+        part_number = normalize_part_number(part_number)
+        if not part_number:
+            return
+        keys = self.exact.setdefault(part_number, [])
+        if key in keys:
+            return
+        keys.append(key)
+        node = self.root
+        node.count += 1
+        for char in part_number:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = TrieNode()
+            node = child
+            node.count += 1
+        node.keys = keys
+
+    def remove(self, part_number, key):
+        part_number = normalize_part_number(part_number)
+        keys = self.exact.get(part_number)
+        if not keys or key not in keys:
+            return
+        keys.remove(key)
+        if not keys:
+            del self.exact[part_number]
+        path = [self.root]
+        for char in part_number:
+            path.append(path[-1].children[char])
+        for node in path:
+            node.count -= 1
+        if not keys:
+            path[-1].keys = None
+        # drop branches that no longer lead anywhere
+        for parent, char, node in zip(reversed(path[:-1]), reversed(part_number), reversed(path[1:])):
+            if node.count == 0:
+                del parent.children[char]
+
+    def lookup(self, part_number):
+        return list(self.exact.get(normalize_part_number(part_number), ()))
+
+    def find_node(self, prefix):
+        node = self.root
+        for char in normalize_part_number(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    # up to limit keys whose part number starts with prefix, shortest part numbers first
+    def complete(self, prefix, limit=10):
+        node = self.find_node(prefix)
+        return self.collect(node, limit) if node is not None else []
+
+    @staticmethod
+    def collect(node, limit=10):
+        found = []
+        level = [node]
+        while level and len(found) < limit:
+            next_level = []
+            for current in level:
+                if current.keys:
+                    found.extend(current.keys[:limit - len(found)])
+                    if len(found) >= limit:
+                        break
+                next_level.extend(current.children[char] for char in sorted(current.children))
+            level = next_level
+        return found
+
+
+class PartCursor:
+
+    # Follows the text of an entry box through the trie one keystroke at a time, so typing or
+    # deleting a character is a single step whatever the size of the catalog.
+
+    def __init__(self, index):
+        self.index = index
+        self.text = ""
+        self.path = [index.root]
+
+    def update(self, text):
+        text = normalize_part_number(text)
+        if text.startswith(self.text):
+            for char in text[len(self.text):]:
+                node = self.path[-1].children.get(char) if self.path[-1] is not None else None
+                self.path.append(node)
+        else:
+            common = len(self.text)
+            while not text.startswith(self.text[:common]):
+                common -= 1
+            del self.path[common + 1:]
+            for char in text[common:]:
+                node = self.path[-1].children.get(char) if self.path[-1] is not None else None
+                self.path.append(node)
+        self.text = text
+        return self.path[-1]
+
+    def reset(self):
+        self.text = ""
+        self.path = [self.index.root]
+
+    def matches(self):
+        node = self.path[-1]
+        return node.count if node is not None else 0
+
+    def exact(self):
+        node = self.path[-1]
+        return list(node.keys) if node is not None and node.keys else []
+
+    def completions(self, limit=10):
+        node = self.path[-1]
+        return PartIndex.collect(node, limit) if node is not None else []
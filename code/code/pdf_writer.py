@@ -0,0 +1,138 @@
+# PDF Writer
+# Just enough of PDF to print a preference card: pages of text in Helvetica and Helvetica-Bold, filled
+# rectangles and lines.  The two fonts are built into every PDF reader, so nothing is embedded and no PDF
+# library is needed.  Text is limited to the Windows-1252 characters; anything else prints as "?".
+
+import zlib
+
+# points, 72 to the inch
+LETTER = (612, 792)
+
+# Helvetica and Helvetica-Bold widths of the printable ASCII characters (space to ~), in thousandths of the
+# font size, from the standard font metrics.  Other characters are measured as a digit.
+HELVETICA_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584)
+HELVETICA_BOLD_WIDTHS = (
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584)
+DEFAULT_WIDTH = 556
+
+
+def text_width(text, size, bold=False):
+    widths = HELVETICA_BOLD_WIDTHS if bold else HELVETICA_WIDTHS
+    total = 0
+    for character in text:
+        code = ord(character) - 32
+        total += widths[code] if 0 <= code < len(widths) else DEFAULT_WIDTH
+    return total * size / 1000
+
+
+# Splits text into lines no wider than width, breaking between words (or inside a word too long for a line)
+def wrap_text(text, width, size, bold=False):
+    lines = []
+    for paragraph in str(text).splitlines() or [""]:
+        line = ""
+        for word in paragraph.split(" "):
+            candidate = f"{line} {word}" if line else word
+            if text_width(candidate, size, bold) <= width:
+                line = candidate
+                continue
+            if line:
+                lines.append(line)
+            line = word
+            while text_width(line, size, bold) > width and len(line) > 1:
+                cut = len(line) - 1
+                while cut > 1 and text_width(line[:cut], size, bold) > width:
+                    cut -= 1
+                lines.append(line[:cut])
+                line = line[cut:]
+        lines.append(line)
+    return lines
+
+
+def pdf_string(text):
+    encoded = str(text).encode("cp1252", errors="replace")
+    return b"(" + encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def number(value):
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+# One page's drawing operations.  Coordinates are in points from the bottom left corner.
+class PdfPage:
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.operations = []
+
+    def text(self, x, y, text, size=10, bold=False):
+        self.operations.append(b"BT /%s %s Tf %s %s Td %s Tj ET" % (
+            b"F2" if bold else b"F1", number(size).encode(), number(x).encode(), number(y).encode(),
+            pdf_string(text)))
+
+    def rectangle(self, x, y, width, height, fill=(0, 0, 0)):
+        self.operations.append(("q %s %s %s rg %s %s %s %s re f Q" % (
+            *(number(channel) for channel in fill), number(x), number(y), number(width), number(height))).encode())
+
+    def line(self, x1, y1, x2, y2, width=0.5, colour=(0, 0, 0)):
+        self.operations.append(("q %s w %s %s %s RG %s %s m %s %s l S Q" % (
+            number(width), *(number(channel) for channel in colour), number(x1), number(y1), number(x2),
+            number(y2))).encode())
+
+    def content(self):
+        return b"\n".join(self.operations)
+
+
+class PdfDocument:
+
+    def __init__(self, page_size=LETTER, title=None):
+        self.page_size = page_size
+        self.title = title
+        self.pages = []
+
+    def new_page(self):
+        page = PdfPage(*self.page_size)
+        self.pages.append(page)
+        return page
+
+    def to_bytes(self):
+        # objects 1-4 are the catalog, the page tree and the two fonts; each page adds a page and its content
+        objects = [None, None,
+                   b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+                   b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"]
+        page_numbers = []
+        for page in self.pages:
+            content = zlib.compress(page.content())
+            objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(content), content))
+            page_numbers.append(len(objects) + 1)
+            objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] /Contents %d 0 R "
+                           b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % (
+                               number(page.width).encode(), number(page.height).encode(), len(objects)))
+        objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+        objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % page_number for page_number in page_numbers), len(page_numbers))
+        if self.title is not None:
+            objects.append(b"<< /Title %s >>" % pdf_string(self.title))
+        output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for object_number, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b"%d 0 obj\n%s\nendobj\n" % (object_number, body)
+        xref = len(output)
+        output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        for offset in offsets:
+            output += b"%010d 00000 n \n" % offset
+        info = b" /Info %d 0 R" % len(objects) if self.title is not None else b""
+        output += b"trailer\n<< /Size %d /Root 1 0 R%s >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, info, xref)
+        return bytes(output)
@@ -0,0 +1,158 @@
+# Daily Pull List
+# Adds up everything sterile processing has to pick for a day of cases, instead of opening each doctor's
+# card one at a time.
+#
+# Usage: python pull_list.py SCHEDULE [--out OUT_DIRECTORY] [--date DATE] [--report FILE]
+#
+# The schedule is a CSV with one row per case and the columns Doctor and Surgery (an optional Date column
+# is filtered with --date; other columns are ignored).  Each case uses the latest saved version of that
+# doctor's card for the surgery.  Every card's lines are put in one table and added up per container
+# (Service, Container Name) and per vendor part #, with held quantities kept apart from the ones to pull.
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from card_columns import SHEET_COLUMNS
+from card_manifest import CardManifest
+from card_store import CardStore
+from drift import normalize_part_numbers
+
+REPORT_FILE_NAME = "pull_list.csv"
+SCHEDULE_COLUMNS = ['Doctor', 'Surgery']
+PULL_LIST_COLUMNS = ['Kind', 'Service', 'Container Name', 'Item Description', 'Vendor Part #', 'Pull', 'Hold',
+                     'Cases']
+CONTAINER = "container"
+SOFT_GOOD = "soft good"
+
+
+def match_key(values):
+    # doctors and surgeries are typed by hand in the schedule, so case and spacing are ignored
+    return values.astype(str).str.strip().str.casefold()
+
+
+def read_schedule(file_path, date=None):
+    schedule = pd.read_csv(file_path, dtype=str, keep_default_na=False)
+    missing = set(SCHEDULE_COLUMNS) - set(schedule.columns)
+    if missing:
+        raise ValueError(f"{file_path} is missing the columns {', '.join(sorted(missing))}")
+    if date is not None:
+        if 'Date' not in schedule:
+            raise ValueError(f"{file_path} has no Date column to pick {date} from")
+        schedule = schedule[schedule['Date'].str.strip() == date]
+    schedule = schedule[(schedule['Doctor'].str.strip() != "") | (schedule['Surgery'].str.strip() != "")]
+    return schedule.reset_index(drop=True)
+
+
+def latest_cards(manifest):
+    entries = list(manifest.latest.values())
+    return pd.DataFrame({'Card ID': [entry.card_id for entry in entries],
+                         'Sheet': [entry.sheet_name for entry in entries],
+                         'doctor_key': match_key(pd.Series([entry.doctor for entry in entries], dtype=object)),
+                         'surgery_key': match_key(pd.Series([entry.surgery for entry in entries], dtype=object))})
+
+
+# The schedule with the Card ID and Sheet of the card each case uses (missing when there is no saved card)
+def resolve_cases(schedule, latest):
+    cases = schedule.assign(doctor_key=match_key(schedule['Doctor']), surgery_key=match_key(schedule['Surgery']))
+    resolved = cases.merge(latest, on=['doctor_key', 'surgery_key'], how='left')
+    return resolved.drop(columns=['doctor_key', 'surgery_key'])
+
+
+# Every line of the given cards in one frame, with the Card ID it belongs to
+def card_lines(store, card_ids):
+    connection = store.connect()
+    card_column = []
+    rows = []
+    for card_id in card_ids:
+        card_rows = store.rebuild_rows(connection, card_id)
+        card_column.extend([card_id] * len(card_rows))
+        rows.extend(card_rows)
+    lines = pd.DataFrame(rows, columns=SHEET_COLUMNS)
+    lines.insert(0, 'Card ID', np.array(card_column, dtype=np.int64))
+    return lines
+
+
+def build_pull_list(cases, lines):
+    cases_per_card = cases['Card ID'].dropna().astype(np.int64).value_counts()
+    if lines.empty or cases_per_card.empty:
+        return pd.DataFrame(columns=PULL_LIST_COLUMNS)
+    is_container = lines['Container Name'].notna().to_numpy()
+    parts = normalize_part_numbers(lines['Vendor Part #'].fillna(""))
+    descriptions = lines['Item Description'].fillna("").astype(str).str.strip().str.casefold()
+    lines = lines.assign(
+        Kind=np.where(is_container, CONTAINER, SOFT_GOOD),
+        # containers are one item per service; soft goods are one item per vendor part #, or per description
+        # when a line has no part #
+        first_key=np.where(is_container, lines['Service'].fillna("").astype(str), parts),
+        second_key=np.where(is_container, lines['Container Name'].fillna("").astype(str),
+                            np.where(parts == "", descriptions, "")),
+        Cases=lines['Card ID'].map(cases_per_card).to_numpy())
+    quantities = lines['Quantity'].fillna(0).astype(np.int64).to_numpy() * lines['Cases'].to_numpy()
+    held = lines['Hold'].astype(bool).to_numpy()
+    lines['Pull'] = np.where(held, 0, quantities)
+    lines['Hold'] = np.where(held, quantities, 0)
+
+    keys = ['Kind', 'first_key', 'second_key']
+    grouped = lines.groupby(keys, sort=False)
+    pull_list = grouped.agg({'Service': 'first', 'Container Name': 'first', 'Item Description': 'first',
+                             'Vendor Part #': 'first', 'Pull': 'sum', 'Hold': 'sum'})
+    # an item listed twice on one card is still needed for that card's cases only once
+    pull_list['Cases'] = lines.drop_duplicates(['Card ID'] + keys).groupby(keys, sort=False)['Cases'].sum()
+    pull_list = pull_list.reset_index()
+    pull_list = pull_list.sort_values(['Kind', 'Service', 'Container Name', 'Item Description'],
+                                      na_position='first', kind='stable')
+    return pull_list[PULL_LIST_COLUMNS].reset_index(drop=True)
+
+
+def make_pull_list(store, schedule, manifest=None):
+    if manifest is None:
+        manifest = CardManifest(store)
+        manifest.refresh()
+    cases = resolve_cases(schedule, latest_cards(manifest))
+    # plain ints, sqlite can't bind numpy integers
+    card_ids = cases['Card ID'].dropna().astype(np.int64).unique().tolist()
+    return build_pull_list(cases, card_lines(store, card_ids)), cases
+
+
+def run(schedule_path, out_directory, date=None, report_path=None, output=sys.stdout):
+    start = time.perf_counter()
+    schedule = read_schedule(schedule_path, date)
+    store = CardStore(out_directory, SHEET_COLUMNS)
+    try:
+        pull_list, cases = make_pull_list(store, schedule)
+    finally:
+        store.close()
+    if report_path is None:
+        report_path = os.path.join(out_directory, REPORT_FILE_NAME)
+    pull_list.to_csv(report_path, index=False)
+    unresolved = cases[cases['Card ID'].isna()]
+    print(f"{len(cases)} cases on {cases['Card ID'].nunique()} cards: {len(pull_list)} items to pick in "
+          f"{time.perf_counter() - start:.2f}s. Pull list written to {report_path}", file=output)
+    for doctor, surgery in unresolved[SCHEDULE_COLUMNS].drop_duplicates().itertuples(index=False):
+        print(f"  No saved card for {doctor}, {surgery}", file=output)
+    return pull_list, cases
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Add up the containers and soft goods needed for a day of cases.")
+    parser.add_argument("schedule", help="CSV with a Doctor and a Surgery column, one row per case")
+    parser.add_argument("--out", dest="out_directory", default=".", help="directory with the preference cards")
+    parser.add_argument("--date", default=None, help="only the cases whose Date column is this value")
+    parser.add_argument("--report", default=None, help=f"CSV pull list to write (defaults to {REPORT_FILE_NAME} "
+                                                        f"in the out directory)")
+    options = parser.parse_args(args)
+    try:
+        run(options.schedule, os.path.abspath(options.out_directory), options.date, options.report)
+    except (OSError, ValueError) as e:
+        print(f"Pull list failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
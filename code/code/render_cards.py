@@ -0,0 +1,403 @@
+# Card Printouts
+# Renders saved preference cards as print-ready documents for sterile processing, instead of each card being
+# opened in Excel and printed by hand.
+#
+# Usage: python render_cards.py [--out OUT_DIRECTORY] [--doctor DOCTOR ...] [--schedule SCHEDULE [--date DATE]]
+#                               [--card ID ...] [--format pdf|html] [--to DIRECTORY] [--workers N] [--force]
+#
+# Without --doctor, --schedule or --card the latest version of every card is rendered.  --doctor renders the
+# latest version of each of that doctor's surgeries, --schedule the card each case in a day's schedule uses
+# (the same CSV as pull_list.py) and --card a particular saved version.  Each card is one paginated document
+# with its containers grouped by service, then its soft goods, and held lines highlighted.  PDFs use the
+# fonts built into every PDF reader and HTML pages print with the browser; neither needs anything installed.
+#
+# Documents go to printouts in the out-directory (or --to) and are rendered in worker processes.  A card is
+# only rendered again when a new version of it was saved since the last render (or with --force).
+
+import argparse
+import html
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from card_columns import SHEET_COLUMNS
+from card_manifest import CardManifest
+from card_store import CardStore, text_value
+from pdf_writer import PdfDocument, text_width, wrap_text
+from pull_list import SCHEDULE_COLUMNS, latest_cards, read_schedule, resolve_cases
+
+RENDER_DIRECTORY_NAME = "printouts"
+STATE_FILE_NAME = ".rendered.json"
+# bump when the layout changes, so every card is rendered again
+RENDER_VERSION = 1
+FORMATS = ("pdf", "html")
+# fewer cards than this are rendered in this process rather than starting worker processes
+POOL_MINIMUM = 8
+UNSAFE_CHARACTERS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+CONTAINER_HEADINGS = ['Qty', 'Container Name', 'Hold']
+SOFT_GOODS_HEADINGS = ['Qty', 'Item Description', 'Vendor Part #', 'Hold']
+NO_SERVICE = "(no service)"
+
+# PDF layout, in points
+MARGIN = 36
+FOOTER_HEIGHT = 24
+LINE_HEIGHT = 12
+ROW_PADDING = 4
+CONTAINER_WIDTHS = (40, 440, 60)
+SOFT_GOODS_WIDTHS = (40, 300, 140, 60)
+HOLD_FILL = (1, 0.9, 0.55)
+HEADING_FILL = (0.9, 0.9, 0.9)
+RULE_COLOUR = (0.75, 0.75, 0.75)
+
+HTML_STYLE = """
+@page { size: letter; margin: 0.5in; }
+* { -webkit-print-color-adjust: exact; print-color-adjust: exact; }
+body { font-family: Helvetica, Arial, sans-serif; font-size: 10pt; margin: 0; }
+h1 { font-size: 16pt; margin: 0 0 2pt; }
+h2 { font-size: 12pt; margin: 12pt 0 4pt; break-after: avoid; }
+p.details { font-size: 9pt; margin: 0 0 6pt; }
+table { width: 100%; border-collapse: collapse; }
+thead { display: table-header-group; }
+tr { break-inside: avoid; }
+th { background: #e6e6e6; font-size: 9pt; }
+th, td { text-align: left; vertical-align: top; padding: 2pt 4pt; border-bottom: 1px solid #bfbfbf; }
+.quantity { width: 3em; text-align: right; }
+.hold-column { width: 4em; }
+.part { width: 10em; }
+tr.hold td { background: #ffe58c; font-weight: bold; }
+"""
+
+
+class CardSection:
+
+    __slots__ = ("heading", "column_headings", "rows")
+
+    def __init__(self, heading, column_headings):
+        self.heading = heading
+        self.column_headings = column_headings
+        # (cells as text, held)
+        self.rows = []
+
+
+# The card's containers in one section per service (alphabetical, in card order within a service), then its
+# soft goods.  rows are card store rows.
+def card_sections(rows):
+    services = {}
+    soft_goods = CardSection("Soft Goods", SOFT_GOODS_HEADINGS)
+    for quantity, service, container_name, item_description, vendor_part, hold in rows:
+        held = bool(hold)
+        hold_text = "HOLD" if held else ""
+        quantity = text_value(quantity) or ""
+        if container_name is not None:
+            service = text_value(service) or NO_SERVICE
+            section = services.get(service)
+            if section is None:
+                section = services[service] = CardSection(service, CONTAINER_HEADINGS)
+            section.rows.append(([quantity, text_value(container_name), hold_text], held))
+        else:
+            soft_goods.rows.append(([quantity, text_value(item_description) or "", text_value(vendor_part) or "",
+                                     hold_text], held))
+    sections = [services[service] for service in sorted(services)]
+    if soft_goods.rows:
+        sections.append(soft_goods)
+    return sections
+
+
+def card_details(entry, sections):
+    date, _, time_of_day = entry.created.partition("_")
+    saved = f"{date} {time_of_day.replace('-', ':')}" if time_of_day else entry.sheet_name
+    containers = [held for section in sections if section.column_headings is CONTAINER_HEADINGS
+                  for _, held in section.rows]
+    soft_goods = [held for section in sections if section.column_headings is SOFT_GOODS_HEADINGS
+                  for _, held in section.rows]
+    return (f"Saved {saved} - version {entry.version} - {len(containers)} containers ({sum(containers)} on hold), "
+            f"{len(soft_goods)} soft goods ({sum(soft_goods)} on hold)")
+
+
+def render_html(entry, sections):
+    title = html.escape(f"{entry.doctor} - {entry.surgery}")
+    parts = ["<!DOCTYPE html>", '<html lang="en">', "<head>", '<meta charset="utf-8">', f"<title>{title}</title>",
+             f"<style>{HTML_STYLE}</style>", "</head>", "<body>", f"<h1>{title}</h1>",
+             f'<p class="details">{html.escape(card_details(entry, sections))}</p>']
+    for section in sections:
+        classes = (["quantity", "", "hold-column"] if section.column_headings is CONTAINER_HEADINGS
+                   else ["quantity", "", "part", "hold-column"])
+        parts.append(f"<section><h2>{html.escape(section.heading)}</h2><table><thead><tr>")
+        parts.extend(f'<th class="{css}">{html.escape(heading)}</th>' if css else f"<th>{html.escape(heading)}</th>"
+                     for css, heading in zip(classes, section.column_headings))
+        parts.append("</tr></thead><tbody>")
+        for cells, held in section.rows:
+            parts.append('<tr class="hold">' if held else "<tr>")
+            parts.extend(f'<td class="{css}">{html.escape(cell)}</td>' if css else f"<td>{html.escape(cell)}</td>"
+                         for css, cell in zip(classes, cells))
+            parts.append("</tr>")
+        parts.append("</tbody></table></section>")
+    if not sections:
+        parts.append("<p>This card has no containers or soft goods.</p>")
+    parts.extend(["</body>", "</html>", ""])
+    return "\n".join(parts).encode("utf-8")
+
+
+# Lays the card out a row at a time, starting a new page (with the section's heading and column headings
+# again) whenever the next row doesn't fit, then numbers the pages.
+class PdfCardLayout:
+
+    def __init__(self, entry):
+        self.entry = entry
+        self.document = PdfDocument(title=f"{entry.doctor} - {entry.surgery}")
+        self.page = None
+        self.y = 0
+
+    def new_page(self, continued=True):
+        self.page = self.document.new_page()
+        self.y = self.page.height - MARGIN
+        if continued:
+            self.page.text(MARGIN, self.y - 9, f"{self.entry.doctor} - {self.entry.surgery} (continued)", 9)
+            self.y -= 18
+
+    def room(self):
+        return self.y - MARGIN - FOOTER_HEIGHT
+
+    def header(self, details):
+        self.new_page(continued=False)
+        for line in wrap_text(f"{self.entry.doctor} - {self.entry.surgery}", self.page.width - 2 * MARGIN, 16, True):
+            self.page.text(MARGIN, self.y - 16, line, 16, bold=True)
+            self.y -= 20
+        self.page.text(MARGIN, self.y - 9, details, 9)
+        self.y -= 18
+
+    def row_lines(self, cells, widths, size, bold):
+        return [wrap_text(cell, width - 2 * ROW_PADDING, size, bold) for cell, width in zip(cells, widths)]
+
+    def draw_row(self, lines, widths, size, bold, fill=None):
+        height = max(len(cell_lines) for cell_lines in lines) * LINE_HEIGHT + ROW_PADDING
+        width = sum(widths)
+        if fill is not None:
+            self.page.rectangle(MARGIN, self.y - height, width, height, fill)
+        x = MARGIN
+        for column, (cell_lines, column_width) in enumerate(zip(lines, widths)):
+            for number, line in enumerate(cell_lines):
+                if not line:
+                    continue
+                # quantities are right aligned
+                left = (x + column_width - ROW_PADDING - text_width(line, size, bold) if column == 0
+                        else x + ROW_PADDING)
+                self.page.text(left, self.y - ROW_PADDING / 2 - (number + 1) * LINE_HEIGHT + 3, line, size, bold)
+            x += column_width
+        self.y -= height
+        self.page.line(MARGIN, self.y, MARGIN + width, self.y, 0.3, RULE_COLOUR)
+
+    def section_heading(self, section, widths, continued=False):
+        heading = f"{section.heading} (continued)" if continued else section.heading
+        self.page.text(MARGIN, self.y - 14, heading, 12, bold=True)
+        self.y -= 20
+        self.draw_row(self.row_lines(section.column_headings, widths, 9, True), widths, 9, True, HEADING_FILL)
+
+    def section(self, section):
+        widths = CONTAINER_WIDTHS if section.column_headings is CONTAINER_HEADINGS else SOFT_GOODS_WIDTHS
+        rows = [(self.row_lines(cells, widths, 10, held), held) for cells, held in section.rows]
+        heading_height = 20 + LINE_HEIGHT + ROW_PADDING
+        first_height = max(len(cell_lines) for cell_lines in rows[0][0]) * LINE_HEIGHT + ROW_PADDING
+        # a heading is never left at the bottom of a page without its first row
+        if self.room() < heading_height + first_height + 8:
+            self.new_page()
+        else:
+            self.y -= 8
+        self.section_heading(section, widths)
+        for lines, held in rows:
+            height = max(len(cell_lines) for cell_lines in lines) * LINE_HEIGHT + ROW_PADDING
+            if self.room() < height:
+                self.new_page()
+                self.section_heading(section, widths, continued=True)
+            self.draw_row(lines, widths, 10, held, HOLD_FILL if held else None)
+
+    def footers(self):
+        count = len(self.document.pages)
+        label = f"{self.entry.doctor} - {self.entry.surgery} - version {self.entry.version}"
+        for number, page in enumerate(self.document.pages, start=1):
+            page.text(MARGIN, MARGIN - 12, label, 8)
+            page_label = f"Page {number} of {count}"
+            page.text(page.width - MARGIN - text_width(page_label, 8), MARGIN - 12, page_label, 8)
+
+
+def render_pdf(entry, sections):
+    layout = PdfCardLayout(entry)
+    layout.header(card_details(entry, sections))
+    for section in sections:
+        layout.section(section)
+    if not sections:
+        layout.page.text(MARGIN, layout.y - 14, "This card has no containers or soft goods.", 10)
+    layout.footers()
+    return layout.document.to_bytes()
+
+
+RENDERERS = {"pdf": render_pdf, "html": render_html}
+
+
+def document_name(entry, file_format, latest):
+    # the latest version keeps the same file name from one version to the next, so the printout is replaced
+    version = "" if latest else f" v{entry.version}"
+    name = UNSAFE_CHARACTERS.sub("_", f"{entry.doctor} - {entry.surgery}{version}").strip(" .")
+    return f"{name}.{file_format}"
+
+
+def render_card(store, entry, file_path, file_format):
+    document = RENDERERS[file_format](entry, card_sections(store.rebuild_rows(store.connect(), entry.card_id)))
+    temp = f"{file_path}.{os.getpid()}.tmp"
+    with open(temp, "wb") as f:
+        f.write(document)
+    os.replace(temp, file_path)
+    return file_path
+
+
+# each worker process opens the card store once and renders many cards with it
+worker_store = None
+
+
+def open_worker_store(out_directory):
+    global worker_store
+    worker_store = CardStore(out_directory, SHEET_COLUMNS)
+
+
+def render_task(task):
+    return render_card(worker_store, *task)
+
+
+def load_state(target_directory):
+    try:
+        with open(os.path.join(target_directory, STATE_FILE_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(target_directory, state):
+    target = os.path.join(target_directory, STATE_FILE_NAME)
+    temp = f"{target}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(temp, target)
+
+
+def render_fingerprint(entry):
+    # a saved version of a card never changes, so its id, sheet and row count say whether the file is current
+    return [entry.card_id, entry.sheet_name, entry.version, entry.row_count, RENDER_VERSION]
+
+
+# Returns the cards in manifest order (doctor, surgery, version) and the schedule cases without a saved card.
+def select_cards(manifest, doctors=(), schedule=None, card_ids=()):
+    unresolved = []
+    if not doctors and schedule is None and not card_ids:
+        selected = list(manifest.latest.values())
+    else:
+        by_id = {entry.card_id: entry for entry in manifest.entries}
+        wanted = {doctor.strip().casefold() for doctor in doctors}
+        selected = [entry for entry in manifest.latest.values() if entry.doctor.strip().casefold() in wanted]
+        missing = wanted - {entry.doctor.strip().casefold() for entry in selected}
+        if missing:
+            raise ValueError(f"No saved cards for {', '.join(sorted(missing))}")
+        if schedule is not None:
+            cases = resolve_cases(schedule, latest_cards(manifest))
+            selected.extend(by_id[card_id] for card_id in cases['Card ID'].dropna().astype(int).tolist())
+            unresolved = cases.loc[cases['Card ID'].isna(), SCHEDULE_COLUMNS].drop_duplicates()
+            unresolved = list(unresolved.itertuples(index=False, name=None))
+        for card_id in card_ids:
+            if card_id not in by_id:
+                raise ValueError(f"No saved card with id {card_id}")
+            selected.append(by_id[card_id])
+    selected = {entry.card_id: entry for entry in selected}.values()
+    return sorted(selected, key=lambda entry: (entry.doctor, entry.surgery, entry.version)), unresolved
+
+
+# Renders the cards whose documents are missing or out of date.  Returns (rendered, skipped).
+def render_cards(out_directory, manifest, entries, target_directory, file_format="pdf", workers=None, force=False):
+    os.makedirs(target_directory, exist_ok=True)
+    state = load_state(target_directory)
+    tasks = []
+    fingerprints = {}
+    for entry in entries:
+        file_name = document_name(entry, file_format, manifest.is_latest(entry))
+        file_path = os.path.join(target_directory, file_name)
+        fingerprints[file_path] = (file_name, render_fingerprint(entry))
+        if not force and state.get(file_name) == render_fingerprint(entry) and os.path.exists(file_path):
+            continue
+        tasks.append((entry, file_path, file_format))
+    rendered = 0
+    try:
+        if len(tasks) < POOL_MINIMUM or workers == 1:
+            store = CardStore(out_directory, SHEET_COLUMNS)
+            try:
+                for task in tasks:
+                    file_name, fingerprint = fingerprints[render_card(store, *task)]
+                    state[file_name] = fingerprint
+                    rendered += 1
+            finally:
+                store.close()
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=open_worker_store,
+                                     initargs=(out_directory,)) as executor:
+                # in chunks, so hundreds of small cards don't cost a round trip each
+                for file_path in executor.map(render_task, tasks, chunksize=8):
+                    file_name, fingerprint = fingerprints[file_path]
+                    state[file_name] = fingerprint
+                    rendered += 1
+    finally:
+        # whatever was rendered before a failure isn't rendered again next time
+        if rendered:
+            save_state(target_directory, state)
+    return rendered, len(entries) - len(tasks)
+
+
+def run(out_directory, doctors=(), schedule_path=None, date=None, card_ids=(), file_format="pdf",
+        target_directory=None, workers=None, force=False, output=sys.stdout):
+    start = time.perf_counter()
+    schedule = read_schedule(schedule_path, date) if schedule_path is not None else None
+    store = CardStore(out_directory, SHEET_COLUMNS)
+    try:
+        manifest = CardManifest(store)
+        manifest.refresh()
+    finally:
+        store.close()
+    entries, unresolved = select_cards(manifest, doctors, schedule, card_ids)
+    if target_directory is None:
+        target_directory = os.path.join(out_directory, RENDER_DIRECTORY_NAME)
+    rendered, skipped = render_cards(out_directory, manifest, entries, target_directory, file_format, workers,
+                                     force)
+    elapsed = time.perf_counter() - start
+    print(f"{len(entries)} cards: {rendered} rendered, {skipped} unchanged since the last render in {elapsed:.2f}s. "
+          f"Printouts are in {target_directory}", file=output)
+    for doctor, surgery in unresolved:
+        print(f"  No saved card for {doctor}, {surgery}", file=output)
+    return rendered, skipped
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Render saved preference cards as printable PDF or HTML documents.")
+    parser.add_argument("--out", dest="out_directory", default=".", help="directory with the preference cards")
+    parser.add_argument("--doctor", action="append", default=[], help="render this doctor's latest cards "
+                                                                      "(may be repeated)")
+    parser.add_argument("--schedule", default=None, help="CSV with a Doctor and a Surgery column, one row per case; "
+                                                         "renders the card each case uses")
+    parser.add_argument("--date", default=None, help="only the schedule's cases whose Date column is this value")
+    parser.add_argument("--card", dest="card_ids", type=int, action="append", default=[],
+                        help="render the saved card with this id (may be repeated)")
+    parser.add_argument("--format", dest="file_format", choices=FORMATS, default="pdf", help="document format")
+    parser.add_argument("--to", dest="target_directory", default=None,
+                        help=f"directory for the documents (defaults to {RENDER_DIRECTORY_NAME} in the out directory)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (defaults to one per CPU)")
+    parser.add_argument("--force", action="store_true", help="render every selected card, changed or not")
+    options = parser.parse_args(args)
+    try:
+        run(os.path.abspath(options.out_directory), options.doctor, options.schedule, options.date, options.card_ids,
+            options.file_format, options.target_directory, options.workers, options.force)
+    except (OSError, ValueError) as e:
+        print(f"Rendering failed: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,75 @@
+# Save Journal
+# Before a card is saved, the card (doctor, sheet name and rows) is written to .journal in the out-directory.
+# The entry stays until <doctor>.xlsx has been written with the card in it, so a save that was cut short,
+# before the store committed it or before the workbook was written, is finished the next time the doctor's
+# workbook is written (the app does that for every pending doctor when it starts).
+
+import json
+import os
+import threading
+import time
+
+JOURNAL_DIRECTORY_NAME = ".journal"
+
+
+class JournalEntry:
+
+    __slots__ = ("path", "doctor", "cards")
+
+    def __init__(self, path, doctor, cards):
+        self.path = path
+        self.doctor = doctor
+        # (sheet name, rows) pairs, rows as tuples in card_store.ROW_FIELDS order
+        self.cards = cards
+
+
+class SaveJournal:
+
+    def __init__(self, directory):
+        self.directory = os.path.join(directory, JOURNAL_DIRECTORY_NAME)
+
+    def record(self, doctor, cards):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.time_ns()}-{os.getpid()}-{threading.get_ident()}"
+        path = os.path.join(self.directory, f"{name}.json")
+        temp = os.path.join(self.directory, f".{name}.tmp")
+        with open(temp, "w", encoding="utf-8") as f:
+            json.dump({"doctor": doctor, "cards": [[sheet_name, list(rows)] for sheet_name, rows in cards]}, f)
+            f.flush()
+            # the entry has to be on disk before the save starts, or there's nothing to recover from
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+        return JournalEntry(path, doctor, cards)
+
+    def discard(self, entry):
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            # another instance of the app finished this save already
+            pass
+
+    # Oldest first, for every doctor or just one
+    def entries(self, doctor=None):
+        try:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                continue
+            except ValueError:
+                # only whole entries are renamed into place, so this was damaged some other way
+                os.replace(path, f"{path}.damaged")
+                continue
+            if doctor is None or data["doctor"] == doctor:
+                cards = [(sheet_name, [tuple(row) for row in rows]) for sheet_name, rows in data["cards"]]
+                entries.append(JournalEntry(path, data["doctor"], cards))
+        return entries
+
+    def pending_doctors(self):
+        return sorted({entry.doctor for entry in self.entries()})
@@ -0,0 +1,171 @@
+# Search Index
+# Token index over the rows of a selection list, with a trigram index over the token vocabulary,
+# so searches don't have to scan every row.  A query is split into terms and a row matches when
+# every term appears somewhere in its searchable text (the same substring match the lists always had).
+
+import re
+
+TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+TRIGRAM_LENGTH = 3
+
+
+def normalize(text):
+    return str(text).lower()
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def trigrams(text):
+    return {text[i:i + TRIGRAM_LENGTH] for i in range(len(text) - TRIGRAM_LENGTH + 1)}
+
+
+class SearchIndex:
+
+    def __init__(self, documents=()):
+        # documents are tuples of searchable fields (e.g. description and vendor part #), one per row
+        self.texts = []
+        self.postings = {}
+        self.token_trigrams = {}
+        self.last_query = None
+        self.last_result = None
+        for fields in documents:
+            self.add(fields)
+
+    def __len__(self):
+        return len(self.texts)
+
+    @staticmethod
+    def document_text(fields):
+        if isinstance(fields, str):
+            fields = (fields,)
+        # fields are joined with a newline so matches can't run across two fields
+        return "\n".join(normalize(field) for field in fields if field is not None)
+
+    def index_text(self, row, text):
+        self.texts[row] = text
+        for token in set(TOKEN_PATTERN.findall(text)):
+            rows = self.postings.get(token)
+            if rows is None:
+                # most tokens (sizes, part numbers) appear in a single row, which is kept as a bare row
+                # number rather than a set of one
+                self.postings[token] = row
+                for trigram in trigrams(token):
+                    self.token_trigrams.setdefault(trigram, set()).add(token)
+            elif isinstance(rows, int):
+                self.postings[token] = {rows, row}
+            else:
+                rows.add(row)
+        self.forget_last_query()
+
+    def add(self, fields):
+        row = len(self.texts)
+        self.texts.append(None)
+        self.index_text(row, self.document_text(fields))
+        return row
+
+    def remove(self, row):
+        text = self.texts[row]
+        if text is None:
+            return
+        for token in set(TOKEN_PATTERN.findall(text)):
+            rows = self.postings.get(token)
+            if rows is None:
+                continue
+            if isinstance(rows, int):
+                rows = set() if rows == row else {rows}
+            else:
+                rows.discard(row)
+                if len(rows) == 1:
+                    self.postings[token] = next(iter(rows))
+            if not rows:
+                del self.postings[token]
+                for trigram in trigrams(token):
+                    tokens = self.token_trigrams.get(trigram)
+                    if tokens is not None:
+                        tokens.discard(token)
+                        if not tokens:
+                            del self.token_trigrams[trigram]
+        self.texts[row] = None
+        self.forget_last_query()
+
+    def replace(self, row, fields):
+        self.remove(row)
+        self.index_text(row, self.document_text(fields))
+
+    # Moves every row to new_rows[row] in an index of size rows, e.g. after rows were inserted into a sorted
+    # list.  Rows with no new number must have been removed first; new rows are added afterwards with replace.
+    def renumber(self, new_rows, size):
+        texts = [None] * size
+        for row, text in enumerate(self.texts):
+            if text is not None:
+                texts[new_rows[row]] = text
+        for token, rows in self.postings.items():
+            if isinstance(rows, int):
+                self.postings[token] = new_rows[rows]
+            else:
+                self.postings[token] = {new_rows[row] for row in rows}
+        self.texts = texts
+        self.forget_last_query()
+
+    def forget_last_query(self):
+        self.last_query = None
+        self.last_result = None
+
+    def matching_tokens(self, piece):
+        if len(piece) < TRIGRAM_LENGTH:
+            return [token for token in self.postings if piece in token]
+        # smallest trigram set first keeps the intersections cheap
+        groups = sorted((self.token_trigrams.get(trigram, ()) for trigram in trigrams(piece)), key=len)
+        if not groups[0]:
+            return []
+        tokens = set(groups[0])
+        for group in groups[1:]:
+            tokens.intersection_update(group)
+            if not tokens:
+                return []
+        return [token for token in tokens if piece in token]
+
+    def candidates(self, term):
+        pieces = TOKEN_PATTERN.findall(term)
+        longest = max(pieces, key=len) if pieces else ""
+        if len(longest) < TRIGRAM_LENGTH and longest != term:
+            # punctuation-only terms (e.g. "-") and short mixed ones (e.g. "b-d") are cheaper to scan for directly
+            return {row for row, text in enumerate(self.texts) if text is not None and term in text}
+        # the longest piece is the most selective, any other pieces are confirmed against the text afterwards
+        rows = set()
+        for token in self.matching_tokens(longest):
+            posting = self.postings[token]
+            if isinstance(posting, int):
+                rows.add(posting)
+            else:
+                rows.update(posting)
+        return rows
+
+    def matches(self, row, terms):
+        text = self.texts[row]
+        return text is not None and all(term in text for term in terms)
+
+    # Returns the matching row numbers in ascending order, or None when the query is empty (show every row)
+    def search(self, query):
+        terms = normalize(query).split()
+        if not terms:
+            return None
+        query = " ".join(terms)
+
+        if self.last_query is not None and query.startswith(self.last_query):
+            # typing more characters can only narrow the previous result, so just re-check those rows
+            result = [row for row in self.last_result if self.matches(row, terms)]
+        else:
+            rows = None
+            for term in sorted(set(terms), key=len, reverse=True):
+                candidates = self.candidates(term)
+                rows = candidates if rows is None else rows & candidates
+                if not rows:
+                    break
+            result = sorted(row for row in rows if self.matches(row, terms))
+
+        self.last_query = query
+        self.last_result = result
+        return result
@@ -0,0 +1,125 @@
+# Selection Store
+# The quantities and holds picked for a card, kept as one small record per selected item rather than in
+# widgets or DataFrames.  Containers are keyed by (service, container name) and soft goods by
+# (item description, vendor part #), so everything here costs time in the number of items picked.
+
+
+class SelectionRecord:
+
+    __slots__ = ("quantity", "hold")
+
+    def __init__(self, quantity=None, hold=False):
+        self.quantity = quantity
+        self.hold = hold
+
+    def is_empty(self):
+        return self.quantity is None and not self.hold
+
+
+def parse_quantity(quantity):
+    if quantity is None:
+        return None
+    if isinstance(quantity, str):
+        quantity = quantity.strip()
+        if not quantity:
+            return None
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        # NaN and other blanks from a spreadsheet
+        return None
+    return quantity
+
+
+def sort_key(key):
+    # part numbers can be numbers or text depending on how the sheet was read, so compare them as text
+    return tuple(str(field) for field in key)
+
+
+class SelectionStore:
+
+    def __init__(self, records=None):
+        self.records = records if records is not None else {}
+
+    def __len__(self):
+        return sum(1 for record in self.records.values() if record.quantity is not None)
+
+    def __contains__(self, key):
+        record = self.records.get(key)
+        return record is not None and record.quantity is not None
+
+    def get_quantity(self, key):
+        record = self.records.get(key)
+        return record.quantity if record is not None else None
+
+    def get_hold(self, key):
+        record = self.records.get(key)
+        return record.hold if record is not None else False
+
+    def set_quantity(self, key, quantity):
+        self.update(key, quantity=parse_quantity(quantity))
+
+    def set_hold(self, key, hold):
+        self.update(key, hold=bool(hold))
+
+    def add_quantity(self, key, amount=1):
+        quantity = (self.get_quantity(key) or 0) + amount
+        self.update(key, quantity=quantity)
+        return quantity
+
+    def update(self, key, **values):
+        record = self.records.get(key)
+        if record is None:
+            record = self.records[key] = SelectionRecord()
+        for name, value in values.items():
+            setattr(record, name, value)
+        # a row with no quantity and no hold isn't a selection at all
+        if record.is_empty():
+            del self.records[key]
+
+    def clear(self):
+        self.records = {}
+
+    # (key, quantity, hold) for every item with a quantity.  positions maps keys to display order;
+    # without it the rows are sorted by key.  With positions, keys that aren't displayed are left out.
+    def selected_rows(self, positions=None):
+        if positions is None:
+            keys = sorted((key for key in self.records if key in self), key=sort_key)
+        else:
+            keys = sorted((key for key in self.records if key in self and key in positions), key=positions.get)
+        return [(key, self.records[key].quantity, self.records[key].hold) for key in keys]
+
+    def copy(self, keys=None):
+        records = {}
+        for key, record in self.records.items():
+            if keys is None or key in keys:
+                records[key] = SelectionRecord(record.quantity, record.hold)
+        return SelectionStore(records)
+
+    # Old cards can list the same item more than once.  The rows are combined rather than letting
+    # whichever comes last win: quantities are added up and the item is held if any of the rows held it.
+    @classmethod
+    def from_dataframe(cls, df, key_columns, quantity_column='Quantity', hold_column='Hold'):
+        store = cls()
+        if df is None or df.empty:
+            return store
+        keys = zip(*(df[column] for column in key_columns))
+        holds = df[hold_column].fillna(False) if hold_column in df else [False] * len(df)
+        for key, quantity, hold in zip(keys, df[quantity_column], holds):
+            quantity = parse_quantity(quantity)
+            if quantity is not None and key in store:
+                quantity += store.get_quantity(key)
+            store.update(key, quantity=quantity if quantity is not None else store.get_quantity(key),
+                         hold=bool(hold) or store.get_hold(key))
+        return store
+
+    # one row per selected item in the sheet layout; key_columns say where the key fields go
+    def to_dataframe(self, columns, key_columns, positions=None):
+        import pandas as pd
+        rows = []
+        for key, quantity, hold in self.selected_rows(positions):
+            row = dict(zip(key_columns, key))
+            row['Quantity'] = quantity
+            row['Hold'] = hold
+            rows.append([row.get(column) for column in columns])
+        return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,92 @@
+# Service Client
+# The workstation side of card_service.  The app only fetches parsed catalogs from the service, when a catalog
+# isn't in its own cache yet; searching, finding cards and opening them stay local.  Each thread keeps one
+# connection open to the service, so a fetch is a single round trip on localhost.  If the service can't be
+# reached the app reads the files itself.
+
+import http.client
+import json
+import os
+import threading
+from urllib.parse import urlencode, urlsplit
+
+from catalog_cache import compact_frame, read_excel
+
+# set to the service's address (e.g. http://127.0.0.1:8470) to use a running card service
+SERVICE_VARIABLE = "PREFERENCE_CARD_SERVICE"
+SERVICE_TIMEOUT = 30  # seconds; the service may have to parse a catalog before it can answer
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+
+    def __init__(self, url, timeout=SERVICE_TIMEOUT):
+        address = urlsplit(url if "//" in url else f"http://{url}")
+        if address.scheme != "http" or not address.hostname:
+            raise ValueError(f"Unsupported card service address '{url}'")
+        self.url = url
+        self.host = address.hostname
+        self.port = address.port or 80
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(self.host, self.port,
+                                                                            timeout=self.timeout)
+        return connection
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    # GETs path with the given query parameters and returns the decoded JSON answer
+    def get(self, path, **parameters):
+        target = f"{path}?{urlencode(parameters)}" if parameters else path
+        for attempt in range(2):
+            try:
+                connection = self.connection()
+                connection.request("GET", target)
+                response = connection.getresponse()
+                body = response.read()
+                break
+            except (OSError, http.client.HTTPException):
+                # the service closes idle connections when it restarts, so try once on a new connection
+                self.close()
+                if attempt:
+                    raise
+        if response.will_close:
+            self.close()
+        answer = json.loads(body)
+        if response.status != 200:
+            raise ServiceError(answer.get("error", f"HTTP {response.status}"))
+        return answer
+
+    def status(self):
+        return self.get("/status")
+
+    # The parsed catalog for a workbook in the service's input directory, matched by file name.  The size and
+    # modification time of the local file go with the request, so a service holding another version of the
+    # file (or another file of the same name) answers with an error rather than the wrong catalog.
+    def read_catalog(self, file_path):
+        import pandas as pd
+        stat = os.stat(file_path)
+        answer = self.get("/catalog", name=os.path.basename(file_path), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+        return compact_frame(pd.DataFrame(answer["data"], columns=answer["columns"]))
+
+
+# A CatalogCache reader that asks the service for the parsed catalog and only parses the workbook itself
+# when the service is down, doesn't have it or has another version of it
+def service_reader(client):
+    def read(file_path):
+        try:
+            return client.read_catalog(file_path)
+        except (OSError, http.client.HTTPException, ServiceError, ValueError):
+            return read_excel(file_path)
+    return read
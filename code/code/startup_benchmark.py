@@ -0,0 +1,96 @@
+# Start-up Benchmark
+# Launches the app several times and reports how long it takes for the first window to appear and for the
+# file confirmation window to become usable.  Needs a display (a headless X server such as Xvfb will do).
+#
+# Usage: python startup_benchmark.py [IN_DIRECTORY [OUT_DIRECTORY]] [--runs N] [--cold] [--json FILE]
+#                                    [--max-first-window SECONDS] [--max-interactive SECONDS]
+#
+# --cold deletes the catalog cache before every run, so each launch parses the input workbooks from scratch.
+# With the --max options the exit status is 1 when the median is slower, so the benchmark can gate a build.
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from card_columns import CATALOG_CACHE_DIRECTORY_NAME, STARTUP_BENCHMARK_VARIABLE
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Preference_Card_Software_v2.py")
+MILESTONES = ("started", "first window", "interactive")
+
+
+def launch(in_directory, out_directory, timeout):
+    environment = dict(os.environ)
+    environment[STARTUP_BENCHMARK_VARIABLE] = "1"
+    launched = time.time()
+    completed = subprocess.run([sys.executable, APP, in_directory, out_directory], env=environment,
+                               capture_output=True, text=True, timeout=timeout)
+    if completed.returncode != 0:
+        raise RuntimeError(f"the app exited with status {completed.returncode}: {completed.stderr.strip()}")
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith("{"):
+            times = json.loads(line)
+            return {milestone: times[milestone] - launched for milestone in MILESTONES if milestone in times}
+    raise RuntimeError("the app didn't report its start-up times")
+
+
+def run(in_directory, out_directory, runs=5, cold=False, timeout=120, output=sys.stdout):
+    cache_directory = os.path.join(in_directory, CATALOG_CACHE_DIRECTORY_NAME)
+    samples = []
+    for number in range(1, runs + 1):
+        if cold:
+            shutil.rmtree(cache_directory, ignore_errors=True)
+        sample = launch(in_directory, out_directory, timeout)
+        samples.append(sample)
+        print(f"run {number}: " + ", ".join(f"{milestone} {seconds:.3f}s" for milestone, seconds in sample.items()),
+              file=output)
+    summary = {}
+    for milestone in MILESTONES:
+        values = [sample[milestone] for sample in samples if milestone in sample]
+        if values:
+            summary[milestone] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+    print("median: " + ", ".join(f"{milestone} {values['median']:.3f}s" for milestone, values in summary.items()),
+          file=output)
+    return {"runs": samples, "summary": summary, "cold": cold, "python": sys.version.split()[0]}
+
+
+def main(args):
+    parser = argparse.ArgumentParser(description="Measure time-to-first-window and time-to-interactive.")
+    parser.add_argument("in_directory", nargs="?", default=".", help="directory with the input catalogs")
+    parser.add_argument("out_directory", nargs="?", default=None,
+                        help="directory for the preference cards (defaults to the in directory)")
+    parser.add_argument("--runs", type=int, default=5, help="number of launches (default 5)")
+    parser.add_argument("--cold", action="store_true", help="clear the catalog cache before every launch")
+    parser.add_argument("--json", default=None, help="also write the results to this JSON file")
+    parser.add_argument("--max-first-window", type=float, default=None, help="fail if the median is slower")
+    parser.add_argument("--max-interactive", type=float, default=None, help="fail if the median is slower")
+    options = parser.parse_args(args)
+
+    in_directory = os.path.abspath(options.in_directory)
+    out_directory = os.path.abspath(options.out_directory or options.in_directory)
+    try:
+        results = run(in_directory, out_directory, options.runs, options.cold)
+    except (OSError, RuntimeError, subprocess.TimeoutExpired) as e:
+        print(f"Start-up benchmark failed: {e}", file=sys.stderr)
+        return 1
+    if options.json:
+        with open(options.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    slow = []
+    for milestone, limit in (("first window", options.max_first_window), ("interactive", options.max_interactive)):
+        median = results["summary"].get(milestone, {}).get("median")
+        if limit is not None and median is not None and median > limit:
+            slow.append(f"{milestone} took {median:.3f}s (limit {limit:.3f}s)")
+    if slow:
+        print("Too slow: " + "; ".join(slow), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,6 @@
+# The modules import each other as top-level modules from code/code, as they do when the app is run there.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,107 @@
+import io
+import json
+from datetime import datetime
+
+import openpyxl
+import pandas as pd
+import pytest
+
+from batch import CardSpec, CatalogValidator, parse_created, read_specs, run
+from card_columns import SHEET_COLUMNS
+from card_store import CardStore
+
+CONTAINERS = pd.DataFrame({'Service': ["ORTHO", "ORTHO", "GENERAL"],
+                           'Container Name': ["KNEE TRAY", "HIP TRAY", "LAP TRAY"],
+                           'Reference ID': ["R1", "R2", "R3"]})
+SOFT_GOODS = pd.DataFrame({'ITEM DESCRIPTION': ["GAUZE 4X4", "SUTURE VICRYL"], 'VENDOR PART#': ["B-D371110", 317]})
+
+
+def write_catalog(path, frame):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(list(frame.columns))
+    for row in frame.itertuples(index=False):
+        sheet.append(list(row))
+    workbook.save(path)
+    return str(path)
+
+
+def blanks_as_none(frame):
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).values.tolist()
+
+
+def spec(items):
+    return CardSpec("Doc", "Knee", None, items, "test")
+
+
+def test_lines_are_matched_against_the_catalogs():
+    validator = CatalogValidator(CONTAINERS, SOFT_GOODS)
+    frame, problems = validator.validate(spec([
+        {'Quantity': "2", 'Service': "ORTHO", 'Container Name': "KNEE TRAY", 'Hold': "x"},
+        # soft goods are matched on the part # and take the catalog's spelling
+        {'Quantity': 3, 'Item Description': "gauze", 'Vendor Part #': "bd 371110"},
+        {'Quantity': "1", 'Vendor Part #': 317.0},
+    ]))
+    assert problems == []
+    assert blanks_as_none(frame) == [[2, "ORTHO", "KNEE TRAY", None, None, True],
+                                     [3, None, None, "GAUZE 4X4", "B-D371110", False],
+                                     [1, None, None, "SUTURE VICRYL", 317, False]]
+
+
+def test_bad_lines_are_reported():
+    validator = CatalogValidator(CONTAINERS, SOFT_GOODS)
+    _, problems = validator.validate(CardSpec("", "Knee", None, [
+        {'Quantity': "0", 'Vendor Part #': "B-D371110"},
+        {'Quantity': "two", 'Vendor Part #': "B-D371110"},
+        {'Quantity': 1, 'Service': "GENERAL", 'Container Name': "KNEE TRAY"},
+        {'Quantity': 1, 'Vendor Part #': "999"},
+        {'Quantity': 1},
+    ], "test"))
+    assert problems == ["no doctor",
+                        "line 1: quantity '0' is not a positive whole number",
+                        "line 2: quantity 'two' is not a positive whole number",
+                        "line 3: no container 'KNEE TRAY' in service 'GENERAL'",
+                        "line 4: no soft good with vendor part # '999'",
+                        "line 5: neither a container nor a vendor part #"]
+    assert validator.validate(spec([]))[1] == ["nothing on the card"]
+
+
+def test_created_dates_in_each_format():
+    assert parse_created("2024-03-04") == datetime(2024, 3, 4)
+    assert parse_created("2024-03-04 08:15:30") == datetime(2024, 3, 4, 8, 15, 30)
+    assert parse_created("") is None
+    with pytest.raises(ValueError):
+        parse_created("04/03/2024")
+
+
+def test_csv_lines_are_grouped_into_cards(tmp_path):
+    path = tmp_path / "cards.csv"
+    path.write_text("Doctor,Surgery,Card,Quantity,Vendor Part #,Created\n"
+                    " Doc ,Knee,1,1,317,2024-03-04\n"
+                    " Doc ,Knee,1,2,B-D371110,2024-03-04\n"
+                    " Doc ,Knee,2,5,317,\n")
+    specs = read_specs(str(path))
+    assert [(card.doctor, card.surgery, card.created, len(card.items)) for card in specs] == [
+        ("Doc", "Knee", datetime(2024, 3, 4), 2), ("Doc", "Knee", None, 1)]
+    assert list(specs[0].items[0]) == SHEET_COLUMNS
+
+
+def test_run_writes_the_valid_cards(tmp_path):
+    container_file = write_catalog(tmp_path / "containers.xlsx", CONTAINERS)
+    soft_goods_file = write_catalog(tmp_path / "soft goods.xlsx", SOFT_GOODS)
+    spec_file = tmp_path / "cards.json"
+    spec_file.write_text(json.dumps([
+        {"doctor": "Doc", "surgery": "Knee", "created": "2024-03-04",
+         "items": [{"Quantity": 1, "Service": "ORTHO", "Container Name": "KNEE TRAY"}]},
+        {"doctor": "Doc", "surgery": "Hip", "items": [{"Quantity": 1, "Vendor Part #": "nope"}]},
+    ]))
+    output = io.StringIO()
+    written, rejected = run([str(spec_file)], str(tmp_path), str(tmp_path / "out"), workers=1, export=False,
+                            container_file=container_file, soft_goods_file=soft_goods_file, output=output)
+    assert (written, rejected) == (1, 1)
+    assert "Skipped" in output.getvalue()
+    store = CardStore(str(tmp_path / "out"), SHEET_COLUMNS)
+    sheet_names = store.get_sheet_names("Doc")
+    assert len(sheet_names) == 1
+    assert blanks_as_none(store.load_card("Doc", sheet_names[0])) == [[1, "ORTHO", "KNEE TRAY", None, None, False]]
@@ -0,0 +1,88 @@
+import random
+
+from card_history import ADDED, CHANGED, REMOVED, apply_changes, diff_rows, row_changes
+
+
+def container(name, quantity=1, hold=0, service="GENERAL"):
+    return (quantity, service, name, None, None, hold)
+
+
+def soft_good(description, part, quantity=1, hold=0):
+    return (quantity, None, None, description, part, hold)
+
+
+def round_trip(old_rows, new_rows):
+    changes = row_changes(old_rows, new_rows)
+    assert changes is not None
+    assert apply_changes(old_rows, changes, len(new_rows)) == new_rows
+    return changes
+
+
+def test_unchanged_card_has_no_changes():
+    rows = [container("TRAY A"), soft_good("Gauze", "G-1", 4)]
+    assert round_trip(rows, list(rows)) == []
+
+
+def test_quantity_hold_added_and_removed_rows():
+    old_rows = [container("TRAY A"), container("TRAY B"), soft_good("Gauze", "G-1", 4), soft_good("Tape", "T-1")]
+    new_rows = [container("TRAY A", 2), soft_good("Gauze", "G-1", 4, hold=1), soft_good("Suture", "S-1"),
+                soft_good("Tape", "T-1")]
+    changes = round_trip(old_rows, new_rows)
+    assert (None, container("TRAY B")) in changes
+    assert (2, soft_good("Suture", "S-1")) in changes
+    # rows that kept their values and order aren't stored
+    assert all(row != soft_good("Tape", "T-1") for _, row in changes)
+
+
+def test_moved_rows_keep_their_new_order():
+    old_rows = [container(name) for name in "ABCDE"]
+    new_rows = [old_rows[4], old_rows[0], old_rows[2], old_rows[1], old_rows[3]]
+    round_trip(old_rows, new_rows)
+
+
+def test_same_item_twice_is_stored_in_full():
+    rows = [container("TRAY A"), container("TRAY A", 2)]
+    assert row_changes([], rows) is None
+    assert row_changes(rows, [container("TRAY A")]) is None
+
+
+def test_blank_values_are_keys_too():
+    old_rows = [soft_good("Gauze", None), soft_good(None, "P-1"), container("TRAY A", service=None)]
+    new_rows = [soft_good(None, "P-1", 3), container("TRAY A", service=None), soft_good("Gauze", None)]
+    round_trip(old_rows, new_rows)
+
+
+def test_random_edits_rebuild_exactly():
+    generator = random.Random(14)
+    catalog = [container(f"TRAY {n}", service=f"S{n % 3}") for n in range(30)] + \
+              [soft_good(f"Item {n}", f"P-{n}") for n in range(30)]
+    rows = generator.sample(catalog, 20)
+    for _ in range(200):
+        new_rows = list(rows)
+        for _ in range(generator.randint(0, 4)):
+            action = generator.randrange(4)
+            if action == 0 and new_rows:
+                new_rows.pop(generator.randrange(len(new_rows)))
+            elif action == 1:
+                row = generator.choice(catalog)
+                if all(row[1:5] != existing[1:5] for existing in new_rows):
+                    new_rows.insert(generator.randint(0, len(new_rows)), row)
+            elif action == 2 and new_rows:
+                position = generator.randrange(len(new_rows))
+                row = new_rows[position]
+                new_rows[position] = (generator.randint(1, 9),) + row[1:5] + (generator.randint(0, 1),)
+            elif new_rows:
+                row = new_rows.pop(generator.randrange(len(new_rows)))
+                new_rows.insert(generator.randint(0, len(new_rows)), row)
+        round_trip(rows, new_rows)
+        rows = new_rows
+
+
+def test_diff_rows():
+    old_rows = [container("TRAY A"), container("TRAY B"), soft_good("Gauze", "G-1", 4)]
+    new_rows = [container("TRAY A", hold=1), soft_good("Gauze", "G-1", 4), soft_good("Tape", "T-1")]
+    assert diff_rows(old_rows, new_rows) == [
+        (CHANGED, container("TRAY A"), container("TRAY A", hold=1)),
+        (ADDED, None, soft_good("Tape", "T-1")),
+        (REMOVED, container("TRAY B"), None),
+    ]
@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pandas as pd
+
+from card_manifest import CardManifest
+from card_store import CardStore
+
+SHEET_COLUMNS = ['Quantity', 'Service', 'Container Name', 'Item Description', 'Vendor Part #', 'Hold']
+
+
+def save_versions(store, surgery, count):
+    for version in range(count):
+        frame = pd.DataFrame([[version + 1, "ORTHO", f"{surgery} TRAY", None, None, False]], columns=SHEET_COLUMNS)
+        store.add_card("Doc", surgery, frame, datetime(2026, 1, 1, 0, 0, version))
+
+
+def test_refresh_picks_up_new_cards(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    save_versions(store, "Knee", 2)
+    manifest = CardManifest(store)
+    assert manifest.refresh() == 2
+    save_versions(store, "Hip", 1)
+    assert manifest.refresh() == 1
+    assert [entry.surgery for entry in manifest.search("", latest_only=True)] == ["Hip", "Knee"]
+    assert manifest.refresh() == 0
+
+
+def test_cards_deleted_by_compaction_are_dropped(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    save_versions(store, "Knee", 3)
+    save_versions(store, "Hip", 2)
+    manifest = CardManifest(store)
+    manifest.refresh()
+    assert len(manifest) == 5
+
+    # another workstation (or compact_cards.py) keeps only the newest version of each surgery
+    CardStore(str(tmp_path), SHEET_COLUMNS).compact_history(keep=1)
+    manifest.refresh()
+    assert len(manifest) == 2
+    assert {(entry.surgery, entry.version) for entry in manifest.search("")} == {("Knee", 3), ("Hip", 2)}
+    for entry in manifest.search("doc"):
+        store.load_card_rows(entry.card_id)
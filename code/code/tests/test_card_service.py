@@ -0,0 +1,76 @@
+import asyncio
+import json
+import os
+import shutil
+import threading
+
+import openpyxl
+import pytest
+
+import service_client
+from card_service import CardService, RequestError, serve
+from service_client import ServiceClient, ServiceError, service_reader
+
+
+def write_catalog(path, descriptions):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(["ITEM DESCRIPTION", "VENDOR PART#"])
+    for number, description in enumerate(descriptions):
+        sheet.append([description, f"P-{number}"])
+    workbook.save(path)
+    return str(path)
+
+
+@pytest.fixture
+def service_url(tmp_path):
+    service = CardService(str(tmp_path / "service"))
+    os.makedirs(service.in_directory)
+    started = threading.Event()
+    address = {}
+
+    def ready(server):
+        address["port"] = server.sockets[0].getsockname()[1]
+        started.set()
+
+    thread = threading.Thread(target=lambda: asyncio.run(serve(service, "127.0.0.1", 0, ready)), daemon=True)
+    thread.start()
+    assert started.wait(10)
+    return service, f"http://127.0.0.1:{address['port']}"
+
+
+def test_catalog_is_served_for_the_same_version(tmp_path, service_url):
+    service, url = service_url
+    path = write_catalog(os.path.join(service.in_directory, "Soft Goods.xlsx"), ["GAUZE 4X4", "SUTURE"])
+    frame = ServiceClient(url).read_catalog(path)
+    assert frame["ITEM DESCRIPTION"].tolist() == ["GAUZE 4X4", "SUTURE"]
+    assert ServiceClient(url).status()["catalogs"] == {"Soft Goods.xlsx": 2}
+
+
+def test_another_version_of_the_file_is_read_locally(tmp_path, service_url, monkeypatch):
+    service, url = service_url
+    write_catalog(os.path.join(service.in_directory, "Soft Goods.xlsx"), ["GAUZE 4X4", "SUTURE"])
+    local = write_catalog(tmp_path / "Soft Goods.xlsx", ["DRAPE"])
+    with pytest.raises(ServiceError):
+        ServiceClient(url).read_catalog(local)
+    monkeypatch.setattr(service_client, "read_excel", lambda file_path: "read locally")
+    assert service_reader(ServiceClient(url))(local) == "read locally"
+
+
+def test_copied_file_with_the_same_timestamp_is_served(tmp_path):
+    service = CardService(str(tmp_path / "service"))
+    os.makedirs(service.in_directory)
+    path = write_catalog(tmp_path / "Soft Goods.xlsx", ["GAUZE 4X4"])
+    shutil.copy2(path, service.in_directory)
+    stat = os.stat(path)
+    body = service.respond(f"/catalog?name=Soft+Goods.xlsx&size={stat.st_size}&mtime_ns={stat.st_mtime_ns}")
+    assert json.loads(body)["data"] == [["GAUZE 4X4", "P-0"]]
+    with pytest.raises(RequestError) as raised:
+        service.respond(f"/catalog?name=Soft+Goods.xlsx&size={stat.st_size + 1}")
+    assert raised.value.status == 409
+
+
+def test_card_paths_are_not_served(tmp_path):
+    with pytest.raises(RequestError) as raised:
+        CardService(str(tmp_path)).respond("/cards?q=knee")
+    assert raised.value.status == 404
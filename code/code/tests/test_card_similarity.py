@@ -0,0 +1,121 @@
+import io
+import random
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import card_similarity
+from card_columns import SHEET_COLUMNS
+from card_similarity import DisjointSets, find_clusters, item_keys, jaccard, lsh_bands, minhash_signatures, run
+from card_store import CardStore
+
+KNEE = [(1, "ORTHO", "KNEE TRAY", None, None, False), (1, "ORTHO", "BASIC TRAY", None, None, False),
+        (2, None, None, "GAUZE 4X4", "B-D371110", False), (1, None, None, "SUTURE VICRYL", "J317H", False),
+        (4, None, None, "LAP SPONGE", "69250", False), (1, None, None, "DRAPE", "8000", False),
+        (1, None, None, "GLOVES", "2D72", False), (1, None, None, "BLADE", "371110", False),
+        (1, None, None, "TOWEL", "7198", False), (1, None, None, "BOWL", "2001", False)]
+
+
+def hash_sets(item_sets):
+    return [np.array(sorted(card_similarity.item_hash(str(item)) for item in items), dtype=np.uint64)
+            for items in item_sets]
+
+
+def brute_force_clusters(item_sets, threshold):
+    clusters = DisjointSets(len(item_sets))
+    for first in range(len(item_sets)):
+        for second in range(first + 1, len(item_sets)):
+            if jaccard(item_sets[first], item_sets[second]) >= threshold:
+                clusters.join(first, second)
+    return sorted(clusters.groups(), key=lambda members: (-len(members), members[0]))
+
+
+def test_bands_climb_just_below_the_threshold():
+    for threshold in (0.5, 0.8, 0.9):
+        bands, rows = lsh_bands(threshold, 128)
+        assert bands * rows <= 128
+        assert (1 / bands) ** (1 / rows) <= threshold
+        # one more row per band would put the climb above the threshold
+        assert (1 / (128 // (rows + 1))) ** (1 / (rows + 1)) > threshold
+    assert lsh_bands(0.8, 128) == (12, 10)
+    # no banding climbs that early, so every signature value is its own band
+    assert lsh_bands(0.001, 128) == (128, 1)
+
+
+def test_disjoint_sets_join_transitively():
+    sets = DisjointSets(6)
+    sets.join(0, 1)
+    sets.join(3, 4)
+    sets.join(1, 4)
+    assert sets.find(3) == sets.find(0)
+    assert sets.groups() == [[0, 1, 3, 4]]
+
+
+def test_signatures_estimate_the_similarity():
+    rng = random.Random(1)
+    base = set(range(1000))
+    near = set(rng.sample(sorted(base), 900)) | set(range(1000, 1100))
+    signatures = minhash_signatures(hash_sets([base, near, base]), permutations=256)
+    assert (signatures[0] == signatures[2]).all()
+    assert abs((signatures[0] == signatures[1]).mean() - jaccard(base, near)) < 0.1
+
+
+def test_signatures_do_not_depend_on_the_chunk_size(monkeypatch):
+    rng = random.Random(2)
+    item_sets = [set(rng.sample(range(500), rng.randint(1, 60))) for _ in range(40)]
+    signatures = minhash_signatures(hash_sets(item_sets), permutations=32)
+    monkeypatch.setattr(card_similarity, "CHUNK_SIZE", 50)
+    assert (minhash_signatures(hash_sets(item_sets), permutations=32) == signatures).all()
+
+
+def test_clusters_match_comparing_every_pair():
+    rng = random.Random(3)
+    templates = [set(rng.sample(range(10000), 40)) for _ in range(8)]
+    item_sets = []
+    for _ in range(120):
+        # a template with an item or two swapped, or a card unlike any other
+        if rng.random() < 0.8:
+            items = set(rng.choice(templates))
+            for _ in range(rng.randint(0, 2)):
+                items.discard(rng.choice(sorted(items)))
+                items.add(rng.randrange(10000, 20000))
+        else:
+            items = set(rng.sample(range(20000, 30000), 40))
+        item_sets.append(frozenset(items))
+    signatures = minhash_signatures(hash_sets(item_sets))
+    bands, rows = lsh_bands(0.8, 128)
+    clusters, compared = find_clusters(item_sets, signatures, 0.8, bands, rows)
+    assert clusters == brute_force_clusters(item_sets, 0.8)
+    assert compared < len(item_sets) * (len(item_sets) - 1) // 2
+
+
+def test_items_ignore_case_spacing_and_part_number_punctuation():
+    lines = pd.DataFrame([[1, "Ortho ", "knee tray", None, None, False], [1, "ORTHO", "KNEE TRAY", None, None, True],
+                          [2, None, None, "Gauze", "b-d 371110", False], [2.0, None, None, "GAUZE", "BD371110", False],
+                          [2, None, None, "Gauze", None, False], [3, None, None, "Gauze", None, False]],
+                         columns=SHEET_COLUMNS)
+    keys = item_keys(lines)
+    assert keys[0] == keys[1]
+    assert keys[2] == keys[3]
+    # without a part # the description is the key, and a different quantity is a different item
+    assert len(set(keys)) == 4
+
+
+def test_run_reports_each_card_against_the_template(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    created = datetime(2026, 1, 1)
+    store.add_card("Adams", "Knee", pd.DataFrame(KNEE, columns=SHEET_COLUMNS), created)
+    store.add_card("Baker", "Knee", pd.DataFrame(KNEE[:-1], columns=SHEET_COLUMNS), created)
+    store.add_card("Clark", "TKA", pd.DataFrame(KNEE + [(1, None, None, "MARKER", "1234", False)],
+                                                columns=SHEET_COLUMNS), created)
+    store.add_card("Adams", "Hip", pd.DataFrame([(1, "ORTHO", "HIP TRAY", None, None, False)], columns=SHEET_COLUMNS),
+                   created)
+    store.close()
+    output = io.StringIO()
+    report = run(str(tmp_path), output=output)
+    assert report[['Doctor', 'Change', 'Item Description']].fillna("").values.tolist() == [
+        ["Adams", "=", ""], ["Baker", "-", "BOWL"], ["Clark", "+", "MARKER"]]
+    assert report['Cluster'].unique().tolist() == [1]
+    assert "1 clusters" in output.getvalue()
+    assert (tmp_path / "card_similarity.csv").exists()
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from card_store import DATABASE_NAME, SNAPSHOT_INTERVAL, CardStore, cards_autoincrement
+
+SHEET_COLUMNS = ['Quantity', 'Service', 'Container Name', 'Item Description', 'Vendor Part #', 'Hold']
+
+
+def card_frame(rows):
+    return pd.DataFrame(rows, columns=SHEET_COLUMNS)
+
+
+def card_id(store, doctor, sheet_name):
+    return store.connect().execute("SELECT id FROM cards WHERE doctor = ? AND sheet_name = ?",
+                                   (doctor, sheet_name)).fetchone()[0]
+
+
+def stored_rows(store, doctor, sheet_name):
+    return store.load_card(doctor, sheet_name).values.tolist()
+
+
+def test_rolled_back_card_is_not_cached(tmp_path, monkeypatch):
+    # two workstations sharing one out-directory
+    first = CardStore(str(tmp_path), SHEET_COLUMNS)
+    second = CardStore(str(tmp_path), SHEET_COLUMNS)
+    first.add_card("Doc", "Knee", card_frame([[1, "ORTHO", "KNEE TRAY", None, None, False]]))
+
+    store_rows = first.store_rows
+
+    def store_then_fail(*args, **kwargs):
+        store_rows(*args, **kwargs)
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(first, "store_rows", store_then_fail)
+    with pytest.raises(sqlite3.OperationalError):
+        first.add_card("Doc", "Hip", card_frame([[9, "ORTHO", "DISCARDED TRAY", None, None, True]]))
+    monkeypatch.undo()
+
+    # the rolled back id goes to the other workstation's card
+    sheet_name = second.add_card("Doc", "Shoulder", card_frame([[2, None, None, "Gauze", "G-1", False]]))
+    shoulder_id = card_id(second, "Doc", sheet_name)
+    assert first.load_card_rows(shoulder_id).values.tolist() == [[2, None, None, "Gauze", "G-1", False]]
+
+
+def test_versions_rebuild_through_changes_and_snapshots(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    rows = [[n, "GENERAL", f"TRAY {n}", None, None, False] for n in range(1, 6)]
+    saved = []
+    for version in range(SNAPSHOT_INTERVAL + 3):
+        rows = [list(row) for row in rows]
+        rows[version % len(rows)][0] += 1
+        rows[-1][5] = version % 2 == 0
+        sheet_name = store.add_card("Doc", "Knee", card_frame(rows),
+                                    pd.Timestamp(2026, 1, 1, 0, 0, version).to_pydatetime())
+        saved.append((sheet_name, rows))
+    # a fresh store has nothing cached, so every version is rebuilt from the database
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    for sheet_name, rows in saved:
+        assert stored_rows(store, "Doc", sheet_name) == rows
+    depths = [row[0] for row in store.connect().execute("SELECT depth FROM cards ORDER BY id")]
+    assert 0 < max(depths) < SNAPSHOT_INTERVAL
+
+
+def test_ids_become_autoincrement(tmp_path):
+    # a database from before ids were AUTOINCREMENT
+    connection = sqlite3.connect(str(tmp_path / DATABASE_NAME))
+    connection.executescript("""
+        CREATE TABLE cards (id INTEGER PRIMARY KEY, doctor TEXT NOT NULL, surgery TEXT NOT NULL,
+                            created TEXT NOT NULL, sheet_name TEXT NOT NULL, version INTEGER NOT NULL,
+                            row_count INTEGER NOT NULL);
+        CREATE TABLE card_rows (card_id INTEGER NOT NULL, position INTEGER NOT NULL, quantity INTEGER,
+                                service TEXT, container_name TEXT, item_description TEXT, vendor_part TEXT,
+                                hold INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (card_id, position)) WITHOUT ROWID;
+        INSERT INTO cards VALUES (7, 'Doc', 'Knee', '2026-01-01_00-00-00', 'Knee_2026-01-01_00-00-00', 1, 1);
+        INSERT INTO card_rows VALUES (7, 0, 3, 'ORTHO', 'KNEE TRAY', NULL, NULL, 1);
+    """)
+    connection.close()
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    assert cards_autoincrement(store.connect())
+    assert stored_rows(store, "Doc", "Knee_2026-01-01_00-00-00") == [[3, "ORTHO", "KNEE TRAY", None, None, True]]
+    # the newest card is dropped; its id isn't handed out again
+    with store.transaction() as connection:
+        connection.execute("DELETE FROM card_rows WHERE card_id = 7")
+        connection.execute("DELETE FROM cards WHERE id = 7")
+    sheet_name = store.add_card("Doc", "Hip", card_frame([[1, "ORTHO", "HIP TRAY", None, None, False]]))
+    assert card_id(store, "Doc", sheet_name) == 8
+
+
+def edit_quantity(file_path, sheet_name, quantity):
+    import openpyxl
+    workbook = openpyxl.load_workbook(file_path)
+    workbook[sheet_name]["A2"] = quantity
+    workbook.save(file_path)
+
+
+def test_sheet_edited_in_excel_becomes_a_new_version(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    sheet_name = store.add_card("Doc", "Knee", card_frame([[1, "ORTHO", "KNEE TRAY", None, None, False]]))
+    file_path = store.export_workbook("Doc")
+    assert store.sync_directory() == 0
+
+    edit_quantity(file_path, sheet_name, 5)
+    assert store.sync_directory() == 1
+    surgery_sheets = store.get_sheet_names("Doc")
+    assert len(surgery_sheets) == 2 and surgery_sheets[0] == sheet_name
+    latest = store.latest_sheet_name("Doc", "Knee")
+    assert stored_rows(store, "Doc", latest) == [[5, "ORTHO", "KNEE TRAY", None, None, False]]
+    # the edit is kept when the workbook is written again
+    store.export_workbook("Doc")
+    assert store.sync_directory() == 0
+    edited = pd.read_excel(file_path, sheet_name=latest)
+    assert edited['Quantity'].tolist() == [5]
+
+
+def test_untouched_sheet_with_a_zero_padded_part_number_is_not_an_edit(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    sheet_name = store.add_card("Doc", "Knee", card_frame([[2, None, None, "GAUZE 4X4", "0012", False],
+                                                           [1, None, None, "SUTURE", 317, True]]))
+    file_path = store.export_workbook("Doc")
+    # saved again in Excel without changes, so the workbook is read back
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert store.sync_directory() == 0
+    assert store.get_sheet_names("Doc") == [sheet_name]
+    assert stored_rows(store, "Doc", sheet_name) == [[2, None, None, "GAUZE 4X4", "0012", False],
+                                                     [1, None, None, "SUTURE", "317", True]]
+
+
+def test_edit_is_stored_once(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    first = store.add_card("Doc", "Knee", card_frame([[1, "ORTHO", "KNEE TRAY", None, None, False]]))
+    store.add_card("Doc", "Hip", card_frame([[1, "ORTHO", "HIP TRAY", None, None, False]]))
+    file_path = store.export_workbook("Doc")
+    edit_quantity(file_path, first, 5)
+    assert store.sync_directory() == 1
+    # the workbook changes again before it was rewritten; the Knee edit is already stored
+    second = store.get_sheet_names("Doc")[1]
+    edit_quantity(file_path, second, 3)
+    assert store.sync_directory() == 1
+    assert len(store.get_sheet_names("Doc")) == 4
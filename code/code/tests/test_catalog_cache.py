@@ -0,0 +1,78 @@
+import datetime
+import os
+import pickle
+import zlib
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+from catalog_cache import CatalogCache, compact_frame
+
+
+def catalog_frame(description):
+    return compact_frame(pd.DataFrame({
+        "Service": ["ORTHO", "ORTHO", "GENERAL", "ORTHO"],
+        "ITEM DESCRIPTION": [description, "SUTURE", None, "DRAPE"],
+        "VENDOR PART#": [12, 345, 678, 910],
+        "PRICE": [1.5, np.nan, 3.0, 4.25],
+        "ACTIVE": [True, False, True, True],
+        "MIXED": ["X-12", 12, np.nan, "Y"],
+        "ADDED": pd.to_datetime(["2024-01-02 12:30", None, "2024-03-04", "2024-05-06 08:15:30.250"],
+                                format="ISO8601"),
+    }))
+
+
+class FrameReader:
+
+    def __init__(self, description):
+        self.description = description
+        self.reads = 0
+
+    def __call__(self, file_path):
+        self.reads += 1
+        return catalog_frame(self.description)
+
+
+def test_snapshot_gives_back_the_frame_and_changes(tmp_path):
+    workbook = tmp_path / "catalog.xlsx"
+    workbook.write_bytes(b"first export")
+    reader = FrameReader("GAUZE 4X4")
+    CatalogCache(str(tmp_path / "cache"), reader).read(str(workbook))
+    workbook.write_bytes(b"second export")
+    reader.description = "GAUZE 4X8"
+    first = CatalogCache(str(tmp_path / "cache"), reader)
+    frame = first.read(str(workbook))
+
+    second = CatalogCache(str(tmp_path / "cache"), reader)
+    loaded = second.read(str(workbook))
+    assert reader.reads == 2
+    assert second.stats()["disk_hits"] == 1
+    assert_frame_equal(loaded, frame)
+    assert isinstance(loaded["Service"].dtype, pd.CategoricalDtype)
+    assert second.get_changes(str(workbook)).summary() == first.get_changes(str(workbook)).summary()
+    assert second.get_changes(str(workbook)).report() == first.get_changes(str(workbook)).report()
+
+
+def test_pickled_snapshot_is_not_loaded(tmp_path):
+    workbook = tmp_path / "catalog.xlsx"
+    workbook.write_bytes(b"export")
+    reader = FrameReader("GAUZE 4X4")
+    cache = CatalogCache(str(tmp_path / "cache"), reader)
+    cache.read(str(workbook))
+    # a snapshot swapped for a pickle, which would run code when unpickled
+    with open(cache.snapshot_path(str(workbook)), "wb") as f:
+        f.write(zlib.compress(pickle.dumps((os.system, ("exit 1",)))))
+
+    assert_frame_equal(CatalogCache(str(tmp_path / "cache"), reader).read(str(workbook)), catalog_frame("GAUZE 4X4"))
+    assert reader.reads == 2
+
+
+def test_date_cells_survive_the_snapshot(tmp_path):
+    workbook = tmp_path / "catalog.xlsx"
+    workbook.write_bytes(b"export")
+    reader = FrameReader("GAUZE 4X4")
+    CatalogCache(str(tmp_path / "cache"), reader).read(str(workbook))
+    loaded = CatalogCache(str(tmp_path / "cache"), reader).read(str(workbook))
+    assert loaded["ADDED"][0] == datetime.datetime(2024, 1, 2, 12, 30)
+    assert pd.isna(loaded["ADDED"][1])
@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from doctor_lock import DoctorLock, DoctorLocks
+
+
+def enter_in_thread(lock):
+    # runs "with lock:" on another thread and returns what it raised, or None
+    raised = []
+
+    def enter():
+        try:
+            with lock:
+                pass
+        except TimeoutError as e:
+            raised.append(e)
+
+    thread = threading.Thread(target=enter)
+    thread.start()
+    thread.join(5)
+    return raised[0] if raised else None
+
+
+def test_the_same_lock_for_the_same_doctor(tmp_path):
+    locks = DoctorLocks(str(tmp_path))
+    assert locks.get("Doc") is locks.get("Doc")
+    assert locks.get("Doc") is not locks.get("Lee")
+    assert (tmp_path / ".locks").is_dir()
+
+
+def test_the_holding_thread_can_take_the_lock_again(tmp_path):
+    lock = DoctorLock(str(tmp_path / "Doc.lock"), "Doc", timeout=0.1)
+    with lock:
+        with lock:
+            assert lock.depth == 2
+        # the file stays locked until the outermost "with" ends
+        assert lock.file is not None
+        assert isinstance(enter_in_thread(lock), TimeoutError)
+    assert lock.depth == 0
+    assert lock.file is None
+    assert enter_in_thread(lock) is None
+
+
+def test_another_process_holding_the_file_lock_times_out(tmp_path):
+    # a second lock on the same file stands in for another workstation
+    path = str(tmp_path / "Doc.lock")
+    mine = DoctorLock(path, "Doc", timeout=0.1)
+    theirs = DoctorLock(path, "Doc", timeout=0.1)
+    with theirs:
+        with pytest.raises(TimeoutError, match="another user's save"):
+            with mine:
+                pass
+        # the failed attempt didn't keep the thread lock
+        assert mine.thread_lock.acquire(blocking=False)
+        mine.thread_lock.release()
+    with mine:
+        assert mine.depth == 1
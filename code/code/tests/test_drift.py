@@ -0,0 +1,88 @@
+import os
+
+import openpyxl
+import pandas as pd
+
+from card_columns import SHEET_COLUMNS
+from card_store import CardStore
+from drift import SCAN_DIRECTORY_NAME, collect_references, find_drift
+
+CONTAINERS = pd.DataFrame({'Service': ["ORTHO", "GENERAL"], 'Container Name': ["KNEE TRAY", "HIP TRAY"]})
+SOFT_GOODS = pd.DataFrame({'ITEM DESCRIPTION': ["GAUZE 4X4", "SUTURE VICRYL"], 'VENDOR PART#': ["B-D371110", 317]})
+
+
+def write_workbook(path, sheets):
+    workbook = openpyxl.Workbook()
+    workbook.remove(workbook.active)
+    for sheet_name, rows in sheets.items():
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append(SHEET_COLUMNS)
+        for row in rows:
+            sheet.append(row)
+    workbook.save(path)
+
+
+def blanks_as_none(frame):
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).values.tolist()
+
+
+def test_missing_containers_and_parts_are_reported():
+    references = pd.DataFrame(
+        [["Doc", "Knee", "ORTHO", "KNEE TRAY", None, None],
+         ["Doc", "Knee", "ORTHO", "HIP TRAY", None, None],
+         ["Doc", "Hip", "ORTHO", "SHOULDER TRAY", None, None],
+         # part numbers are compared without punctuation, and a number read as text still matches
+         ["Doc", "Hip", None, None, "gauze", "bd 371110"],
+         ["Doc", "Hip", None, None, "vicryl", "317"],
+         ["Doc", "Hip", None, None, "ethilon", "1667H"]],
+        columns=['Doctor', 'Sheet', 'Service', 'Container Name', 'Item Description', 'Vendor Part #'])
+    drift = find_drift(references, CONTAINERS, SOFT_GOODS)
+    assert blanks_as_none(drift[['Sheet', 'Kind', 'Container Name', 'Vendor Part #', 'Problem']]) == [
+        ["Hip", "container", "SHOULDER TRAY", None, "container not in catalog"],
+        ["Hip", "soft good", None, "1667H", "vendor part # not in catalog"],
+        ["Knee", "container", "HIP TRAY", None, "container now under GENERAL"]]
+
+
+def test_no_references_means_no_drift():
+    references = pd.DataFrame(columns=['Doctor', 'Sheet', 'Service', 'Container Name', 'Item Description',
+                                       'Vendor Part #'])
+    assert find_drift(references, CONTAINERS, SOFT_GOODS).empty
+
+
+def test_the_store_is_scanned_and_only_other_workbooks_are_read(tmp_path):
+    out = str(tmp_path)
+    store = CardStore(out, SHEET_COLUMNS)
+    store.add_card("Doc", "Knee", pd.DataFrame([[1, "ORTHO", "KNEE TRAY", None, None, False],
+                                                [2, None, None, "GAUZE 4X4", "0012", False]], columns=SHEET_COLUMNS))
+    store.export_workbook("Doc")
+    sheet_name = store.get_sheet_names("Doc")[0]
+    store.close()
+    # a workbook the store has never seen
+    write_workbook(tmp_path / "Other.xlsx", {"Hip": [[1, "GENERAL", "HIP TRAY", None, None, None],
+                                                     [3, None, None, "SUTURE VICRYL", 317, None]]})
+
+    references, doctors, changed = collect_references(out, workers=1)
+    assert (doctors, changed) == (2, 1)
+    assert blanks_as_none(references) == [
+        ["Doc", sheet_name, "ORTHO", "KNEE TRAY", None, None],
+        ["Doc", sheet_name, None, None, "GAUZE 4X4", "0012"],
+        ["Other", "Hip", "GENERAL", "HIP TRAY", None, None],
+        ["Other", "Hip", None, None, "SUTURE VICRYL", "317"]]
+    # only the workbook read from the file has a snapshot, and it isn't read again
+    assert os.path.exists(tmp_path / SCAN_DIRECTORY_NAME / "Other.xlsx.references.json")
+    assert not os.path.exists(tmp_path / SCAN_DIRECTORY_NAME / "Doc.xlsx.references.json")
+    assert collect_references(out, workers=1)[2] == 0
+
+
+def test_a_workbook_edited_outside_the_app_is_read_instead_of_the_store(tmp_path):
+    out = str(tmp_path)
+    store = CardStore(out, SHEET_COLUMNS)
+    store.add_card("Doc", "Knee", pd.DataFrame([[1, "ORTHO", "KNEE TRAY", None, None, False]], columns=SHEET_COLUMNS))
+    store.export_workbook("Doc")
+    store.close()
+    write_workbook(tmp_path / "Doc.xlsx", {"Knee": [[1, "ORTHO", "HIP TRAY", None, None, None]]})
+
+    references, doctors, changed = collect_references(out, workers=1)
+    assert (doctors, changed) == (1, 1)
+    assert blanks_as_none(references) == [["Doc", "Knee", "ORTHO", "HIP TRAY", None, None]]
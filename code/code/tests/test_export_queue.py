@@ -0,0 +1,67 @@
+import threading
+
+from export_queue import ExportQueue
+
+
+def blocked_queue():
+    # a queue whose first job holds the worker until release is set, so later jobs stay pending
+    queue = ExportQueue()
+    started = threading.Event()
+    release = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    queue.submit("first", "first.xlsx", block)
+    assert started.wait(5)
+    return queue, release
+
+
+def test_a_waiting_job_is_replaced_by_a_newer_one_with_the_same_key():
+    queue, release = blocked_queue()
+    written = []
+    queue.submit("a", "a.xlsx", written.append, "a1")
+    queue.submit("b", "b.xlsx", written.append, "b")
+    queue.submit("a", "a.xlsx", written.append, "a2")
+    assert queue.status() == ("first.xlsx", 2)
+    assert queue.is_busy()
+    release.set()
+    assert queue.wait(5)
+    # the replaced job keeps its place in the queue
+    assert written == ["a2", "b"]
+    assert queue.completed == 3
+    assert not queue.is_busy()
+    assert queue.status() == (None, 0)
+
+
+def test_a_job_submitted_while_its_key_is_running_runs_again():
+    queue, release = blocked_queue()
+    written = []
+    queue.submit("first", "first.xlsx", written.append, "again")
+    release.set()
+    assert queue.wait(5)
+    assert written == ["again"]
+
+
+def test_failures_are_collected_and_the_queue_keeps_going():
+    queue = ExportQueue()
+    written = []
+    error = OSError("disk full")
+
+    def fail():
+        raise error
+
+    queue.submit("a", "a.xlsx", fail)
+    queue.submit("b", "b.xlsx", written.append, "b")
+    assert queue.wait(5)
+    assert written == ["b"]
+    assert queue.take_failures() == [("a.xlsx", error)]
+    assert queue.take_failures() == []
+
+
+def test_wait_gives_up_after_the_timeout():
+    queue, release = blocked_queue()
+    assert not queue.wait(0.05)
+    release.set()
+    assert queue.wait(5)
@@ -0,0 +1,48 @@
+import os
+
+import openpyxl
+
+from file_discovery import discover_input_files
+
+CONTAINER_HEADER = ['Service', 'Container Name', 'Reference ID']
+SOFT_GOODS_HEADER = ['ITEM DESCRIPTION', 'VENDOR PART#']
+
+
+def write_export(directory, name, header, modified):
+    workbook = openpyxl.Workbook()
+    workbook.active.append(header)
+    file_path = os.path.join(directory, name)
+    workbook.save(file_path)
+    os.utime(file_path, ns=(modified, modified))
+    return os.path.abspath(file_path)
+
+
+def test_newest_export_of_each_kind_is_used(tmp_path):
+    directory = str(tmp_path / "in")
+    cache_directory = str(tmp_path / "cache")
+    os.makedirs(directory)
+    old_containers = [write_export(directory, f"containers {n}.xlsx", CONTAINER_HEADER, n * 10 ** 9)
+                      for n in range(1, 12)]
+    for n in range(1, 12):
+        write_export(directory, f"PAR {n}.xlsx", SOFT_GOODS_HEADER, (20 - n) * 10 ** 9)
+    write_export(directory, "notes.xlsx", ['Something', 'Else'], 10 ** 9)
+    expected = (old_containers[-1], os.path.join(directory, "PAR 1.xlsx"))
+    for _ in range(3):
+        assert discover_input_files(directory, cache_directory) == expected
+
+
+def test_new_export_replaces_a_remembered_one(tmp_path):
+    directory = str(tmp_path)
+    write_export(directory, "containers old.xlsx", CONTAINER_HEADER, 10 ** 9)
+    soft_goods = write_export(directory, "PAR.xlsx", SOFT_GOODS_HEADER, 10 ** 9)
+    cache_directory = str(tmp_path / ".cache")
+    discover_input_files(directory, cache_directory)
+    newer = write_export(directory, "containers new.xlsx", CONTAINER_HEADER, 2 * 10 ** 9)
+    assert discover_input_files(directory, cache_directory) == (newer, soft_goods)
+
+
+def test_same_time_is_decided_by_path(tmp_path):
+    directory = str(tmp_path)
+    write_export(directory, "a.xlsx", CONTAINER_HEADER, 10 ** 9)
+    last = write_export(directory, "b.xlsx", CONTAINER_HEADER, 10 ** 9)
+    assert discover_input_files(directory) == (last, None)
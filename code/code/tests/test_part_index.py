@@ -0,0 +1,65 @@
+import random
+
+from part_index import PartCursor, PartIndex, normalize_part_number
+
+ENTRIES = [("B-D371110", "syringe"), ("bd371", "needle"), ("BD37", "cap"), ("J317H", "vicryl"),
+           ("1667H", "ethilon"), ("BD371110", "syringe box"), (None, "blank"), (12, "gauze")]
+
+
+def test_part_numbers_are_compared_without_case_or_punctuation():
+    assert normalize_part_number(" b-d/371.110 ") == "BD371110"
+    assert normalize_part_number(None) == ""
+    index = PartIndex(ENTRIES)
+    assert index.lookup("bd-371110") == ["syringe", "syringe box"]
+    assert index.lookup("12") == ["gauze"]
+    # a blank part number isn't indexed
+    assert len(index) == 7
+
+
+def test_completions_list_the_shortest_part_numbers_first():
+    index = PartIndex(ENTRIES)
+    assert index.complete("bd") == ["cap", "needle", "syringe", "syringe box"]
+    assert index.complete("bd", limit=2) == ["cap", "needle"]
+    assert index.complete("x") == []
+
+
+def test_removing_the_last_key_prunes_the_branch():
+    index = PartIndex(ENTRIES)
+    index.remove("BD371110", "syringe")
+    assert index.lookup("BD371110") == ["syringe box"]
+    index.remove("BD371110", "syringe box")
+    assert index.lookup("BD371110") == []
+    assert index.complete("BD371") == ["needle"]
+    assert index.find_node("BD3711") is None
+    assert index.find_node("BD").count == 2
+    # removing what isn't there changes nothing
+    index.remove("BD371110", "syringe")
+    assert len(index) == 5
+
+
+def test_cursor_follows_typing_deleting_and_pasting():
+    index = PartIndex(ENTRIES)
+    cursor = PartCursor(index)
+    for text in ["b", "bd", "bd-", "bd-3", "bd-37", "bd-3", "bd", "j3", "J317H", "J317HX", "bd371"]:
+        cursor.update(text)
+        node = index.find_node(text)
+        assert cursor.matches() == (node.count if node is not None else 0), text
+        assert cursor.completions() == index.complete(text), text
+        assert cursor.exact() == index.lookup(text), text
+    cursor.reset()
+    assert cursor.matches() == len(index)
+
+
+def test_random_typing_agrees_with_fresh_lookups():
+    rng = random.Random(5)
+    parts = ["".join(rng.choice("AB12-") for _ in range(rng.randint(1, 6))) for _ in range(200)]
+    index = PartIndex((part, number) for number, part in enumerate(parts))
+    cursor = PartCursor(index)
+    text = ""
+    for _ in range(500):
+        if text and rng.random() < 0.3:
+            text = text[:rng.randint(0, len(text) - 1)]
+        else:
+            text += rng.choice("AB12-b")
+        cursor.update(text)
+        assert cursor.completions(5) == index.complete(text, 5), text
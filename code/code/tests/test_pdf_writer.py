@@ -0,0 +1,54 @@
+import re
+import zlib
+
+import pytest
+
+from pdf_writer import PdfDocument, pdf_string, text_width, wrap_text
+
+
+def page_contents(document):
+    return [zlib.decompress(stream) for stream in re.findall(rb"stream\n(.*?)\nendstream", document, re.S)]
+
+
+def test_text_is_measured_with_the_font_metrics():
+    assert text_width("A", 10) == pytest.approx(6.67)
+    assert text_width("A", 10, bold=True) == pytest.approx(7.22)
+    # characters outside printable ASCII are measured as a digit
+    assert text_width("é", 10) == text_width("0", 10)
+
+
+def test_wrapped_lines_fit_the_width():
+    text = "SUTURE VICRYL 3-0 SH CR 8X18 UNDYED WITH AN EXTRAORDINARILYLONGPRODUCTCODEWORD"
+    lines = wrap_text(text, 100, 10)
+    assert len(lines) > 2
+    assert all(text_width(line, 10) <= 100 for line in lines)
+    # nothing but spaces is lost
+    assert "".join(lines).replace(" ", "") == text.replace(" ", "")
+    assert wrap_text("first\nsecond", 100, 10) == ["first", "second"]
+    assert wrap_text("", 100, 10) == [""]
+
+
+def test_strings_are_escaped_and_encoded():
+    assert pdf_string("a (b) \\ c") == b"(a \\(b\\) \\\\ c)"
+    assert pdf_string("café ✓") == b"(caf\xe9 ?)"
+
+
+def test_document_structure():
+    document = PdfDocument(title="Doc - Knee")
+    document.new_page().text(36, 700, "First page")
+    page = document.new_page()
+    page.rectangle(36, 36, 100, 20, (1, 0.9, 0.55))
+    page.line(36, 36, 136, 36)
+    data = document.to_bytes()
+    assert data.startswith(b"%PDF-1.4\n")
+    assert data.endswith(b"%%EOF\n")
+    assert b"/Count 2" in data
+    assert b"/Title (Doc - Knee)" in data
+    # every cross-reference entry points at the start of its object
+    xref = int(data.rsplit(b"startxref\n", 1)[1].split(b"\n")[0])
+    offsets = re.findall(rb"(\d{10}) 00000 n", data[xref:])
+    for number, offset in enumerate(offsets, start=1):
+        assert data[int(offset):].startswith(b"%d 0 obj" % number)
+    first, second = page_contents(data)
+    assert first == b"BT /F1 10 Tf 36 700 Td (First page) Tj ET"
+    assert second == b"q 1 0.9 0.55 rg 36 36 100 20 re f Q\nq 0.5 w 0 0 0 RG 36 36 m 136 36 l S Q"
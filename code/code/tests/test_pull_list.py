@@ -0,0 +1,77 @@
+import io
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from card_columns import SHEET_COLUMNS
+from card_store import CardStore
+from pull_list import make_pull_list, read_schedule, run
+
+
+def save_card(store, doctor, surgery, rows, second=0):
+    store.add_card(doctor, surgery, pd.DataFrame(rows, columns=SHEET_COLUMNS), datetime(2026, 1, 1, 0, 0, second))
+
+
+def blanks_as_none(frame):
+    frame = frame.astype(object)
+    return frame.where(frame.notna(), None).values.tolist()
+
+
+def schedule(cases):
+    return pd.DataFrame(cases, columns=['Doctor', 'Surgery'])
+
+
+def test_schedule_is_filtered_by_date_and_blank_rows_are_dropped(tmp_path):
+    path = tmp_path / "schedule.csv"
+    path.write_text("Date,Doctor,Surgery,Room\n"
+                    "2026-01-05,Doc,Knee,3\n"
+                    "2026-01-06,Doc,Hip,3\n"
+                    "2026-01-05,,,4\n")
+    assert read_schedule(str(path)).values.tolist() == [["2026-01-05", "Doc", "Knee", "3"],
+                                                        ["2026-01-06", "Doc", "Hip", "3"]]
+    assert read_schedule(str(path), "2026-01-05")[['Doctor', 'Surgery']].values.tolist() == [["Doc", "Knee"]]
+    path.write_text("Doctor\nDoc\n")
+    with pytest.raises(ValueError, match="Surgery"):
+        read_schedule(str(path))
+
+
+def test_lines_are_added_up_over_the_cases(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    save_card(store, "Doc", "Knee", [[1, "ORTHO", "KNEE TRAY", None, None, False]])
+    # only the latest version of a card is used
+    save_card(store, "Doc", "Knee", [[1, "ORTHO", "KNEE TRAY", None, None, False],
+                                     [2, None, None, "GAUZE 4X4", "B-D371110", False],
+                                     [1, None, None, "GAUZE 4X4", "B-D371110", False],
+                                     [1, None, None, "LAP SPONGE", None, True]], second=1)
+    save_card(store, "Lee", "Hip", [[1, "ORTHO", "KNEE TRAY", None, None, True],
+                                    [4, None, None, "gauze", "bd 371110", False]])
+    # doctors and surgeries are matched without case or spacing
+    pull_list, cases = make_pull_list(store, schedule([["doc", " knee"], ["Doc", "Knee"], ["LEE", "Hip"],
+                                                       ["Doc", "Shoulder"]]))
+    assert blanks_as_none(pull_list) == [
+        ["container", "ORTHO", "KNEE TRAY", None, None, 2, 1, 3],
+        ["soft good", None, None, "GAUZE 4X4", "B-D371110", 10, 0, 3],
+        ["soft good", None, None, "LAP SPONGE", None, 0, 2, 2]]
+    assert cases['Card ID'].isna().tolist() == [False, False, False, True]
+
+
+def test_nothing_to_pull_without_saved_cards(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    pull_list, cases = make_pull_list(store, schedule([["Doc", "Knee"]]))
+    assert pull_list.empty
+    assert list(pull_list.columns) == ['Kind', 'Service', 'Container Name', 'Item Description', 'Vendor Part #',
+                                       'Pull', 'Hold', 'Cases']
+
+
+def test_run_writes_the_report_and_lists_unknown_cases(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    save_card(store, "Doc", "Knee", [[1, "ORTHO", "KNEE TRAY", None, None, False]])
+    store.close()
+    path = tmp_path / "schedule.csv"
+    path.write_text("Doctor,Surgery\nDoc,Knee\nDoc,Hip\n")
+    output = io.StringIO()
+    run(str(path), str(tmp_path), output=output)
+    report = pd.read_csv(tmp_path / "pull_list.csv")
+    assert report[['Container Name', 'Pull']].values.tolist() == [["KNEE TRAY", 1]]
+    assert "No saved card for Doc, Hip" in output.getvalue()
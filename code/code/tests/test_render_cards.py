@@ -0,0 +1,107 @@
+import os
+import re
+import zlib
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+from card_columns import SHEET_COLUMNS
+from card_manifest import CardManifest
+from card_store import CardStore
+from render_cards import (CONTAINER_HEADINGS, NO_SERVICE, SOFT_GOODS_HEADINGS, card_sections, document_name,
+                          render_cards, render_html, render_pdf, select_cards)
+
+ROWS = [(1, "ORTHO", "KNEE TRAY", None, None, 0),
+        (2, None, None, "GAUZE 4X4", "0012", 1),
+        (1, "GENERAL", "LAP TRAY", None, None, 1),
+        (1, None, "LOOSE TRAY", None, None, 0),
+        (3, "ORTHO", "HIP TRAY", None, None, 0)]
+
+
+def save_card(store, doctor, surgery, rows, second=0):
+    store.add_card(doctor, surgery, pd.DataFrame(rows, columns=SHEET_COLUMNS), datetime(2026, 1, 1, 0, 0, second))
+
+
+def saved_manifest(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    save_card(store, "Doc", "Knee", ROWS[:1])
+    save_card(store, "Doc", "Knee", ROWS, second=1)
+    save_card(store, "Lee", "Hip/Revision", ROWS[1:2])
+    manifest = CardManifest(store)
+    manifest.refresh()
+    store.close()
+    return manifest
+
+
+def test_containers_are_grouped_by_service_before_the_soft_goods():
+    sections = card_sections(ROWS)
+    assert [(section.heading, section.column_headings) for section in sections] == [
+        (NO_SERVICE, CONTAINER_HEADINGS), ("GENERAL", CONTAINER_HEADINGS), ("ORTHO", CONTAINER_HEADINGS),
+        ("Soft Goods", SOFT_GOODS_HEADINGS)]
+    assert sections[2].rows == [(["1", "KNEE TRAY", ""], False), (["3", "HIP TRAY", ""], False)]
+    assert sections[3].rows == [(["2", "GAUZE 4X4", "0012", "HOLD"], True)]
+    assert card_sections([]) == []
+
+
+def test_document_names(tmp_path):
+    manifest = saved_manifest(tmp_path)
+    knee, hip = (manifest.latest[key] for key in [("Doc", "Knee"), ("Lee", "Hip/Revision")])
+    assert document_name(knee, "pdf", True) == "Doc - Knee.pdf"
+    assert document_name(knee, "html", False) == "Doc - Knee v2.html"
+    assert document_name(hip, "pdf", True) == "Lee - Hip_Revision.pdf"
+
+
+def test_html_is_escaped_and_held_lines_are_marked(tmp_path):
+    entry = saved_manifest(tmp_path).latest[("Doc", "Knee")]
+    page = render_html(entry, card_sections(ROWS + [(1, None, None, "<DRAPE> & TOWEL", None, 0)])).decode("utf-8")
+    assert "<title>Doc - Knee</title>" in page
+    assert "&lt;DRAPE&gt; &amp; TOWEL" in page
+    assert page.count('<tr class="hold">') == 2
+
+
+def test_long_cards_are_paginated(tmp_path):
+    entry = saved_manifest(tmp_path).latest[("Doc", "Knee")]
+    rows = [(1, "ORTHO", f"TRAY {number}", None, None, number % 7 == 0) for number in range(120)]
+    document = render_pdf(entry, card_sections(rows))
+    pages = [zlib.decompress(stream) for stream in re.findall(rb"stream\n(.*?)\nendstream", document, re.S)]
+    assert len(pages) > 1
+    assert b"/Count %d" % len(pages) in document
+    # every page after the first starts the section again, and every page is numbered
+    assert [b"(ORTHO \\(continued\\))" in page for page in pages] == [False] + [True] * (len(pages) - 1)
+    assert all(b"(Page %d of %d)" % (number, len(pages)) in page for number, page in enumerate(pages, start=1))
+    assert all(b"(TRAY %d)" % number in b"".join(pages) for number in range(120))
+
+
+def test_cards_are_selected_by_doctor_and_id(tmp_path):
+    manifest = saved_manifest(tmp_path)
+    latest = [(entry.doctor, entry.surgery, entry.version) for entry in select_cards(manifest)[0]]
+    assert latest == [("Doc", "Knee", 2), ("Lee", "Hip/Revision", 1)]
+    entries, _ = select_cards(manifest, doctors=[" doc "], card_ids=[1])
+    assert [(entry.doctor, entry.version) for entry in entries] == [("Doc", 1), ("Doc", 2)]
+    schedule = pd.DataFrame([["LEE", "hip/revision"], ["Doc", "Shoulder"]], columns=['Doctor', 'Surgery'])
+    entries, unresolved = select_cards(manifest, schedule=schedule)
+    assert [entry.doctor for entry in entries] == ["Lee"]
+    assert unresolved == [("Doc", "Shoulder")]
+    with pytest.raises(ValueError, match="No saved cards for nobody"):
+        select_cards(manifest, doctors=["Nobody"])
+    with pytest.raises(ValueError, match="No saved card with id 99"):
+        select_cards(manifest, card_ids=[99])
+
+
+def test_only_new_versions_are_rendered_again(tmp_path):
+    manifest = saved_manifest(tmp_path)
+    target = str(tmp_path / "printouts")
+    entries, _ = select_cards(manifest)
+    assert render_cards(str(tmp_path), manifest, entries, target, workers=1) == (2, 0)
+    assert sorted(os.listdir(target)) == [".rendered.json", "Doc - Knee.pdf", "Lee - Hip_Revision.pdf"]
+    assert render_cards(str(tmp_path), manifest, entries, target, workers=1) == (0, 2)
+    assert render_cards(str(tmp_path), manifest, entries, target, workers=1, force=True) == (2, 0)
+
+    save_card(manifest.store, "Doc", "Knee", ROWS[:2], second=2)
+    manifest.refresh()
+    manifest.store.close()
+    entries, _ = select_cards(manifest)
+    # the latest version replaces the printout of the one before it
+    assert render_cards(str(tmp_path), manifest, entries, target, workers=1) == (1, 1)
+    assert len(os.listdir(target)) == 3
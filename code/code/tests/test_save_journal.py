@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+
+from card_columns import SHEET_COLUMNS
+from card_store import CardStore
+from save_journal import SaveJournal
+
+ROWS = [(1, "ORTHO", "KNEE TRAY", None, None, 0), (2, None, None, "GAUZE 4X4", "0012", 1)]
+
+
+def test_entries_are_read_back_oldest_first(tmp_path):
+    journal = SaveJournal(str(tmp_path))
+    assert journal.entries() == []
+    first = journal.record("Doc", [("Knee_2026-01-01_00-00-00", ROWS)])
+    journal.record("Lee", [("Hip_2026-01-01_00-00-00", ROWS[:1])])
+    entries = journal.entries()
+    assert [(entry.doctor, entry.cards) for entry in entries] == [
+        ("Doc", [("Knee_2026-01-01_00-00-00", ROWS)]), ("Lee", [("Hip_2026-01-01_00-00-00", ROWS[:1])])]
+    assert [entry.path for entry in journal.entries("Doc")] == [first.path]
+    assert journal.pending_doctors() == ["Doc", "Lee"]
+    journal.discard(first)
+    # another instance may have discarded it already
+    journal.discard(first)
+    assert journal.pending_doctors() == ["Lee"]
+
+
+def test_a_damaged_entry_is_set_aside(tmp_path):
+    journal = SaveJournal(str(tmp_path))
+    entry = journal.record("Doc", [("Knee", ROWS)])
+    with open(entry.path, "w", encoding="utf-8") as f:
+        f.write('{"doctor": "Doc", "cards": [')
+    assert journal.entries() == []
+    assert os.path.exists(entry.path + ".damaged")
+
+
+def test_writing_the_workbook_finishes_a_save_that_was_cut_short(tmp_path):
+    store = CardStore(str(tmp_path), SHEET_COLUMNS)
+    saved = store.add_card("Doc", "Knee", pd.DataFrame([list(ROWS[0])], columns=SHEET_COLUMNS))
+    # a save that crashed before the store committed it, and one that crashed before the workbook was written
+    lost = "Hip_2026-01-01_00-00-00"
+    store.journal.record("Doc", [(lost, ROWS)])
+    store.journal.record("Doc", [(saved, [ROWS[0]])])
+    assert store.pending_doctors() == ["Doc"]
+
+    store.export_workbook("Doc")
+    assert store.get_sheet_names("Doc") == [saved, lost]
+    connection = store.connect()
+    card_id = connection.execute("SELECT id FROM cards WHERE sheet_name = ?", (lost,)).fetchone()[0]
+    assert store.rebuild_rows(connection, card_id) == ROWS
+    assert store.pending_doctors() == []
@@ -0,0 +1,84 @@
+import random
+
+from search_index import SearchIndex
+
+ROWS = [("GAUZE SPONGE 4X4", "B-D371110"), ("SUTURE VICRYL 3-0", "J317H"), ("DRAPE LAP", None),
+        ("GAUZE KERLIX ROLL", "6715"), ("SPONGE LAP 18X18", "69250"), ("SUTURE ETHILON 4-0", "1667H")]
+
+
+def brute_force(rows, query):
+    terms = query.lower().split()
+    if not terms:
+        return None
+    texts = {row: SearchIndex.document_text(fields) for row, fields in rows.items()}
+    return sorted(row for row, text in texts.items() if all(term in text for term in terms))
+
+
+def test_search_matches_substrings_of_every_term():
+    index = SearchIndex(ROWS)
+    assert index.search("") is None
+    assert index.search("gauze") == [0, 3]
+    assert index.search("lap sp") == [4]
+    assert index.search("b-d") == [0]
+    assert index.search("4x") == [0]
+    # fields are kept apart, so a match can't run from one field into the next
+    assert index.search("4x4b") == []
+
+
+def test_typing_more_narrows_the_previous_result():
+    index = SearchIndex(ROWS)
+    assert index.search("su") == [1, 5]
+    assert index.search("sut") == [1, 5]
+    assert index.search("sut 4") == [5]
+    # backspacing to a shorter query searches afresh
+    assert index.search("s") == [0, 1, 4, 5]
+
+
+def test_rows_removed_or_replaced_are_searched_as_they_are_now():
+    index = SearchIndex(ROWS)
+    assert index.search("gauze") == [0, 3]
+    index.remove(0)
+    assert index.search("gauze") == [3]
+    assert index.search("b-d371110") == []
+    index.replace(2, ("GAUZE PACKING STRIP", "7632"))
+    assert index.search("gauze") == [2, 3]
+    assert index.search("drape") == []
+
+
+def test_renumbered_rows_keep_their_text():
+    index = SearchIndex(ROWS)
+    index.remove(1)
+    # rows move up one place to make room for a new first row; row 1 was removed
+    new_rows = [1, None, 3, 4, 5, 6]
+    index.renumber(new_rows, 7)
+    index.replace(0, ("ABDOMINAL PAD", "7198D"))
+    index.replace(2, ("SUTURE MONOCRYL", "Y496G"))
+    assert index.search("suture") == [2, 6]
+    assert index.search("pad") == [0]
+    assert index.search("lap") == [3, 5]
+
+
+def test_random_edits_and_queries_agree_with_a_scan():
+    rng = random.Random(4)
+    words = ["gauze", "sponge", "suture", "lap", "drape", "4x4", "3-0", "vicryl", "b-d", "roll"]
+    rows = {}
+    index = SearchIndex()
+    for _ in range(300):
+        action = rng.random()
+        if action < 0.5 or not rows:
+            fields = (" ".join(rng.sample(words, 3)), f"P{rng.randint(1, 999)}")
+            rows[index.add(fields)] = fields
+        elif action < 0.7:
+            row = rng.choice(list(rows))
+            index.remove(row)
+            del rows[row]
+        else:
+            row = rng.choice(list(rows))
+            rows[row] = (" ".join(rng.sample(words, 2)), None)
+            index.replace(row, rows[row])
+        query = ""
+        for word in rng.sample(words, 2):
+            # type the query a character at a time, as the search box does
+            for character in " " + word:
+                query += character
+                assert index.search(query) == brute_force(rows, query), query
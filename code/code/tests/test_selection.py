@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+from selection import SelectionStore
+
+KEY_COLUMNS = ['Item Description', 'Vendor Part #']
+
+
+def test_repeated_card_lines_are_combined():
+    card = pd.DataFrame({'Quantity': [1, 2, np.nan, 4], 'Item Description': ["GAUZE", "GAUZE", "DRAPE", "SUTURE"],
+                         'Vendor Part #': [12, 12, 34, 56], 'Hold': [False, True, True, np.nan]})
+    store = SelectionStore.from_dataframe(card, KEY_COLUMNS)
+    assert store.get_quantity(("GAUZE", 12)) == 3 and store.get_hold(("GAUZE", 12))
+    # a hold without a quantity is kept, but isn't a selected item
+    assert store.get_hold(("DRAPE", 34)) and ("DRAPE", 34) not in store
+    assert len(store) == 2
+
+
+def test_selected_rows_follow_the_displayed_order():
+    store = SelectionStore()
+    store.set_quantity(("SUTURE", 56), "4")
+    store.set_quantity(("GAUZE", "0012"), 1)
+    store.set_quantity(("DRAPE", 34), "")
+    assert [key for key, _, _ in store.selected_rows()] == [("GAUZE", "0012"), ("SUTURE", 56)]
+    positions = {("SUTURE", 56): 0, ("GAUZE", "0012"): 1}
+    assert store.selected_rows(positions) == [(("SUTURE", 56), 4, False), (("GAUZE", "0012"), 1, False)]
+    assert store.selected_rows({("SUTURE", 56): 0}) == [(("SUTURE", 56), 4, False)]
+
+
+def test_copy_is_independent_of_the_original():
+    store = SelectionStore()
+    store.set_quantity(("GAUZE", 12), 2)
+    store.set_quantity(("SUTURE", 56), 1)
+    copy = store.copy({("GAUZE", 12)})
+    copy.add_quantity(("GAUZE", 12))
+    assert copy.get_quantity(("GAUZE", 12)) == 3 and store.get_quantity(("GAUZE", 12)) == 2
+    assert ("SUTURE", 56) not in copy
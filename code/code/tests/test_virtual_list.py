@@ -0,0 +1,31 @@
+from virtual_list import ELLIPSIS, fit_text
+
+
+def measure(text):
+    # a fixed-width font, ten pixels a character
+    return 10 * len(text)
+
+
+def test_text_that_fits_is_unchanged():
+    assert fit_text("GAUZE 4X4", measure, width=100, lines=2) == "GAUZE 4X4"
+    assert fit_text("SPONGE LAP 18X18 STERILE", measure, width=130, lines=2) == "SPONGE LAP 18X18 STERILE"
+
+
+def test_long_text_is_cut_short_with_an_ellipsis():
+    fitted = fit_text("SUTURE VICRYL 3-0 SH CR 8X18 UNDYED BRAIDED", measure, width=100, lines=2)
+    lines = fitted.split("\n")
+    assert len(lines) == 2
+    assert lines[0] == "SUTURE"
+    assert lines[1].endswith(ELLIPSIS) and lines[1].startswith("VICRYL")
+    assert all(measure(line) <= 100 for line in lines)
+
+
+def test_word_wider_than_a_line_is_split():
+    fitted = fit_text("ABCDEFGHIJKLMNOPQRSTUVWXYZ", measure, width=100, lines=2)
+    assert fitted == "ABCDEFGHIJ\nKLMNOPQRS" + ELLIPSIS
+
+
+def test_rows_show_one_line():
+    fitted = fit_text("SUTURE VICRYL 3-0 SH CR 8X18 UNDYED BRAIDED", measure, width=200)
+    assert fitted == "SUTURE VICRYL 3-0 S" + ELLIPSIS
+    assert measure(fitted) <= 200
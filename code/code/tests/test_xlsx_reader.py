@@ -0,0 +1,52 @@
+import datetime
+
+import openpyxl
+import pandas as pd
+from pandas.testing import assert_frame_equal
+
+import xlsx_reader
+
+
+def write_workbook(path, rows, sheet_name="Sheet"):
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = sheet_name
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return str(path)
+
+
+def test_text_that_looks_like_numbers_reads_as_pandas_reads_it(tmp_path):
+    # part numbers typed as text, as they are in the catalog exports
+    path = write_workbook(tmp_path / "catalog.xlsx", [
+        ["VENDOR PART#", "ITEM NUMBER", "ITEM DESCRIPTION", "LOT", "STERILE", "ADDED"],
+        ["0012", "12", "GAUZE 4X4", "A-1", "True", datetime.datetime(2024, 1, 2)],
+        ["12", None, "0012", 7, "FALSE", datetime.datetime(2024, 3, 4, 12, 30)],
+        [" 345 ", "1e3", "SUTURE", "NA", "true", None],
+    ])
+    assert_frame_equal(xlsx_reader.read_sheet(path), pd.read_excel(path))
+
+
+def test_mixed_cells_read_as_pandas_reads_them(tmp_path):
+    path = write_workbook(tmp_path / "mixed.xlsx", [
+        ["Quantity", "Vendor Part #", "Hold", "Notes", "Code"],
+        [1, "0012", True, "True", "1,000"],
+        ["2", 12, None, None, "inf"],
+        [3.5, "X-12", False, "False", "2"],
+    ])
+    assert_frame_equal(xlsx_reader.read_sheet(path), pd.read_excel(path))
+
+
+def test_text_columns_are_read_as_typed(tmp_path):
+    path = write_workbook(tmp_path / "Doc.xlsx", [
+        ["Quantity", "Service", "Container Name", "Item Description", "Vendor Part #", "Hold"],
+        [1, "ORTHO", "KNEE TRAY", "GAUZE 4X4", "0012", False],
+    ], sheet_name="Knee")
+    frame = xlsx_reader.read_sheet(path, "Knee", columns=["Item Description", "Vendor Part #"])
+    assert frame["Vendor Part #"].tolist() == [12]
+    assert_frame_equal(frame, pd.read_excel(path, "Knee")[["Item Description", "Vendor Part #"]])
+    # the card store reads its text columns as they were written
+    with xlsx_reader.XlsxWorkbook(path) as workbook:
+        frame = workbook.read_sheet("Knee", ["Vendor Part #", "Hold"], ["Vendor Part #"])
+    assert frame["Vendor Part #"].tolist() == ["0012"]
@@ -0,0 +1,407 @@
+# Virtual List
+# A scrolling list of quantity/hold rows that only ever builds enough row widgets to fill the window.
+# The rows live in a RowSet and anything typed into them in a SelectionStore, both reached through a RowModel;
+# widgets are recycled as the list scrolls.
+
+import bisect
+import functools
+import tkinter as tk
+import tkinter.font as tkfont
+from array import array
+
+from selection import SelectionStore
+
+# every row label is one line this many characters wide; the tip showing a whole row text wraps at this many pixels
+ROW_CHARACTERS = 50
+TIP_WRAP_LENGTH = 800
+ELLIPSIS = "\u2026"
+# texts fitted to a row are remembered for this many distinct texts
+FITTED_TEXT_CACHE = 2048
+
+
+class RowSet:
+
+    # The rows of a list: keys and label texts in display order.  A row set built from a catalog
+    # can be shared by every window that lists that catalog.
+
+    def __init__(self, rows=(), describe=None):
+        # rows are (key, label text) pairs in display order.  With describe, a row's label text is made
+        # from its key when the row is drawn rather than a copy being kept for every row.
+        self.describe = describe
+        self.keys = []
+        self.texts = [] if describe is None else None
+        self.positions = {}
+        # built by the search box the first time the rows are searched
+        self.search_index = None
+        for key, text in rows:
+            self.add(key, text)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def add(self, key, text=None):
+        if key in self.positions:
+            return
+        self.positions[key] = len(self.keys)
+        self.keys.append(key)
+        if self.texts is not None:
+            self.texts.append(text)
+
+    def get_text(self, index):
+        if self.texts is None:
+            return self.describe(self.keys[index])
+        return self.texts[index]
+
+    def copy(self):
+        # without the search index, which is built again if the copy is searched
+        rows = RowSet(describe=self.describe)
+        rows.keys = list(self.keys)
+        rows.texts = list(self.texts) if self.texts is not None else None
+        rows.positions = dict(self.positions)
+        return rows
+
+    # A copy without the removed keys and with the added (key, text) pairs merged in at their place in
+    # sort_key order (the order the rows were built in).  Also returns the new position of every row of
+    # this set, None for removed rows.  Only the changed rows are looked at one by one.
+    def patched(self, removed, added, sort_key):
+        added = {key: text for key, text in added if key not in self.positions or key in removed}
+        added = sorted(added.items(), key=lambda pair: sort_key(pair[0]))
+        # (position in this set, 0, pair) to insert before that row, (position, 1, None) to drop that row
+        changes = [(bisect.bisect_right(self.keys, sort_key(key), key=sort_key), 0, (key, text))
+                   for key, text in added]
+        changes.extend((self.positions[key], 1, None) for key in removed)
+        changes.sort(key=lambda change: change[:2])
+        keys = []
+        texts = [] if self.texts is not None else None
+        new_positions = [None] * len(self.keys)
+        start = 0
+        for position, kind, pair in changes + [(len(self.keys), 0, None)]:
+            new_positions[start:position] = range(len(keys), len(keys) + position - start)
+            keys.extend(self.keys[start:position])
+            if texts is not None:
+                texts.extend(self.texts[start:position])
+            if kind:
+                start = position + 1
+                continue
+            start = position
+            if pair is not None:
+                keys.append(pair[0])
+                if texts is not None:
+                    texts.append(pair[1])
+        rows = RowSet(describe=self.describe)
+        rows.keys = keys
+        rows.texts = texts
+        rows.positions = dict(zip(keys, range(len(keys))))
+        return rows, new_positions
+
+
+class RowModel:
+
+    def __init__(self, rows=None, selection=None):
+        self.rows = rows if rows is not None else RowSet()
+        self.selection = selection if selection is not None else SelectionStore()
+        self.visible = range(len(self.rows))
+
+    @property
+    def keys(self):
+        return self.rows.keys
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.show_all()
+
+    def add_row(self, key, text=None):
+        self.rows.add(key, text)
+
+    def __len__(self):
+        return len(self.visible)
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def get_rows(self):
+        return self.rows
+
+    def get_selection(self):
+        return self.selection
+
+    def row_count(self):
+        return len(self.rows)
+
+    def visible_index(self, position):
+        return self.visible[position]
+
+    def set_visible(self, indexes):
+        # 8 bytes a row rather than a list of int objects, for searches that match most of a large catalog
+        self.visible = array("q", indexes)
+
+    def show_all(self):
+        # a range keeps "everything visible" free whatever the size of the list
+        self.visible = range(len(self.rows))
+
+    def get_key(self, index):
+        return self.rows.keys[index]
+
+    def get_text(self, index):
+        return self.rows.get_text(index)
+
+    def get_quantity(self, key):
+        quantity = self.selection.get_quantity(key)
+        return "" if quantity is None else str(quantity)
+
+    def set_quantity(self, key, quantity):
+        self.selection.set_quantity(key, quantity)
+
+    def get_hold(self, key):
+        return self.selection.get_hold(key)
+
+    def set_hold(self, key, hold):
+        self.selection.set_hold(key, hold)
+
+    # (key, quantity, hold) for every listed row that has a quantity, in display order
+    def selected_rows(self):
+        return self.selection.selected_rows(self.rows.positions)
+
+    # a copy of the selection limited to the rows in this list
+    def listed_selection(self):
+        return self.selection.copy(self.rows.positions)
+
+
+def prefix_length(text, measure, width, suffix=""):
+    # the most characters of text that fit in width with suffix after them (at least one, so wrapping moves on)
+    low, high = 1, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if measure(text[:middle] + suffix) <= width:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+# The text as a label wrapping at width can show it in lines lines: unchanged if it fits, otherwise broken into
+# lines the way Tk wraps it (a word wider than a line is split) with the last line cut short by an ellipsis.
+def fit_text(text, measure, width, lines=1):
+    if measure(text) <= width:
+        return text
+    words = text.split()
+    shown = []
+    while words and len(shown) < lines:
+        line = ""
+        while words:
+            candidate = f"{line} {words[0]}" if line else words[0]
+            if measure(candidate) <= width:
+                line = candidate
+                words.pop(0)
+            else:
+                if not line:
+                    cut = prefix_length(words[0], measure, width)
+                    line, words[0] = words[0][:cut], words[0][cut:]
+                break
+        shown.append(line)
+    if not words:
+        return text
+    last = f"{shown[-1]} {words[0]}"
+    shown[-1] = last[:prefix_length(last, measure, width, ELLIPSIS)].rstrip() + ELLIPSIS
+    return "\n".join(shown)
+
+
+class VirtualRow:
+
+    def __init__(self, virtual_list, index):
+        self.virtual_list = virtual_list
+        self.key = None
+        self.text = None
+        self.updating = False
+        self.frame = tk.Frame(virtual_list.rows_frame)
+        # one line labels keep every row the same height, which the scroll arithmetic relies on; text that
+        # doesn't fit ends in an ellipsis and is shown whole while the pointer is over it
+        self.label = tk.Label(self.frame, width=ROW_CHARACTERS, height=1, anchor="w")
+        self.quantity = tk.StringVar()
+        self.entry = tk.Entry(self.frame, width=5, textvariable=self.quantity, validate="key",
+                              validatecommand=virtual_list.validatecommand)
+        self.hold = tk.BooleanVar()
+        self.checkbox = tk.Checkbutton(self.frame, width=1, height=1, variable=self.hold, onvalue=True, offvalue=False)
+        self.label.grid(row=0, column=0)
+        self.entry.grid(row=0, column=1)
+        self.checkbox.grid(row=0, column=2)
+        self.frame.grid(row=index, column=0, sticky="w")
+        self.quantity.trace_add("write", self.on_quantity)
+        self.hold.trace_add("write", self.on_hold)
+        self.label.bind("<Enter>", self.on_enter)
+        self.label.bind("<Leave>", lambda event: virtual_list.hide_tip())
+        for widget in (self.frame, self.label, self.entry, self.checkbox):
+            virtual_list.bind_scrolling(widget)
+
+    def show(self, key, text, quantity, hold):
+        self.updating = True
+        try:
+            self.key = key
+            self.text = text
+            self.label.config(text=self.virtual_list.fit_text(text))
+            self.quantity.set(quantity)
+            self.hold.set(hold)
+        finally:
+            self.updating = False
+        self.frame.grid()
+
+    def hide(self):
+        self.key = None
+        self.text = None
+        self.frame.grid_remove()
+
+    def on_enter(self, event):
+        if self.text is not None and self.label.cget("text") != self.text:
+            self.virtual_list.show_tip(self.text, event.x_root, event.y_root)
+
+    def on_quantity(self, *args):
+        if not self.updating and self.key is not None:
+            self.virtual_list.model.set_quantity(self.key, self.quantity.get())
+
+    def on_hold(self, *args):
+        if not self.updating and self.key is not None:
+            self.virtual_list.model.set_hold(self.key, self.hold.get())
+
+
+class VirtualList(tk.Frame):
+
+    def __init__(self, master, model, validatecommand=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.model = model
+        self.validatecommand = validatecommand
+        self.first = 0
+        self.pool = []
+        self.row_height = None
+        self.font = None
+        self.text_width = None
+        self.tip = None
+        # row texts are fitted once each while they keep being scrolled past
+        self.fit_text = functools.lru_cache(maxsize=FITTED_TEXT_CACHE)(self.fit_row_text)
+
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.rows_frame = tk.Frame(self)
+        self.rows_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.rows_frame.grid_propagate(False)
+        self.rows_frame.bind("<Configure>", self.on_resize)
+        self.bind_scrolling(self.rows_frame)
+
+        self.grow_pool(1)
+        self.refresh()
+
+    def get_model(self):
+        return self.model
+
+    def set_model(self, model):
+        # the same row widgets show another list (a window that is kept for the session being reused)
+        self.model = model
+        self.reload()
+
+    def bind_scrolling(self, widget):
+        widget.bind("<MouseWheel>", self.on_mouse_wheel)
+        widget.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        widget.bind("<Button-5>", lambda event: self.scroll_by(3))
+
+    def measure_row_height(self):
+        if self.row_height is None:
+            self.pool[0].frame.update_idletasks()
+            self.row_height = max(1, self.pool[0].frame.winfo_reqheight())
+        return self.row_height
+
+    def fit_row_text(self, text):
+        if not isinstance(text, str):
+            return text
+        if self.font is None:
+            self.font = tkfont.nametofont(self.pool[0].label.cget("font"))
+            # Tk sizes a label that is so many characters wide by the font's "0"
+            self.text_width = self.font.measure("0" * ROW_CHARACTERS)
+        return fit_text(text, self.font.measure, self.text_width)
+
+    # the whole text of a row cut short, in a small borderless window by the pointer
+    def show_tip(self, text, x, y):
+        if self.tip is None:
+            self.tip = tk.Toplevel(self)
+            self.tip.overrideredirect(True)
+            self.tip.label = tk.Label(self.tip, justify="left", wraplength=TIP_WRAP_LENGTH, relief="solid",
+                                      borderwidth=1, background="lightyellow")
+            self.tip.label.pack()
+        self.tip.label.config(text=text)
+        self.tip.geometry(f"+{x + 12}+{y + 12}")
+        self.tip.deiconify()
+        self.tip.lift()
+
+    def hide_tip(self):
+        if self.tip is not None:
+            self.tip.withdraw()
+
+    def grow_pool(self, size):
+        while len(self.pool) < size:
+            self.pool.append(VirtualRow(self, len(self.pool)))
+
+    def page_size(self):
+        height = self.rows_frame.winfo_height()
+        if height <= 1:
+            return len(self.pool)
+        return max(1, height // self.measure_row_height())
+
+    def on_resize(self, event):
+        # one spare row so a partly visible row at the bottom is still drawn
+        self.grow_pool(max(1, event.height // self.measure_row_height() + 1))
+        self.refresh()
+
+    def on_mouse_wheel(self, event):
+        # Windows reports multiples of 120, macOS reports small deltas
+        step = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+        self.scroll_by(step * 3)
+
+    def yview(self, *args):
+        if not args:
+            return
+        if args[0] == tk.MOVETO:
+            self.scroll_to(int(float(args[1]) * len(self.model)))
+        elif args[0] == tk.SCROLL:
+            amount = int(args[1])
+            if args[2] == tk.PAGES:
+                amount = amount * self.page_size()
+            self.scroll_by(amount)
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.first + rows)
+
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.model) - self.page_size()))
+        if first != self.first:
+            self.first = first
+            self.refresh()
+
+    def reload(self):
+        # call after the model's visible rows change
+        self.first = 0
+        self.refresh()
+
+    def see(self, position):
+        if position < self.first:
+            self.scroll_to(position)
+        elif position >= self.first + self.page_size():
+            self.scroll_to(position - self.page_size() + 1)
+
+    def refresh(self):
+        # the rows under the pointer are about to show other texts
+        self.hide_tip()
+        total = len(self.model)
+        self.first = max(0, min(self.first, total - self.page_size()))
+        for offset, row in enumerate(self.pool):
+            position = self.first + offset
+            if position < total:
+                index = self.model.visible_index(position)
+                key = self.model.get_key(index)
+                row.show(key, self.model.get_text(index), self.model.get_quantity(key), self.model.get_hold(key))
+            else:
+                row.hide()
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + self.page_size()) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
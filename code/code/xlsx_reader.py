@@ -0,0 +1,358 @@
+# XLSX Reader
+# Reads .xlsx workbooks straight out of the zip: the sheet XML is streamed row by row with an incremental
+# parser, only the requested columns are kept, and reading one sheet of a doctor's workbook never parses the
+# other sheets.  Values come back as pd.read_excel returns them (the first row is the header, blank or "NA"
+# style cells are NaN, whole numbers are ints, date cells are datetimes, and a column of text that all looks
+# like numbers is numbers, so a part number typed as text "0012" is 12), so either can read a given file.
+#
+# read_excel is the entry point the app uses; it hands workbooks that aren't .xlsx (old .xls files) to pandas.
+
+import datetime
+import posixpath
+import xml.etree.ElementTree as ElementTree
+import zipfile
+
+MAIN_NAMESPACE = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NAMESPACE = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_RELATIONSHIP_NAMESPACE = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+ROW_TAG = MAIN_NAMESPACE + "row"
+VALUE_TAG = MAIN_NAMESPACE + "v"
+TEXT_TAG = MAIN_NAMESPACE + "t"
+INLINE_STRING_TAG = MAIN_NAMESPACE + "is"
+SHARED_STRING_TAG = MAIN_NAMESPACE + "si"
+RUN_TAG = MAIN_NAMESPACE + "r"
+
+# the strings pd.read_excel reads as NaN by default
+NA_STRINGS = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                        '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'])
+# the text pd.read_excel reads as True or False
+BOOLEAN_STRINGS = {"True": True, "TRUE": True, "true": True, "False": False, "FALSE": False, "false": False}
+# built-in number formats that show a date or time
+DATE_FORMAT_IDS = frozenset(list(range(14, 23)) + list(range(45, 48)))
+EPOCH_1900 = datetime.datetime(1899, 12, 30)
+EPOCH_1904 = datetime.datetime(1904, 1, 1)
+
+
+class XlsxError(ValueError):
+    pass
+
+
+def column_index(reference, columns={}):
+    # "AB12" -> 27; the letters of a reference repeat on every row, so they're only worked out once
+    letters = reference.rstrip("0123456789")
+    index = columns.get(letters)
+    if index is None:
+        index = 0
+        for letter in letters:
+            index = index * 26 + ord(letter) - 64
+        index = columns[letters] = index - 1
+    return index
+
+
+def is_date_format(format_code):
+    # a date or time format has d, m, y, h or s outside quoted text, [colour] tags and \-escaped characters
+    in_quotes = False
+    in_brackets = False
+    escaped = False
+    for character in format_code:
+        if escaped:
+            escaped = False
+        elif character == "\\":
+            escaped = True
+        elif character == '"':
+            in_quotes = not in_quotes
+        elif in_quotes:
+            continue
+        elif character == "[":
+            in_brackets = True
+        elif character == "]":
+            in_brackets = False
+        elif not in_brackets and character in "dmyhsDMYHS":
+            return True
+    return False
+
+
+def string_text(element):
+    # a plain <t>, or rich text runs <r><t>..</t></r> whose texts are joined (phonetic hints are left out)
+    text = element.findtext(TEXT_TAG)
+    if text is not None:
+        return text
+    return "".join(run.findtext(TEXT_TAG) or "" for run in element.iter(RUN_TAG))
+
+
+def header_names(header, width):
+    # as pd.read_excel names them: blank headers become "Unnamed: N", repeats get ".1", ".2", ...
+    names = []
+    seen = {}
+    for position in range(width):
+        name = header[position] if position < len(header) else None
+        if name is None:
+            name = f"Unnamed: {position}"
+        elif name in seen:
+            count = seen[name]
+            while f"{name}.{count}" in seen:
+                count += 1
+            seen[name] = count + 1
+            name = f"{name}.{count}"
+        seen.setdefault(name, 1)
+        names.append(name)
+    return names
+
+
+class XlsxWorkbook:
+
+    # Open with a with-block; the zip is read lazily, so opening costs the workbook.xml and nothing more
+    def __init__(self, file_path):
+        self.file_path = file_path
+        try:
+            self.archive = zipfile.ZipFile(file_path)
+        except zipfile.BadZipFile:
+            raise XlsxError(f"{file_path} is not an .xlsx workbook")
+        try:
+            self.sheet_paths, self.date1904 = self.read_workbook()
+        except (KeyError, ElementTree.ParseError) as e:
+            self.archive.close()
+            raise XlsxError(f"{file_path} is not a readable .xlsx workbook: {e}")
+        self.shared_strings = None
+        self.date_styles = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.archive.close()
+
+    def read_workbook(self):
+        targets = {}
+        relationships = ElementTree.fromstring(self.archive.read("xl/_rels/workbook.xml.rels"))
+        for relationship in relationships.iter(PACKAGE_RELATIONSHIP_NAMESPACE + "Relationship"):
+            target = relationship.get("Target")
+            # targets are relative to xl/ unless they start at the root of the zip
+            targets[relationship.get("Id")] = (target.lstrip("/") if target.startswith("/")
+                                               else posixpath.normpath(posixpath.join("xl", target)))
+        workbook = ElementTree.fromstring(self.archive.read("xl/workbook.xml"))
+        sheet_paths = {}
+        for sheet in workbook.iter(MAIN_NAMESPACE + "sheet"):
+            sheet_paths[sheet.get("name")] = targets[sheet.get(RELATIONSHIP_NAMESPACE + "id")]
+        properties = workbook.find(MAIN_NAMESPACE + "workbookPr")
+        date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        return sheet_paths, date1904
+
+    def sheet_names(self):
+        return list(self.sheet_paths)
+
+    def load_shared_strings(self):
+        # one table for the whole workbook, read the first time a sheet needs it
+        if self.shared_strings is None:
+            self.shared_strings = []
+            try:
+                stream = self.archive.open("xl/sharedStrings.xml")
+            except KeyError:
+                return self.shared_strings
+            with stream:
+                for _, element in ElementTree.iterparse(stream):
+                    if element.tag == SHARED_STRING_TAG:
+                        self.shared_strings.append(string_text(element))
+                        element.clear()
+        return self.shared_strings
+
+    def load_date_styles(self):
+        # the style numbers (the s attribute of a cell) whose number format shows a date or time
+        if self.date_styles is None:
+            self.date_styles = set()
+            try:
+                styles = ElementTree.fromstring(self.archive.read("xl/styles.xml"))
+            except KeyError:
+                return self.date_styles
+            date_formats = set(DATE_FORMAT_IDS)
+            for number_format in styles.iter(MAIN_NAMESPACE + "numFmt"):
+                if is_date_format(number_format.get("formatCode", "")):
+                    date_formats.add(int(number_format.get("numFmtId")))
+            cell_formats = styles.find(MAIN_NAMESPACE + "cellXfs")
+            if cell_formats is not None:
+                for style, cell_format in enumerate(cell_formats):
+                    if int(cell_format.get("numFmtId", 0)) in date_formats:
+                        self.date_styles.add(str(style))
+        return self.date_styles
+
+    def sheet_path(self, sheet_name):
+        if sheet_name is None:
+            if not self.sheet_paths:
+                raise XlsxError(f"{self.file_path} has no sheets")
+            return next(iter(self.sheet_paths.values()))
+        if sheet_name not in self.sheet_paths:
+            raise XlsxError(f"Worksheet named '{sheet_name}' not found")
+        return self.sheet_paths[sheet_name]
+
+    def date_value(self, serial):
+        epoch = EPOCH_1904 if self.date1904 else EPOCH_1900
+        # the time of day to the millisecond, as openpyxl has it, so 12:30 doesn't come back as 12:30:00.000001
+        days, fraction = divmod(serial, 1)
+        value = epoch + datetime.timedelta(days=days, milliseconds=round(fraction * 86400000))
+        if not self.date1904 and serial < 60:
+            # Excel counts a 29 February 1900 that never was
+            value += datetime.timedelta(days=1)
+        return value
+
+    def cell_value(self, cell, kind):
+        # the value of a <c> element as pd.read_excel would give it
+        if kind == "inlineStr":
+            element = cell.find(INLINE_STRING_TAG)
+            value = string_text(element) if element is not None else None
+        else:
+            value = cell.findtext(VALUE_TAG)
+            if value is None:
+                return None
+            if kind == "s":
+                value = self.load_shared_strings()[int(value)]
+            elif kind is None or kind == "n":
+                number = float(value)
+                style = cell.get("s")
+                if style is not None and style in self.load_date_styles():
+                    return self.date_value(number)
+                return int(number) if number.is_integer() else number
+            elif kind == "b":
+                return value == "1"
+            elif kind == "d":
+                return datetime.datetime.fromisoformat(value)
+        return None if value is None or value in NA_STRINGS else value
+
+    # Yields each row as a list of values (None for blank cells) up to its last cell.  With positions, a
+    # set of column positions, only those cells are read and the rest of each row is skipped.
+    def iter_rows(self, sheet_name=None, positions=None):
+        path = self.sheet_path(sheet_name)
+        try:
+            stream = self.archive.open(path)
+        except KeyError:
+            raise XlsxError(f"{self.file_path} is missing {path}")
+        previous = None
+        with stream:
+            for _, element in ElementTree.iterparse(stream):
+                if element.tag != ROW_TAG:
+                    continue
+                number = element.get("r")
+                number = int(number) if number is not None else (previous or 0) + 1
+                if previous is not None:
+                    # rows with nothing in them aren't written, but they still count
+                    for _ in range(number - previous - 1):
+                        yield []
+                previous = number
+                values = []
+                position = -1
+                for cell in element:
+                    reference = cell.get("r")
+                    position = column_index(reference) if reference is not None else position + 1
+                    if positions is not None and position not in positions:
+                        continue
+                    value = self.cell_value(cell, cell.get("t"))
+                    if value is not None:
+                        if position >= len(values):
+                            values.extend([None] * (position - len(values) + 1))
+                        values[position] = value
+                yield values
+                # only an empty shell of each row read is kept until the end of the sheet
+                element.clear()
+
+    def read_header(self, sheet_name=None):
+        for row in self.iter_rows(sheet_name):
+            return [value for value in row if value is not None]
+        return []
+
+    # The sheet as a DataFrame, with only the named columns (those the sheet has, in sheet order) when
+    # columns is given.  columns may also be a function that picks them from the header row.  The
+    # text_columns are left as they were typed rather than parsed as pd.read_excel would.
+    def read_sheet(self, sheet_name=None, columns=None, text_columns=()):
+        import numpy as np
+        import pandas as pd
+        rows = self.iter_rows(sheet_name)
+        header = next(rows, [])
+        if callable(columns):
+            columns = columns([value for value in header if value is not None])
+        positions = None
+        if columns is not None:
+            wanted = set(columns)
+            positions = {position for position, value in enumerate(header) if value in wanted}
+            rows.close()
+            rows = self.iter_rows(sheet_name, positions)
+            next(rows, None)
+        # blank cells are NaN, as pandas has them; with columns only the kept positions are filled in
+        keep = sorted(positions) if positions is not None else list(range(len(header)))
+        data = [[] for _ in keep]
+        count = 0
+        for row in rows:
+            if positions is None and len(row) > len(keep):
+                # a value to the right of the header makes an "Unnamed" column
+                data.extend([np.nan] * count for _ in range(len(row) - len(keep)))
+                keep = list(range(len(row)))
+            width = len(row)
+            for position, column in zip(keep, data):
+                value = row[position] if position < width else None
+                column.append(np.nan if value is None else value)
+            count += 1
+        # blank rows at the end of the sheet aren't rows of the table
+        while count and all(column[count - 1] is np.nan for column in data):
+            for column in data:
+                column.pop()
+            count -= 1
+        names = header_names(header, max(keep, default=-1) + 1)
+        frame = pd.DataFrame({names[position]: column for position, column in zip(keep, data)},
+                             index=pd.RangeIndex(count))
+        for name in frame.columns:
+            if name in text_columns:
+                continue
+            if frame[name].dtype == object or pd.api.types.is_string_dtype(frame[name]):
+                frame[name] = parsed_column(frame[name])
+        return frame
+
+
+# The column as pd.read_excel's parser leaves it: a column whose text cells all look like numbers is
+# numeric ("0012" typed as text is 12), one of True/False text is bools, and a True/False column with
+# blanks in it is 1.0/0.0/NaN
+def parsed_column(column):
+    import pandas as pd
+    values = column.dropna()
+    if not len(values):
+        return column
+    if any(isinstance(value, str) for value in values):
+        try:
+            # to_numeric is the conversion the parser itself uses
+            return pd.to_numeric(column)
+        except (ValueError, TypeError):
+            pass
+        if all(isinstance(value, str) and value in BOOLEAN_STRINGS for value in values):
+            return column.map(BOOLEAN_STRINGS).astype(object if len(values) < len(column) else bool)
+        return column
+    if all(isinstance(value, bool) for value in values):
+        return column.astype(float)
+    return column
+
+
+def sheet_names(file_path):
+    with XlsxWorkbook(file_path) as workbook:
+        return workbook.sheet_names()
+
+
+def read_header(file_path, sheet_name=None):
+    with XlsxWorkbook(file_path) as workbook:
+        return workbook.read_header(sheet_name)
+
+
+def read_sheet(file_path, sheet_name=None, columns=None):
+    with XlsxWorkbook(file_path) as workbook:
+        return workbook.read_sheet(sheet_name, columns)
+
+
+# read_sheet, or pd.read_excel for a workbook that isn't an .xlsx zip
+def read_excel(file_path, sheet_name=None, columns=None):
+    if zipfile.is_zipfile(file_path):
+        return read_sheet(file_path, sheet_name, columns)
+    import pandas as pd
+    frame = pd.read_excel(file_path, sheet_name=0 if sheet_name is None else sheet_name)
+    if callable(columns):
+        columns = columns([name for name in frame.columns if not str(name).startswith("Unnamed: ")])
+    if columns is not None:
+        frame = frame[[name for name in frame.columns if name in set(columns)]]
+    return frame